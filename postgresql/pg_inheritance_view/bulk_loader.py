@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+
+import psycopg2
+
+
+class IteratorFile():
+    # file-like object giving the rows of an iterator as CSV to COPY
+    # None is written as NULL, all other values are quoted
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+
+    def format_row(self, row):
+        return ','.join(['' if value is None else '"{0}"'.format(str(value).replace('"', '""'))
+                         for value in row]) + '\n'
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += self.format_row(next(self.rows))
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class PGInheritanceLoader():
+    # Bulk loader for the hierarchies defined for PGInheritanceView.
+    # The rows, with the columns of the merge view, are streamed with COPY
+    # into a temporary staging table, private to the session and dropped at
+    # the latest with the transaction, so concurrent loads do not clash. The
+    # keys are then allocated in bulk with pkey_value and the rows are spread
+    # into the parent and children tables with one statement per table.
+
+    def __init__(self, generator, staging=None):
+        if 'merge_view' not in generator.definition:
+            raise ValueError(
+                "The bulk loader requires a merge_view in the definition")
+        if generator.cur is None:
+            raise ValueError("The bulk loader requires a database connection")
+
+        self.generator = generator
+        self.conn = generator.conn
+        self.cur = generator.cur
+        # temporary tables cannot be schema qualified
+        self.staging = staging if staging is not None else '_load_{0}'.format(
+            generator.definition['merge_view']['name'])
+
+    def merge_view_name(self):
+        return '{0}.{1}'.format(self.generator.definition['schema'],
+                                self.generator.definition['merge_view']['name'])
+
+    def load(self, rows, columns, commit=True):
+        # rows is either a file in CSV format (without header) or an iterator
+        # of sequences, both with the given columns of the merge view
+        # returns the number of loaded rows
+        if not hasattr(rows, 'read'):
+            rows = IteratorFile(rows)
+
+        try:
+            self.cur.execute("CREATE TEMP TABLE {0} (LIKE {1}) ON COMMIT DROP;".format(
+                self.staging, self.merge_view_name()))
+            self.cur.copy_expert("COPY {0} ({1}) FROM STDIN WITH (FORMAT csv)".format(
+                self.staging, ', '.join(columns)), rows)
+
+            for statement in self.generator.sql_bulk_insert_statements(self.staging):
+                self.cur.execute(statement)
+
+            self.cur.execute("SELECT count(*) FROM {0};".format(self.staging))
+            count = self.cur.fetchone()[0]
+            self.cur.execute("DROP TABLE {0};".format(self.staging))
+        except psycopg2.Error:
+            if commit:
+                self.conn.rollback()
+            raise
+
+        if commit:
+            self.conn.commit()
+        return count
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+import json
+
+
+class PGCatalog():
+    # Cache of the catalog information (ordered columns, types, primary
+    # keys and indexed columns) of the tables used by the view generators,
+    # and of the labels of their enum types.
+    # All tables of a definition are fetched with one single query and the
+    # cache can be shared between several generator instances.
+    # The catalog can be dumped to a snapshot file and loaded back to generate
+    # the SQL without any database connection.
+    # The shared catalog of a service is not refreshed: it has to be
+    # invalidated once the tables or types of the service changed (done after
+    # the deployments of the generators and of the command line).
+
+    # shared catalogs, by service
+    _shared = {}
+
+    def __init__(self):
+        self.tables = {}
+        # labels by enum type, None if the type does not exist
+        self.enums = {}
+        # number of queries run to fill the cache
+        self.queries = 0
+
+    @classmethod
+    def shared(cls, service):
+        if service not in cls._shared:
+            cls._shared[service] = cls()
+        return cls._shared[service]
+
+    @classmethod
+    def invalidate(cls, service):
+        # the next generators of the service fetch a new catalog
+        cls._shared.pop(service, None)
+
+    @classmethod
+    def clear(cls):
+        # invalidates the shared catalogs of all the services
+        cls._shared.clear()
+
+    @classmethod
+    def load(cls, path):
+        catalog = cls()
+        with open(path) as f:
+            snapshot = json.load(f)
+        catalog.tables = snapshot['tables']
+        catalog.enums = snapshot.get('enums', {})
+        return catalog
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(json.dumps({'tables': self.tables, 'enums': self.enums}, indent=2, sort_keys=True))
+
+    def __contains__(self, table):
+        return table in self.tables
+
+    def prefetch(self, cur, tables):
+        missing = sorted(set([table for table in tables if table not in self.tables]))
+        if len(missing) == 0:
+            return
+        self.queries += 1
+        cur.execute("""
+SELECT t.name AS table_name, a.attname, format_type(a.atttypid, a.atttypmod) AS data_type,
+    COALESCE(a.attnum = ANY(i.indkey), FALSE) AS is_pkey,
+    EXISTS (SELECT 1 FROM pg_index ix WHERE ix.indrelid = a.attrelid AND ix.indkey[0] = a.attnum) AS is_indexed
+FROM unnest(%s::text[]) AS t(name)
+    INNER JOIN pg_attribute a ON a.attrelid = t.name::regclass
+    LEFT JOIN pg_index i ON i.indrelid = a.attrelid AND i.indisprimary
+WHERE a.attisdropped IS NOT TRUE AND a.attnum > 0
+ORDER BY t.name, a.attnum ASC""", (missing,))
+        for table in missing:
+            self.tables[table] = {'columns': [], 'types': {}, 'pkey': [], 'indexed': []}
+        for row in cur.fetchall():
+            table = self.tables[row[0]]
+            table['columns'].append(row[1])
+            table['types'][row[1]] = row[2]
+            if row[3]:
+                table['pkey'].append(row[1])
+            # columns leading an index
+            if row[4]:
+                table['indexed'].append(row[1])
+
+    def prefetch_enums(self, cur, types):
+        # types are schema qualified
+        missing = sorted(set([enum for enum in types if enum not in self.enums]))
+        if len(missing) == 0:
+            return
+        self.queries += 1
+        cur.execute("""
+SELECT n.nspname || '.' || t.typname, array_agg(e.enumlabel::text ORDER BY e.enumsortorder)
+FROM pg_type t
+    INNER JOIN pg_namespace n ON n.oid = t.typnamespace
+    INNER JOIN pg_enum e ON e.enumtypid = t.oid
+WHERE n.nspname || '.' || t.typname = ANY(%s)
+GROUP BY 1""", (missing,))
+        for enum in missing:
+            self.enums[enum] = None
+        for row in cur.fetchall():
+            self.enums[row[0]] = list(row[1])
+
+    def has_enum_labels(self, enum):
+        # False if the existence of the type is unknown (offline without
+        # enums in the snapshot)
+        return enum in self.enums
+
+    def enum_labels(self, enum, cur=None):
+        if enum not in self.enums:
+            if cur is None:
+                raise KeyError(
+                    "Type {0} is not available in the catalog".format(enum))
+            self.prefetch_enums(cur, [enum])
+        labels = self.enums[enum]
+        return None if labels is None else list(labels)
+
+    def table(self, table, cur=None):
+        if table not in self.tables:
+            if cur is None:
+                raise KeyError(
+                    "Table {0} is not available in the catalog".format(table))
+            self.prefetch(cur, [table])
+        return self.tables[table]
+
+    def columns(self, table, cur=None):
+        # return a copy, callers remove the primary key from the list
+        return list(self.table(table, cur)['columns'])
+
+    def column_type(self, table, column, cur=None):
+        return self.table(table, cur)['types'][column]
+
+    def pkey(self, table, cur=None):
+        return list(self.table(table, cur)['pkey'])
+
+    def is_indexed(self, table, column, cur=None):
+        return column in self.table(table, cur).get('indexed', [])
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+# Generates the views of a directory of YAML definitions, in parallel.
+#
+#   python -m pg_inheritance_view.cli definitions/ --service pg_qgep --output sql/
+#   python -m pg_inheritance_view.cli definitions/ --snapshot catalog.json --output sql/
+#   python -m pg_inheritance_view.cli definitions/ --service pg_qgep --apply
+#   python -m pg_inheritance_view.cli definitions/ --service pg_qgep --apply --recursive
+#   python -m pg_inheritance_view.cli definitions/ --service pg_qgep --output sql/ --stats-json stats.json
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg2
+
+from .catalog import PGCatalog
+from .deployment import execute_autocommit
+from .enum_type import split_enum_labels
+from .pg_inheritance_view import PGInheritanceView
+from .pg_inheritance_view_recursive import PGInheritanceViewRecursive
+from .sql_cache import PGSqlCache
+from .stats import GeneratorStats
+
+
+def definition_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, '*.yaml')) + glob.glob(os.path.join(directory, '*.yml')))
+
+
+def definition_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def generate(path, args):
+    # runs in a worker process: generates (or deploys for the recursive
+    # generator with --apply) one definition
+    # returns a dict with name, sql, time, error and stats (see GeneratorStats,
+    # None for a cache hit)
+    result = {'name': definition_name(path), 'sql': None, 'time': 0.0, 'error': None, 'stats': None}
+    start = time.time()
+    try:
+        with open(path) as f:
+            definition = f.read()
+        catalog = PGCatalog.load(args.snapshot) if args.snapshot else None
+        service = None if args.snapshot else args.service
+        generator_class = PGInheritanceViewRecursive if args.recursive else PGInheritanceView
+
+        if args.recursive and args.apply:
+            with generator_class(service, definition, catalog, instrument=args.instrument) as generator:
+                deployment = generator.deploy()
+            result['stats'] = generator.stats.to_dict()
+            if not deployment['success']:
+                result['error'] = deployment['levels'][-1]['error']
+        elif args.cache:
+            result['sql'] = PGSqlCache(args.cache).sql_all(
+                generator_class, service, definition, catalog, instrument=args.instrument)
+        else:
+            with generator_class(service, definition, catalog, instrument=args.instrument) as generator:
+                result['sql'] = generator.sql_enum_labels() + generator.sql_all()
+            result['stats'] = generator.stats.to_dict()
+    except Exception as e:
+        # any failure of a definition is reported with its result instead of
+        # aborting the other definitions
+        result['error'] = '{0}: {1}'.format(type(e).__name__, str(e).strip())
+    result['time'] = time.time() - start
+    return result
+
+
+def apply_sql(service, results):
+    # executes the generated SQL of the definitions in order, one transaction
+    # per definition, after the labels added to the enum types which are
+    # committed on their own
+    conn = psycopg2.connect("service={0}".format(service))
+    try:
+        cur = conn.cursor()
+        for result in results:
+            if result['error'] is not None or not result['sql']:
+                continue
+            start = time.time()
+            enum_sql, sql = split_enum_labels(result['sql'])
+            try:
+                if enum_sql:
+                    execute_autocommit(cur, enum_sql)
+                cur.execute(sql)
+                conn.commit()
+            except psycopg2.Error as e:
+                conn.rollback()
+                result['error'] = str(e).strip()
+            result['time'] += time.time() - start
+            if result['stats'] is not None:
+                result['stats']['phases']['execution'] = time.time() - start
+    finally:
+        conn.close()
+        PGCatalog.invalidate(service)
+
+
+def summary(results, elapsed):
+    lines = ["{0:<40} {1:>10} {2:>12}  {3}".format('definition', 'time (s)', 'size', 'status')]
+    for result in results:
+        lines.append("{0:<40} {1:>10.3f} {2:>12}  {3}".format(
+            result['name'], result['time'],
+            len(result['sql']) if result['sql'] is not None else '-',
+            'ok' if result['error'] is None else 'error: {0}'.format(result['error'])))
+    lines.append("{0} definitions, {1} errors, {2:.3f} s ({3:.3f} s in total for the definitions)".format(
+        len(results), len([result for result in results if result['error'] is not None]),
+        elapsed, sum([result['time'] for result in results])))
+    return '\n'.join(lines)
+
+
+def stats_report(results):
+    lines = []
+    for result in results:
+        if result['stats'] is None:
+            continue
+        lines.append("== {0}".format(result['name']))
+        lines.append(GeneratorStats.from_dict(result['stats']).report())
+    return '\n'.join(lines)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Generates the views and triggers of a directory of YAML definitions")
+    parser.add_argument('directory', help="directory of the YAML definitions (*.yaml, *.yml)")
+    parser.add_argument('--service', help="PostgreSQL service")
+    parser.add_argument('--snapshot', help="catalog snapshot to generate offline (see PGCatalog.dump)")
+    parser.add_argument('--recursive', action='store_true', help="use PGInheritanceViewRecursive")
+    parser.add_argument('--output', help="directory where the SQL is written, one file per definition")
+    parser.add_argument('--apply', action='store_true', help="execute the SQL on the service")
+    parser.add_argument('--cache', help="directory of the SQL cache")
+    parser.add_argument('--instrument', action='store_true', help="instrument the trigger functions")
+    parser.add_argument('--stats', action='store_true', help="print the statistics of each definition")
+    parser.add_argument('--stats-json', help="file where the statistics of the definitions are written (JSON)")
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help="number of processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    if args.service is None and args.snapshot is None:
+        parser.error("a --service or a --snapshot is required")
+    if args.apply and args.service is None:
+        parser.error("--apply requires a --service")
+    if args.apply and args.snapshot is not None:
+        parser.error("--apply cannot be used with a --snapshot")
+    if args.recursive and not args.apply and args.snapshot is None:
+        parser.error("--recursive executes the SQL, use --apply or a --snapshot")
+    if args.recursive and args.cache and args.apply:
+        parser.error("--cache cannot be used with --recursive --apply")
+    if not args.apply and args.output is None:
+        parser.error("an --output directory or --apply is required")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = definition_paths(args.directory)
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        results = list(executor.map(generate, paths, [args] * len(paths)))
+
+    if args.output:
+        if not os.path.isdir(args.output):
+            os.makedirs(args.output)
+        for result in results:
+            if result['sql'] is not None:
+                with open(os.path.join(args.output, '{0}.sql'.format(result['name'])), 'w') as f:
+                    f.write(result['sql'])
+    if args.apply and not args.recursive:
+        apply_sql(args.service, results)
+
+    elapsed = time.time() - start
+    if args.stats:
+        print(stats_report(results))
+    if args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            json.dump({'time': elapsed,
+                       'definitions': dict([(result['name'], {'time': result['time'],
+                                                              'error': result['error'],
+                                                              'stats': result['stats']})
+                                            for result in results])},
+                      f, indent=2, sort_keys=True)
+    print(summary(results, elapsed))
+    return 1 if any([result['error'] is not None for result in results]) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+
+def get_connection(service):
+    # the service can be a service name, an existing connection or a pool of
+    # connections
+    if isinstance(service, psycopg2.pool.AbstractConnectionPool):
+        return service.getconn()
+    if isinstance(service, psycopg2.extensions.connection):
+        return service
+    return psycopg2.connect("service={0}".format(service))
+
+
+def release_connection(service, conn):
+    # connections given by the caller are left open, pooled connections are
+    # given back to the pool
+    if isinstance(service, psycopg2.pool.AbstractConnectionPool):
+        service.putconn(conn)
+    elif not isinstance(service, psycopg2.extensions.connection):
+        conn.close()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+
+import time
+
+import psycopg2
+
+from .statements import split_statements
+
+
+class DeploymentError(Exception):
+    pass
+
+
+def execute_autocommit(cur, sql):
+    # executes the SQL outside of a transaction block, after committing the
+    # current transaction: ALTER TYPE ... ADD VALUE cannot run in a
+    # transaction block before PostgreSQL 12, and the added labels cannot be
+    # used in the transaction adding them. The statements are executed one by
+    # one: before PostgreSQL 12, ALTER TYPE ... ADD VALUE cannot run in a
+    # multi-command string either
+    conn = cur.connection
+    conn.commit()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        for statement in split_statements(sql):
+            cur.execute(statement)
+    finally:
+        conn.autocommit = autocommit
+
+
+class Deployment():
+    # Executes the batches of a generator in the current transaction, with a
+    # savepoint per level. The first error rolls back to the savepoint of its
+    # level and stops the deployment (raises DeploymentError).
+    # levels holds the result of each level: the level, the number of batches,
+    # the status (ok, error), the error and failing SQL, and the time in seconds.
+    # The labels added to the enum types are executed and committed before
+    # the levels with prepare(), as the level 'enum'.
+
+    def __init__(self, cur):
+        self.cur = cur
+        self.levels = []
+
+    def savepoint(self):
+        return "deploy_level_{0}".format(len(self.levels) - 1)
+
+    def prepare(self, sql):
+        if len(self.levels) > 0:
+            raise ValueError("The enum labels must be prepared before the levels")
+        result = {'level': 'enum', 'batches': 1, 'status': 'running', 'error': None, 'sql': None, 'time': 0.0}
+        self.levels.append(result)
+        start = time.time()
+        try:
+            execute_autocommit(self.cur, sql)
+        except psycopg2.Error as e:
+            result['status'] = 'error'
+            result['error'] = str(e).strip()
+            result['sql'] = sql
+            raise DeploymentError("Deployment failed at level enum: {0}".format(result['error']))
+        finally:
+            result['time'] += time.time() - start
+        result['status'] = 'ok'
+
+    def execute(self, level, sql):
+        if len(self.levels) == 0 or self.levels[-1]['level'] != level:
+            self.end_level()
+            self.levels.append({'level': level, 'batches': 0, 'status': 'running',
+                                'error': None, 'sql': None, 'time': 0.0})
+            self.cur.execute("SAVEPOINT {0};".format(self.savepoint()))
+
+        result = self.levels[-1]
+        start = time.time()
+        try:
+            self.cur.execute(sql)
+        except psycopg2.Error as e:
+            self.cur.execute("ROLLBACK TO SAVEPOINT {0};".format(self.savepoint()))
+            result['status'] = 'error'
+            result['error'] = str(e).strip()
+            result['sql'] = sql
+            raise DeploymentError("Deployment failed at level {0}: {1}".format(level, result['error']))
+        finally:
+            result['time'] += time.time() - start
+        result['batches'] += 1
+
+    def end_level(self):
+        if len(self.levels) > 0 and self.levels[-1]['status'] == 'running':
+            self.cur.execute("RELEASE SAVEPOINT {0};".format(self.savepoint()))
+            self.levels[-1]['status'] = 'ok'
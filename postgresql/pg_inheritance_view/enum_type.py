@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+
+import re
+
+# ALTER TYPE ... ADD VALUE statements at the top of a script
+ADD_VALUES = re.compile(r"(?:ALTER TYPE \S+ ADD VALUE [^\n]*;\n)*\n*")
+
+
+def sql_add_enum_labels(enum, existing, labels):
+    # ALTER TYPE statements adding to the existing type the missing labels, at
+    # their position. Empty if nothing changed, None if the labels cannot be
+    # added this way (removed or reordered labels).
+    if [label for label in labels if label in existing] != existing:
+        return None
+    sql = ''
+    for index, label in enumerate(labels):
+        if label in existing:
+            continue
+        if index > 0:
+            position = " AFTER '{0}'".format(labels[index - 1])
+        elif len(existing) > 0:
+            position = " BEFORE '{0}'".format(existing[0])
+        else:
+            position = ''
+        sql += "ALTER TYPE {0} ADD VALUE IF NOT EXISTS '{1}'{2};\n".format(enum, label, position)
+    if sql:
+        sql += "\n"
+    return sql
+
+
+def split_enum_labels(sql):
+    # splits a script into the labels added to the enum types at its top (see
+    # sql_enum_labels() of the generators), which must be executed and
+    # committed on their own, and the rest of the script
+    end = ADD_VALUES.match(sql).end()
+    return sql[:end], sql[end:]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+
+class HierarchyIndex():
+    # Index of the nodes of a recursive definition by alias, built in one
+    # traversal: parent, children, ancestors chain (from the root to the node)
+    # and nearest trig_here boundary (the closest node, itself or an ancestor,
+    # where the triggers are generated).
+
+    def __init__(self, definition):
+        self.nodes = {}
+        self.add(definition, None, [])
+
+    def add(self, definition, parent, ancestors):
+        alias = definition['alias']
+        trig_here = 'trig_here' in definition and definition['trig_here'] is True
+        path = ancestors + [alias]
+        if trig_here:
+            boundary = alias
+        elif parent is not None:
+            boundary = self.nodes[parent]['boundary']
+        else:
+            boundary = None
+
+        # with a repeated alias, the first node (in depth-first order) is kept
+        if alias not in self.nodes:
+            self.nodes[alias] = {'definition': definition,
+                                 'parent': parent,
+                                 'children': [],
+                                 'ancestors': path,
+                                 'trig_here': trig_here,
+                                 'boundary': boundary}
+        if parent is not None:
+            self.nodes[parent]['children'].append(alias)
+
+        if 'children' in definition:
+            for child in definition['children']:
+                self.add(definition['children'][child], alias, path)
+
+    def __contains__(self, alias):
+        return alias in self.nodes
+
+    def parent(self, alias):
+        return self.nodes[alias]['parent']
+
+    def children(self, alias):
+        return list(self.nodes[alias]['children'])
+
+    def ancestors(self, alias):
+        return list(self.nodes[alias]['ancestors'])
+
+    def boundary(self, alias):
+        return self.nodes[alias]['boundary']
+
+    def related(self, alias):
+        # for a node with trig_here: the chain from the root to the node and
+        # its children without trig_here, whose code goes in the triggers of
+        # the node. Nothing for the other nodes.
+        if alias not in self.nodes or not self.nodes[alias]['trig_here']:
+            return [], []
+        return (self.ancestors(alias),
+                [child for child in self.nodes[alias]['children'] if not self.nodes[child]['trig_here']])
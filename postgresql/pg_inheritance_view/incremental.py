@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+
+import hashlib
+import re
+
+import psycopg2
+
+from .catalog import PGCatalog
+from .deployment import execute_autocommit
+
+FINGERPRINT_TABLE = 'pg_inheritance_view_fingerprints'
+
+FUNCTION = re.compile(r"CREATE OR REPLACE FUNCTION (\S+)\(.*?\$\$(.*?)\$\$", re.DOTALL)
+TRIGGER = re.compile(r"CREATE TRIGGER (\S+)\s+(?:INSTEAD OF|BEFORE|AFTER) .*?\bON (\S+)", re.DOTALL)
+ENUM = re.compile(r"CREATE TYPE (\S+) AS ENUM \((.*?)\)", re.DOTALL)
+
+
+def fingerprint(sql):
+    return hashlib.md5(sql.encode('utf-8')).hexdigest()
+
+
+def sql_fingerprint_table(schema):
+    return "CREATE TABLE IF NOT EXISTS {0}.{1} (view_name text PRIMARY KEY, fingerprint text NOT NULL);\n\n".format(
+        schema, FINGERPRINT_TABLE)
+
+
+def sql_store_fingerprint(schema, view, sql):
+    # update or insert (INSERT ... ON CONFLICT requires PostgreSQL 9.5)
+    return ("DELETE FROM {0}.{1} WHERE view_name = '{2}';\n"
+            "INSERT INTO {0}.{1} (view_name, fingerprint) VALUES ('{2}', '{3}');\n\n").format(
+        schema, FINGERPRINT_TABLE, view, fingerprint(sql))
+
+
+class PGInheritanceDiff():
+    # Compares the objects generated by PGInheritanceView (see objects()) with
+    # the live database, to only issue the objects which changed:
+    # * views: fingerprint of the generated SQL, stored in the table
+    #   pg_inheritance_view_fingerprints of the schema of the definition (the
+    #   definitions in pg_views are normalized by PostgreSQL and cannot be
+    #   compared with the generated SQL), and labels of the type in pg_enum
+    # * functions: body of the functions compared with pg_proc.prosrc
+    # * triggers: existence in pg_trigger
+    # The objects depending on an issued view (i.e. referencing it) are issued
+    # as well. The objects are kept in the order of the generator, which is the
+    # dependency order.
+
+    def __init__(self, generator):
+        if generator.cur is None:
+            raise ValueError("The comparison requires a database connection")
+        self.generator = generator
+        self.conn = generator.conn
+        self.cur = generator.cur
+        self.schema = generator.definition['schema']
+
+    def live_state(self, objects):
+        sql = ''.join([object_sql for kind, name, object_sql in objects])
+        relations = [name for kind, name, object_sql in objects if kind in ('view', 'table')]
+        functions = list(set([match.group(1) for match in FUNCTION.finditer(sql)]))
+        triggers = list(set([match.group(1) for match in TRIGGER.finditer(sql)]))
+        types = list(set([match.group(1) for match in ENUM.finditer(sql)]))
+
+        state = {'relations': {}, 'fingerprints': {}, 'functions': {}, 'triggers': set(), 'enums': {}}
+        # to_regclass(cstring): to_regclass(text) requires PostgreSQL 9.6
+        fingerprint_table = '{0}.{1}'.format(self.schema, FINGERPRINT_TABLE)
+        self.cur.execute("""
+SELECT name, to_regclass(name::cstring) IS NOT NULL
+FROM unnest(%s::text[]) AS name""", (relations + [fingerprint_table],))
+        for row in self.cur.fetchall():
+            state['relations'][row[0]] = row[1]
+        if state['relations'].pop(fingerprint_table):
+            self.cur.execute("""
+SELECT view_name, fingerprint
+FROM {0}
+WHERE view_name = ANY(%s)""".format(fingerprint_table), (relations,))
+            for row in self.cur.fetchall():
+                state['fingerprints'][row[0]] = row[1]
+        self.cur.execute("""
+SELECT n.nspname || '.' || p.proname, p.prosrc
+FROM pg_proc p INNER JOIN pg_namespace n ON n.oid = p.pronamespace
+WHERE n.nspname || '.' || p.proname = ANY(%s)""", (functions,))
+        for row in self.cur.fetchall():
+            state['functions'][row[0]] = row[1]
+        self.cur.execute("""
+SELECT t.tgname, n.nspname || '.' || c.relname
+FROM pg_trigger t INNER JOIN pg_class c ON c.oid = t.tgrelid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE NOT t.tgisinternal AND t.tgname = ANY(%s)""", (triggers,))
+        for row in self.cur.fetchall():
+            state['triggers'].add((row[0], row[1]))
+        self.cur.execute("""
+SELECT n.nspname || '.' || t.typname, array_agg(e.enumlabel::text ORDER BY e.enumsortorder)
+FROM pg_type t INNER JOIN pg_namespace n ON n.oid = t.typnamespace
+    INNER JOIN pg_enum e ON e.enumtypid = t.oid
+WHERE n.nspname || '.' || t.typname = ANY(%s)
+GROUP BY 1""", (types,))
+        for row in self.cur.fetchall():
+            state['enums'][row[0]] = list(row[1])
+        return state
+
+    def change_reason(self, kind, name, sql, state):
+        # reason why the object has to be issued, None if it is up to date
+        exists = state['relations'].get(name, False)
+        if kind == 'table' and not exists:
+            return 'table missing'
+        if kind == 'view':
+            if not exists:
+                return 'view missing'
+            if state['fingerprints'].get(name) != fingerprint(sql):
+                return 'view changed'
+            for match in ENUM.finditer(sql):
+                labels = re.findall(r"'([^']*)'", match.group(2))
+                if state['enums'].get(match.group(1)) != labels:
+                    return 'type {0} changed'.format(match.group(1))
+        for match in FUNCTION.finditer(sql):
+            if state['functions'].get(match.group(1)) != match.group(2):
+                return 'function {0} changed'.format(match.group(1))
+        for match in TRIGGER.finditer(sql):
+            if (match.group(1), match.group(2)) not in state['triggers']:
+                return 'trigger {0} missing'.format(match.group(1))
+        return None
+
+    def changes(self):
+        # list of the objects to issue, as (kind, name, sql, reason)
+        objects = list(self.generator.objects())
+        objects = [(kind, name, sql) for kind, name, sql in objects if sql]
+        state = self.live_state(objects)
+        changes = []
+        issued_views = []
+        for kind, name, sql in objects:
+            reason = self.change_reason(kind, name, sql, state)
+            if reason is None:
+                for view in issued_views:
+                    if re.search(r"\b{0}\b".format(re.escape(view)), sql):
+                        reason = 'depends on {0}'.format(view)
+                        break
+            if reason is None:
+                continue
+            if kind == 'view':
+                issued_views.append(name)
+            changes.append((kind, name, sql, reason))
+        return changes
+
+    def sql_changes(self, changes=None):
+        if changes is None:
+            changes = self.changes()
+        sql = ''
+        if 'view' in [change[0] for change in changes]:
+            sql += sql_fingerprint_table(self.schema)
+        for kind, name, object_sql, reason in changes:
+            sql += "-- {0}: {1}\n".format(name, reason)
+            sql += object_sql
+            if kind == 'view':
+                sql += sql_store_fingerprint(self.schema, name, object_sql)
+        return sql
+
+    def apply(self, commit=True):
+        # issues the changed objects, returns the list of changes. The labels
+        # added to the type are committed first.
+        changes = self.changes()
+        if len(changes) == 0:
+            return changes
+        sql = self.generator.sql_enum_labels()
+        if sql:
+            execute_autocommit(self.cur, sql)
+        try:
+            self.cur.execute(self.sql_changes(changes))
+        except psycopg2.Error:
+            if commit:
+                self.conn.rollback()
+            raise
+        if commit:
+            self.conn.commit()
+        PGCatalog.invalidate(self.generator.service)
+        return changes
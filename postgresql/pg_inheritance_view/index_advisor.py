@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+
+class PGIndexAdvisor():
+    # Checks that the columns used in the joins of the views generated by
+    # PGInheritanceView or PGInheritanceViewRecursive are indexed, using the
+    # catalog of the generator.
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def missing_indexes(self):
+        # list of (table, column, usage) without index
+        missing = []
+        for table, column, usage in self.generator.join_columns():
+            if self.generator.catalog.is_indexed(table, column, self.generator.cur):
+                continue
+            if (table, column) in [(m[0], m[1]) for m in missing]:
+                continue
+            missing.append((table, column, usage))
+        return missing
+
+    def report(self):
+        missing = self.missing_indexes()
+        if len(missing) == 0:
+            return "All join columns are indexed."
+        return '\n'.join(["Missing index on {0} ({1}): {2}".format(table, column, usage)
+                          for table, column, usage in missing])
+
+    def sql_create_indexes(self):
+        # CREATE INDEX CONCURRENTLY cannot run in a transaction block, the
+        # statements must be executed one by one in autocommit mode
+        return ["CREATE INDEX CONCURRENTLY {0}_{1}_idx ON {2} ({1});".format(
+            table.split('.')[-1], column, table) for table, column, usage in self.missing_indexes()]
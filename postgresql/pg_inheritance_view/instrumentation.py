@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+
+# Optional instrumentation of the generated trigger functions: each call is
+# counted and timed (with clock_timestamp) per view and operation in an
+# unlogged table.
+
+STATS_TABLE = 'pg_inheritance_view_stats'
+STATS_FUNCTION = 'pg_inheritance_view_stats_record'
+
+
+def sql_stats_table(schema):
+    sql = "CREATE UNLOGGED TABLE IF NOT EXISTS {0}.{1} (\n".format(schema, STATS_TABLE)
+    sql += "\tview_name text NOT NULL,\n"
+    sql += "\toperation text NOT NULL,\n"
+    sql += "\tcalls bigint NOT NULL DEFAULT 0,\n"
+    sql += "\ttotal_time double precision NOT NULL DEFAULT 0,\n"
+    sql += "\tPRIMARY KEY (view_name, operation)\n"
+    sql += ");\n\n"
+
+    # records a call: update, else insert (INSERT ... ON CONFLICT requires
+    # PostgreSQL 9.5). A concurrent first call of the same view and operation
+    # raises a unique violation, the row is then updated.
+    update = "UPDATE {0}.{1} SET calls = calls + 1, total_time = total_time + _time".format(schema, STATS_TABLE)
+    update += " WHERE view_name = _view_name AND operation = _operation;"
+    sql += "CREATE OR REPLACE FUNCTION {0}.{1}(_view_name text, _operation text, _t0 timestamptz)\n".format(
+        schema, STATS_FUNCTION)
+    sql += "\tRETURNS void AS\n"
+    sql += "\t$$\n"
+    sql += "\tDECLARE\n"
+    sql += "\t\t_time double precision := 1000 * extract(epoch FROM clock_timestamp() - _t0);\n"
+    sql += "\tBEGIN\n"
+    sql += "\t\t{0}\n".format(update)
+    sql += "\t\tIF NOT FOUND THEN\n"
+    sql += "\t\t\tBEGIN\n"
+    sql += "\t\t\t\tINSERT INTO {0}.{1} (view_name, operation, calls, total_time) VALUES (_view_name, _operation, 1, _time);\n".format(
+        schema, STATS_TABLE)
+    sql += "\t\t\tEXCEPTION WHEN unique_violation THEN\n"
+    sql += "\t\t\t\t{0}\n".format(update)
+    sql += "\t\t\tEND;\n"
+    sql += "\t\tEND IF;\n"
+    sql += "\tEND;\n"
+    sql += "\t$$\n"
+    sql += "\tLANGUAGE plpgsql;\n\n"
+    return sql
+
+
+def sql_start_time(instrument):
+    # declaration of the start time in the instrumented trigger functions,
+    # placed before their BEGIN
+    if not instrument:
+        return ''
+    return "\tDECLARE\n\t\t_t0 timestamptz := clock_timestamp();\n"
+
+
+def sql_record_call(instrument, schema, indent):
+    # records the call in the instrumented trigger functions, placed before
+    # each of their RETURN
+    if not instrument:
+        return ''
+    return "{0}PERFORM {1}.{2}(TG_TABLE_NAME, TG_OP, _t0);\n".format(indent, schema, STATS_FUNCTION)
+
+
+def trigger_stats_report(cur, schema):
+    # calls and times of the trigger functions, the most expensive first
+    # returns a list of (view_name, operation, calls, total_time, mean_time)
+    # with the times in milliseconds
+    cur.execute("""
+SELECT view_name, operation, calls, total_time, total_time / NULLIF(calls, 0) AS mean_time
+FROM {0}.{1}
+ORDER BY total_time DESC""".format(schema, STATS_TABLE))
+    return [tuple(row) for row in cur.fetchall()]
+
+
+def reset_trigger_stats(cur, schema):
+    cur.execute("TRUNCATE {0}.{1};".format(schema, STATS_TABLE))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+
+def merge_fields(merge_column):
+    # merged column of each child as {child: column}, given directly or under
+    # 'fields' (with an optional 'cast')
+    if 'fields' in merge_column:
+        return merge_column['fields']
+    return merge_column
+
+
+class MergeColumn():
+    # a column of the merge view merging a column of several children
+
+    __slots__ = ('alias', 'fields', 'cast')
+
+    def __init__(self, alias, fields, cast=None):
+        self.alias = alias
+        self.fields = fields
+        self.cast = cast
+
+
+class ColumnLookup():
+    # Lookup tables of the columns of a table of a definition (the parent or
+    # a child), computed once from the YAML: expressions read and written
+    # (alter), names in the views (remap) and, for the children, aliases of
+    # the merged columns in the merge view.
+
+    __slots__ = ('alias', 'read', 'write', 'remap', 'merged')
+
+    def __init__(self, alias, alter=None, remap=None, merged=None):
+        self.alias = alias
+        self.read = {}
+        self.write = {}
+        for column, expressions in (alter or {}).items():
+            if not isinstance(expressions, dict):
+                raise ValueError("The alter of the column {0} of {1} must define read and/or write".format(
+                    column, alias))
+            if 'read' in expressions:
+                self.read[column] = expressions['read']
+            if 'write' in expressions:
+                self.write[column] = expressions['write']
+        self.remap = dict(remap or {})
+        self.merged = dict(merged or {})
+
+    def output_name(self, column):
+        # name of the column in the views
+        return self.remap.get(column) or column
+
+    def select(self, column, source=None):
+        # expression of the column in the select of a view
+        read = self.read.get(column)
+        sql = read if read else '{0}.{1}'.format(source or self.alias, column)
+        if read or self.remap.get(column):
+            sql += ' AS {0}'.format(self.output_name(column))
+        return sql
+
+    def value(self, column):
+        # value written to the column from a row of the join view
+        return self.write.get(column) or 'NEW.{0}'.format(self.output_name(column))
+
+    def merge_value(self, column):
+        # value written to the column from a row of the merge view, where a
+        # merged column is read under the alias of the merge column
+        return self.write.get(column) or 'NEW.{0}'.format(
+            self.remap.get(column) or self.merged.get(column, column))
+
+
+class DefinitionModel():
+    # Column lookups of a definition (a level of the hierarchy for the
+    # recursive generator): of the parent table, of each child and the merge
+    # columns of the merge view. child_alter is the field of the alter of
+    # the children ('c_alter' for the recursive generator).
+
+    __slots__ = ('parent', 'children', 'merge_columns')
+
+    def __init__(self, definition, child_alter='alter'):
+        children = definition.get('children') or {}
+        merge_view = definition.get('merge_view') or {}
+
+        self.merge_columns = []
+        merged = dict([(child, {}) for child in children])
+        for alias, merge_column in (merge_view.get('merge_columns') or {}).items():
+            fields = merge_fields(merge_column)
+            for child in fields:
+                if child not in merged:
+                    raise ValueError("Unknown child {0} in the merge column {1}".format(child, alias))
+                merged[child][fields[child]] = alias
+            self.merge_columns.append(MergeColumn(alias, fields, merge_column.get('cast')))
+
+        self.parent = ColumnLookup(definition['alias'], definition.get('alter'), definition.get('remap'))
+        self.children = dict([(child, ColumnLookup(child, children[child].get(child_alter),
+                                                   children[child].get('remap'), merged[child]))
+                              for child in children])
+
+    def merged_columns(self, child):
+        # the columns of the child which are merged in the merge view
+        return self.children[child].merged
@@ -1,24 +1,53 @@
 #!/usr/bin/env python
 
 
+import re
+import time
+
 import psycopg2
 import psycopg2.extras
 import yaml
 
+from .catalog import PGCatalog
+from .connection import get_connection, release_connection
+from .enum_type import sql_add_enum_labels
+from .incremental import FINGERPRINT_TABLE, fingerprint, sql_fingerprint_table
+from .instrumentation import STATS_TABLE, sql_record_call, sql_start_time, sql_stats_table
+from .model import DefinitionModel
+from .statements import split_statements
+from .stats import GeneratorStats
+
 
 class PGInheritanceView():
 
-    def __init__(self, service, definition):
+    def __init__(self, service, definition, catalog=None, instrument=False):
+
+        # the service is a service name, a connection or a pool of connections
+        # without service, the SQL is generated offline from the catalog
+        # (e.g. loaded from a snapshot file with PGCatalog.load)
+        self.service = service
+        if service is None:
+            if catalog is None:
+                raise ValueError(
+                    "A catalog is required to generate the SQL without a service")
+            self.conn = None
+            self.cur = None
+        else:
+            self.conn = get_connection(service)
+            self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
-        self.conn = psycopg2.connect("service={0}".format(service))
-        self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        self.definition = yaml.safe_load(definition)
 
-        self.definition = yaml.load(definition)
+        # if instrument is True, the calls of the trigger functions are
+        # counted and timed in a statistics table
+        self.instrument = instrument
 
         # add alias definition to children to have the same data structure than
         # the top level (parent table)
         for child in self.definition['children']:
             self.definition['children'][child]['alias'] = child
+        # lookups of the columns (alter, remap, merge columns), computed once
+        self.model = DefinitionModel(self.definition)
 
         # defines if a item can be inserted in the parent table only (not any
         # sub-type). Default: true.
@@ -30,32 +59,152 @@ class PGInheritanceView():
         if 'merge_view' in self.definition and 'allow_type_change' in self.definition['merge_view']:
             self.allow_type_change = self.definition[
                 'merge_view']['allow_type_change']
+        # defines if the type is stored in an indexed column of the parent
+        # table (maintained by the triggers) instead of being computed from
+        # the joins of the children in the merge_view. Default: false
+        self.stored_type = False
+        if 'merge_view' in self.definition and 'stored_type' in self.definition['merge_view']:
+            self.stored_type = self.definition['merge_view']['stored_type']
+        # defines how the merge_view is built: 'join' joins the parent to all
+        # children, 'union_all' unites a select per child. Default: join
+        self.merge_strategy = 'join'
+        if 'merge_view' in self.definition and 'merge_strategy' in self.definition['merge_view']:
+            self.merge_strategy = self.definition['merge_view']['merge_strategy']
+            if self.merge_strategy not in ('join', 'union_all'):
+                raise ValueError("Unknown merge_strategy {0}".format(self.merge_strategy))
+        # defines if the rows of the merge_view are stored in a table kept up
+        # to date by triggers on the parent and children tables. Default: false
+        self.materialized = False
+        if 'merge_view' in self.definition and 'materialized' in self.definition['merge_view']:
+            self.materialized = self.definition['merge_view']['materialized']
+            if self.materialized and 'additional_joins' in self.definition['merge_view']:
+                raise ValueError("The materialized merge view of {0} cannot have additional_joins: "
+                                 "the changes of their tables are not tracked".format(self.definition['alias']))
+        # defines if the merge_view update trigger skips the update of the
+        # tables whose columns did not change. Default: false
+        self.skip_unchanged = False
+        if 'merge_view' in self.definition and 'skip_unchanged' in self.definition['merge_view']:
+            self.skip_unchanged = self.definition['merge_view']['skip_unchanged']
+        # defines if the set-based bulk functions are generated next to the
+        # merge_view. Default: false
+        self.bulk_functions = False
+        if 'merge_view' in self.definition and 'bulk_functions' in self.definition['merge_view']:
+            self.bulk_functions = self.definition['merge_view']['bulk_functions']
+
+        # fetch the columns of all tables at once, the catalog is shared
+        # between the instances using the same service
+        # statistics of the run (phases, catalog queries, generated objects)
+        self.stats = GeneratorStats()
+        self.catalog = catalog if catalog is not None else PGCatalog.shared(service)
+        if self.cur is not None:
+            with self.stats.phase('catalog', self.catalog):
+                self.catalog.prefetch(self.cur, self.tables())
+                if 'merge_view' in self.definition:
+                    self.catalog.prefetch_enums(self.cur, [self.type_name()])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        # only closes the connection if it was opened by this instance
+        if self.cur is not None:
+            self.cur.close()
+            self.cur = None
+        if self.conn is not None:
+            release_connection(self.service, self.conn)
+            self.conn = None
+
+    def tables(self):
+        tables = [self.definition['table']]
+        for child in self.definition['children']:
+            tables.append(self.definition['children'][child]['table'])
+        if 'merge_view' in self.definition and 'additional_joins' in self.definition['merge_view']:
+            for join in self.definition['merge_view']['additional_joins']:
+                tables.append(self.definition['merge_view']['additional_joins'][join]['table'])
+        return tables
+
+    def join_columns(self):
+        # columns used in the joins of the generated views: (table, column, usage)
+        join_columns = [(self.definition['table'], self.definition['pkey'], 'parent key')]
+        for child in self.definition['children']:
+            join_columns.append((self.definition['children'][child]['table'],
+                                 self.definition['children'][child]['pkey'],
+                                 'join of {0} on {1}'.format(child, self.definition['alias'])))
+        if 'merge_view' in self.definition and 'additional_joins' in self.definition['merge_view']:
+            for join in self.definition['merge_view']['additional_joins']:
+                join_definition = self.definition['merge_view']['additional_joins'][join]
+                join_columns.append((self.definition['table'], join_definition['fkey'],
+                                     'additional join {0}'.format(join)))
+                join_columns.append((join_definition['table'], join_definition['key'],
+                                     'additional join {0}'.format(join)))
+        return join_columns
 
     def columns(self, element):
-        self.cur.execute(
-            "SELECT attname FROM pg_attribute WHERE attrelid = '{0}'::regclass AND attisdropped IS NOT TRUE AND attnum > 0 ORDER BY attnum ASC".format(element['table']))
-        pg_fields = self.cur.fetchall()
-        pg_fields = [field[0] for field in pg_fields]
+        pg_fields = self.catalog.columns(element['table'], self.cur)
         pg_fields.remove(element['pkey'])
+        # the stored type column is maintained by the triggers
+        if self.stored_type and element is self.definition and self.type_column() in pg_fields:
+            pg_fields.remove(self.type_column())
         return pg_fields
 
+    def type_column(self):
+        return '{0}_type'.format(self.definition['alias'])
+
+    def stored_type_value(self, source='NEW'):
+        # value of the stored type column from a row of the merge view
+        value = "{0}.{1}::{2}.{1}".format(
+            source, self.type_column(), self.definition['schema'])
+        if self.allow_parent_only:
+            value = "COALESCE({0}, '{1}'::{2}.{3})".format(
+                value, self.definition['alias'], self.definition['schema'], self.type_column())
+        return value
+
+    def column_lookup(self, element):
+        # precomputed lookups of the columns of the parent or of a child
+        if element is self.definition:
+            return self.model.parent
+        return self.model.children[element['alias']]
+
     def column_alter_read(self, element, column):
-        if 'alter' in element and column in element['alter'] and 'read' in element['alter'][column]:
-            return element['alter'][column]['read']
-        else:
-            return None
+        return self.column_lookup(element).read.get(column)
 
     def column_alter_write(self, element, column):
-        if 'alter' in element and column in element['alter'] and 'write' in element['alter'][column]:
-            return element['alter'][column]['write']
-        else:
-            return None
+        return self.column_lookup(element).write.get(column)
 
     def column_remap(self, element, column):
-        if 'remap' in element and column in element['remap']:
-            return element['remap'][column]
-        else:
-            return None
+        return self.column_lookup(element).remap.get(column)
+
+    def column_select(self, element, column):
+        return self.column_lookup(element).select(column)
+
+    def column_value(self, element, column):
+        return self.column_lookup(element).value(column)
+
+    def column_merge_value(self, element, column):
+        return self.column_lookup(element).merge_value(column)
+
+    def sql_changed_condition(self, columns, values):
+        # condition to only update the rows of which the columns change
+        if not self.skip_unchanged:
+            return ''
+        return " AND ({0}) IS DISTINCT FROM ({1})".format(', '.join(columns), ', '.join(values))
+
+    def merge_view_source_name(self):
+        # name of the view computing the merged rows
+        # if materialized, the merge_view reads the table where they are stored
+        if self.materialized:
+            return '{0}_live'.format(self.definition['merge_view']['name'])
+        return self.definition['merge_view']['name']
+
+    def materialized_table_name(self):
+        return '{0}.{1}_mat'.format(self.definition['schema'], self.definition['merge_view']['name'])
+
+    def materialized_elements(self):
+        # the tables refreshing the materialized rows: the parent and children
+        return [self.definition] + [self.definition['children'][child] for child in self.definition['children']]
 
     def join_view_name(self, child, schema_qualified=True):
         name = '{0}.'.format(
@@ -63,23 +212,91 @@ class PGInheritanceView():
         name += 'vw_{0}_{1}'.format(self.definition['alias'], child)
         return name
 
-    def sql_all(self):
-        sql = ''
+    def sql_start_time(self):
+        return sql_start_time(self.instrument)
+
+    def sql_record_call(self, indent):
+        return sql_record_call(self.instrument, self.definition['schema'], indent)
+
+    def object_plan(self):
+        # the objects to generate, in execution order, as
+        # (kind, name, method, arguments) tuples
+        schema = self.definition['schema']
+        plan = []
+        if self.instrument:
+            plan.append(('table', '{0}.{1}'.format(schema, STATS_TABLE), sql_stats_table, (schema,)))
         for child in self.definition['children']:
-            sql += self.sql_join_view(child)
-            sql += self.sql_join_insert_trigger(child)
-            sql += self.sql_join_update_trigger(child)
-            sql += self.sql_join_delete_trigger(child)
-        sql += self.sql_merge_view()
-        sql += self.sql_merge_insert_trigger()
-        sql += self.sql_merge_update_trigger()
-        sql += self.sql_merge_delete_trigger()
-        return sql
+            plan.append(('view', self.join_view_name(child), self.sql_join_view, (child,)))
+            for operation, sql_trigger in (('insert', self.sql_join_insert_trigger),
+                                           ('update', self.sql_join_update_trigger),
+                                           ('delete', self.sql_join_delete_trigger)):
+                plan.append(('trigger', '{0}.ft_{1}_{2}_{3}'.format(
+                    schema, self.definition['alias'], child, operation), sql_trigger, (child,)))
+        if 'merge_view' not in self.definition:
+            return plan
+        name = self.definition['merge_view']['name']
+        plan.append(('view', '{0}.{1}'.format(schema, name), self.sql_merge_view, ()))
+        for operation, sql_trigger in (('insert', self.sql_merge_insert_trigger),
+                                       ('update', self.sql_merge_update_trigger),
+                                       ('delete', self.sql_merge_delete_trigger)):
+            plan.append(('trigger', '{0}.ft_{1}_{2}'.format(schema, name, operation), sql_trigger, ()))
+        if self.stored_type:
+            for child in self.definition['children']:
+                plan.append(('trigger', '{0}.ft_{1}_{2}_stored_type'.format(schema, self.definition['alias'], child),
+                             self.sql_stored_type_trigger, (child,)))
+        if self.bulk_functions:
+            plan.append(('function', '{0}.fn_{1}_bulk'.format(schema, name), self.sql_merge_bulk_functions, ()))
+        return plan
+
+    def objects(self):
+        # generates the SQL object by object, in execution order, as
+        # (kind, name, sql) tuples
+        for kind, name, method, arguments in self.object_plan():
+            start = time.time()
+            sql = method(*arguments)
+            self.stats.add_object(kind, name, len(sql), time.time() - start)
+            yield kind, name, sql
+
+    def statements(self):
+        # generates the SQL statement by statement
+        for kind, name, sql in self.objects():
+            for statement in split_statements(sql):
+                yield statement
+
+    def sql_all(self):
+        # the labels added to an existing type are not included: when
+        # sql_enum_labels() is not empty, it must be executed and committed
+        # before the returned SQL, which uses them
+        with self.stats.phase('generation', self.catalog):
+            return ''.join([sql for kind, name, sql in self.objects()])
+
+    def type_name(self):
+        return '{0}.{1}_type'.format(self.definition['schema'], self.definition['alias'])
+
+    def type_labels(self):
+        labels = [self.definition['alias']] if self.allow_parent_only is True else []
+        return labels + list(self.definition['children'])
+
+    def added_type_labels(self):
+        # ALTER TYPE statements adding the labels of the new children to the
+        # existing type (empty if unchanged), None if the type is (re)created
+        if self.cur is None and not self.catalog.has_enum_labels(self.type_name()):
+            return None
+        existing = self.catalog.enum_labels(self.type_name(), self.cur)
+        if existing is None:
+            return None
+        return sql_add_enum_labels(self.type_name(), existing, self.type_labels())
+
+    def sql_enum_labels(self):
+        # the labels added to the type are not part of sql_all(): they must be
+        # executed and committed before it, outside of a transaction block
+        # (see execute_autocommit)
+        if 'merge_view' not in self.definition:
+            return ''
+        return self.added_type_labels() or ''
 
     def sql_type(self):
-        sql = "DROP TYPE IF EXISTS {0}.{1}_type;".format(
-            self.definition['schema'], self.definition['alias'])
-        sql += "\nCREATE TYPE {0}.{1}_type AS ENUM ({2} {3} );\n\n".format(
+        create_type = "CREATE TYPE {0}.{1}_type AS ENUM ({2} {3} );".format(
             self.definition['schema'],
             self.definition['alias'],
             " '{0}',".format(
@@ -87,6 +304,100 @@ class PGInheritanceView():
             ', '.join(["'{0}'".format(child)
                        for child in self.definition['children']])
         )
+        # when the existing labels are known, new children are added to the
+        # type by sql_enum_labels() instead of dropping it with all its
+        # dependent objects
+        if self.cur is not None or self.catalog.has_enum_labels(self.type_name()):
+            existing = self.catalog.enum_labels(self.type_name(), self.cur)
+            if existing is None:
+                return "{0}\n\n".format(create_type)
+            if self.added_type_labels() is not None:
+                return ''
+        if self.stored_type:
+            # the stored type column depends on the type, it cannot be dropped
+            sql = "DO $$\nBEGIN\n\tIF NOT EXISTS (SELECT 1 FROM pg_type t INNER JOIN pg_namespace n ON n.oid = t.typnamespace WHERE n.nspname = '{0}' AND t.typname = '{1}_type') THEN\n".format(
+                self.definition['schema'], self.definition['alias'])
+            sql += "\t\t{0}\n".format(create_type)
+            sql += "\tEND IF;\nEND\n$$;\n\n"
+            return sql
+        sql = "DROP TYPE IF EXISTS {0}.{1}_type;".format(
+            self.definition['schema'], self.definition['alias'])
+        sql += "\n{0}\n\n".format(create_type)
+        return sql
+
+    def sql_stored_type(self):
+        # add the type column to the parent table, fill it from the children
+        # and index it
+        if not self.stored_type:
+            return ''
+        sql = "DO $$\nBEGIN\n\tIF NOT EXISTS (SELECT 1 FROM pg_attribute WHERE attrelid = '{0}'::regclass AND attname = '{1}' AND attisdropped IS NOT TRUE) THEN\n".format(
+            self.definition['table'], self.type_column())
+        sql += "\t\tALTER TABLE {0} ADD COLUMN {1} {2}.{1};\n".format(
+            self.definition['table'], self.type_column(), self.definition['schema'])
+        sql += "\t\tUPDATE {0} {1} SET {2} = CASE\n".format(
+            self.definition['table'], self.definition['alias'], self.type_column())
+        for child in self.definition['children']:
+            sql += "\t\t\tWHEN EXISTS (SELECT 1 FROM {0} WHERE {0}.{1} = {2}.{3}) THEN '{4}'::{5}.{6}\n".format(
+                self.definition['children'][child]['table'],
+                self.definition['children'][child]['pkey'],
+                self.definition['alias'],
+                self.definition['pkey'],
+                child,
+                self.definition['schema'],
+                self.type_column()
+            )
+        sql += "\t\t\tELSE {0}\n\t\tEND;\n".format(
+            "'{0}'::{1}.{2}".format(self.definition['alias'], self.definition['schema'], self.type_column()) if self.allow_parent_only else 'NULL')
+        sql += "\t\tCREATE INDEX {0}_idx ON {1} ({0});\n".format(
+            self.type_column(), self.definition['table'])
+        sql += "\tEND IF;\nEND\n$$;\n\n"
+        if self.allow_parent_only:
+            # type of the rows inserted directly in the parent table, the
+            # triggers on the children tables set the type of their rows
+            sql += "ALTER TABLE {0} ALTER COLUMN {1} SET DEFAULT '{2}'::{3}.{1};\n\n".format(
+                self.definition['table'], self.type_column(), self.definition['alias'], self.definition['schema'])
+        return sql
+
+    def sql_stored_type_trigger(self, child):
+        # keeps the stored type column of the parent up to date when the rows
+        # of the child table are written directly, without the views
+        element = self.definition['children'][child]
+        functrigger = "{0}.ft_{1}_{2}_stored_type".format(
+            self.definition['schema'], self.definition['alias'], child)
+        trigger = "tr_{0}_{1}_stored_type".format(self.definition['alias'], child)
+        value = "'{0}'::{1}.{2}".format(child, self.definition['schema'], self.type_column())
+        if self.allow_parent_only:
+            parent_value = "'{0}'::{1}.{2}".format(
+                self.definition['alias'], self.definition['schema'], self.type_column())
+        else:
+            parent_value = 'NULL'
+
+        sql = "CREATE OR REPLACE FUNCTION {0}()\n".format(functrigger)
+        sql += "\tRETURNS trigger AS\n"
+        sql += "\t$$\n"
+        sql += self.sql_start_time() + "\tBEGIN\n"
+        sql += "\t\tIF TG_OP <> 'INSERT' THEN\n"
+        sql += "\t\t\tUPDATE {0} SET {1} = {2} WHERE {3} = OLD.{4} AND {1} = {5};\n".format(
+            self.definition['table'], self.type_column(), parent_value,
+            self.definition['pkey'], element['pkey'], value)
+        sql += "\t\tEND IF;\n"
+        sql += "\t\tIF TG_OP <> 'DELETE' THEN\n"
+        sql += "\t\t\tUPDATE {0} SET {1} = {2} WHERE {3} = NEW.{4} AND {1} IS DISTINCT FROM {2};\n".format(
+            self.definition['table'], self.type_column(), value,
+            self.definition['pkey'], element['pkey'])
+        sql += "\t\tEND IF;\n"
+        sql += self.sql_record_call("\t\t") + "\t\tRETURN NULL;\n"
+        sql += "\tEND;\n"
+        sql += "\t$$\n"
+        sql += "\tLANGUAGE plpgsql;\n\n"
+
+        sql += "DROP TRIGGER IF EXISTS {0} ON {1};\n".format(trigger, element['table'])
+        sql += "CREATE TRIGGER {0}\n".format(trigger)
+        sql += "\tAFTER INSERT OR UPDATE OF {0} OR DELETE\n".format(element['pkey'])
+        sql += "\tON {0}\n".format(element['table'])
+        sql += "\tFOR EACH ROW\n"
+        sql += "\tEXECUTE PROCEDURE {0}();\n\n".format(functrigger)
+
         return sql
 
     def sql_join_view(self, child):
@@ -99,17 +410,7 @@ class PGInheritanceView():
         # parent columns
         for element in (self.definition, self.definition['children'][child]):
             for col in self.columns(element):
-                col_alter_read = self.column_alter_read(element, col)
-                col_remap = self.column_remap(element, col)
-                sql += "\n\t\t, "
-                if col_alter_read:
-                    sql += "{0}".format(col_alter_read)
-                    if not col_remap:
-                        sql += " AS {0}".format(col)
-                else:
-                    sql += "{0}.{1}".format(element['alias'], col)
-                if col_remap:
-                    sql += " AS {0}".format(col_remap)
+                sql += "\n\t\t, {0}".format(self.column_select(element, col))
 
         # from tables
         sql += "\n\tFROM {0} {1}\n\tINNER JOIN {2} {3}\n\t\tON {1}.{4} = {3}.{5};\n\n".format(
@@ -135,7 +436,7 @@ class PGInheritanceView():
         sql = "CREATE OR REPLACE FUNCTION {0}()\n".format(functrigger)
         sql += "\tRETURNS trigger AS\n"
         sql += "\t$$\n"
-        sql += "\tBEGIN\n"
+        sql += self.sql_start_time() + "\tBEGIN\n"
 
         # optional code addition
         if 'trigger_pre' in self.definition:
@@ -171,41 +472,32 @@ class PGInheritanceView():
                 sql += "\t\t-- Now update the existing or created feature in parent table\n"
                 sql += "\t\tUPDATE {0} SET\n".format(self.definition['table'])
                 for col in parent_columns:
-                    col_alter_write = self.column_alter_write(
-                        self.definition, col)
-                    col_remap = self.column_remap(self.definition, col)
-
-                    sql += "\t\t\t\t{0} = ".format(col)
-                    if col_alter_write:
-                        sql += '{0}'.format(col_alter_write)
-                    elif col_remap:
-                        sql += 'NEW.{0}'.format(col_remap)
-                    else:
-                        sql += 'NEW.{0}'.format(col)
+                    sql += "\t\t\t\t{0} = {1}".format(col, self.column_value(self.definition, col))
                     sql += ",\n"
 
                 sql = sql[:-2] + '\n'
                 sql += "\t\t\tWHERE {0} = NEW.{0};\n".format(
                     self.definition['pkey'])
+            if self.stored_type:
+                sql += "\t\tUPDATE {0} SET {1} = '{2}'::{3}.{1} WHERE {4} = NEW.{4};\n".format(
+                    self.definition['table'],
+                    self.type_column(),
+                    child,
+                    self.definition['schema'],
+                    self.definition['pkey'])
         else:
             sql += "\t\tINSERT INTO {0} (\n\t\t\t{1}\n\t\t\t{2}\n\t\t) VALUES (\n\t\t\t{3} ".format(
                 self.definition['table'],
                 self.definition['pkey'],
                 '\n\t\t\t'.join([", {0}".format(col)
-                                 for col in parent_columns]),
+                                 for col in parent_columns + ([self.type_column()] if self.stored_type else [])]),
                 self.definition['pkey_value']
             )
             for col in parent_columns:
-                col_alter_write = self.column_alter_write(self.definition, col)
-                col_remap = self.column_remap(self.definition, col)
-
-                sql += "\n\t\t\t, "
-                if col_alter_write:
-                    sql += '{0}'.format(col_alter_write)
-                elif col_remap:
-                    sql += 'NEW.{0}'.format(col_remap)
-                else:
-                    sql += 'NEW.{0}'.format(col)
+                sql += "\n\t\t\t, {0}".format(self.column_value(self.definition, col))
+            if self.stored_type:
+                sql += "\n\t\t\t, '{0}'::{1}.{2}".format(
+                    child, self.definition['schema'], self.type_column())
 
             sql += "\n\t\t) RETURNING {0} INTO NEW.{0};\n".format(
                 self.definition['pkey'])
@@ -218,23 +510,12 @@ class PGInheritanceView():
             self.definition['pkey']
         )
         for col in child_columns:
-            col_alter_write = self.column_alter_write(
-                self.definition['children'][child], col)
-            col_remap = self.column_remap(
-                self.definition['children'][child], col)
-
-            sql += "\n\t\t\t, "
-            if col_alter_write:
-                sql += '{0}'.format(col_alter_write)
-            elif col_remap:
-                sql += 'NEW.{0}'.format(col_remap)
-            else:
-                sql += 'NEW.{0}'.format(col)
+            sql += "\n\t\t\t, {0}".format(self.column_value(self.definition['children'][child], col))
 
         sql += "\n\t\t);\n"
 
         # end trigger function
-        sql += "\t\tRETURN NEW;\n"
+        sql += self.sql_record_call("\t\t") + "\t\tRETURN NEW;\n"
         sql += "\tEND;\n"
         sql += "\t$$\n"
         sql += "\tLANGUAGE plpgsql;\n\n"
@@ -262,7 +543,7 @@ class PGInheritanceView():
         sql = "\nCREATE OR REPLACE FUNCTION {0}()".format(functrigger)
         sql += "\n\tRETURNS trigger AS"
         sql += "\n\t$$"
-        sql += "\n\tBEGIN"
+        sql += "\n" + self.sql_start_time() + "\tBEGIN"
 
         # optional code addition
         if 'trigger_pre' in self.definition:
@@ -273,22 +554,13 @@ class PGInheritanceView():
             if len(cols) > 0:
                 sql += "\n\tUPDATE {0} SET".format(element['table'])
                 for col in cols:
-                    col_alter_write = self.column_alter_write(element, col)
-                    col_remap = self.column_remap(element, col)
-
-                    sql += "\n\t\t\t{0} = ".format(col)
-                    if col_alter_write:
-                        sql += '{0}'.format(col_alter_write)
-                    elif col_remap:
-                        sql += 'NEW.{0}'.format(col_remap)
-                    else:
-                        sql += 'NEW.{0}'.format(col)
+                    sql += "\n\t\t\t{0} = {1}".format(col, self.column_value(element, col))
                     sql += ","
 
                 sql = sql[:-1]  # extra comma
                 sql += "\n\t\tWHERE {0} = OLD.{0};\n".format(element['pkey'])
 
-        sql += "\t\tRETURN NEW;\n"
+        sql += self.sql_record_call("\t\t") + "\t\tRETURN NEW;\n"
         sql += "\tEND;\n"
         sql += "\t$$\n"
         sql += "\tLANGUAGE plpgsql;\n\n"
@@ -314,7 +586,7 @@ class PGInheritanceView():
         sql = "\nCREATE OR REPLACE FUNCTION {0}()".format(functrigger)
         sql += "\n\tRETURNS trigger AS"
         sql += "\n\t$$"
-        sql += "\n\tBEGIN"
+        sql += "\n" + self.sql_start_time() + "\tBEGIN"
 
         if "custom_delete" in self.definition['children'][child]:
             sql += "\n\t\t{0};".format(self.definition['children'][
@@ -328,7 +600,7 @@ class PGInheritanceView():
             sql += "\n\t\tDELETE FROM {0} WHERE {1} = OLD.{1};".format(
                 self.definition['table'], self.definition['pkey'])
 
-        sql += "\n\t\tRETURN NULL;\n"
+        sql += "\n" + self.sql_record_call("\t\t") + "\t\tRETURN NULL;\n"
         sql += "\tEND;\n"
         sql += "\t$$\n"
         sql += "\tLANGUAGE plpgsql;\n\n"
@@ -348,39 +620,47 @@ class PGInheritanceView():
         if 'merge_view' not in self.definition:
             return ''
 
-        sql = self.sql_type()
+        if self.merge_strategy == 'union_all':
+            view = self.sql_merge_view_union()
+        else:
+            view = self.sql_merge_view_join()
+        sql = self.sql_materialized_view_drop(view)
+        sql += self.sql_type()
+        sql += self.sql_stored_type()
+        sql += view
+        sql += self.sql_materialized_view(view)
+        sql += self.sql_materialized_view_cleanup()
+        return sql
 
-        sql += "CREATE OR REPLACE VIEW {0}.{1} AS\n\tSELECT\n\t\tCASE\n".format(
-            self.definition['schema'], self.definition['merge_view']['name'])
-        for child in self.definition['children']:
-            sql += "\t\t\tWHEN {0}.{1} IS NOT NULL THEN '{0}'::{2}.{3}_type\n".format(
-                child,
-                self.definition['children'][child]['pkey'],
-                self.definition['schema'],
-                self.definition['alias']
+    def sql_merge_view_join(self):
+        sql = "CREATE OR REPLACE VIEW {0}.{1} AS\n\tSELECT\n".format(
+            self.definition['schema'], self.merge_view_source_name())
+        if self.stored_type:
+            # read the stored type: the planner removes the join of a child
+            # whose columns a query does not use (if its key is unique)
+            sql += "\t\t{0}.{1} AS {1},\n".format(
+                self.definition['alias'], self.type_column())
+        else:
+            sql += "\t\tCASE\n"
+            for child in self.definition['children']:
+                sql += "\t\t\tWHEN {0}.{1} IS NOT NULL THEN '{0}'::{2}.{3}_type\n".format(
+                    child,
+                    self.definition['children'][child]['pkey'],
+                    self.definition['schema'],
+                    self.definition['alias']
+                )
+            sql += "\t\t\tELSE '{0}'::{1}.{0}_type\n".format(
+                self.definition['alias'],
+                self.definition['schema']
             )
-        sql += "\t\t\tELSE '{0}'::{1}.{0}_type\n".format(
-            self.definition['alias'],
-            self.definition['schema']
-        )
-        sql += "\t\tEND AS {0}_type,\n".format(self.definition['alias'])
+            sql += "\t\tEND AS {0}_type,\n".format(self.definition['alias'])
         sql += "\t\t{0}.{1}".format(self.definition['alias'],
                                     self.definition['pkey'])
 
         # parent columns
         parent_columns = self.columns(self.definition)
         for col in parent_columns:
-            col_alter_read = self.column_alter_read(self.definition, col)
-            col_remap = self.column_remap(self.definition, col)
-            sql += "\n\t\t, "
-            if col_alter_read:
-                sql += "{0}".format(col_alter_read)
-                if not col_remap:
-                    sql += " AS {0}".format(col)
-            else:
-                sql += "{0}.{1}".format(self.definition['alias'], col)
-            if col_remap:
-                sql += " AS {0}".format(col_remap)
+            sql += "\n\t\t, {0}".format(self.column_select(self.definition, col))
 
         # additional columns
         if 'additional_columns' in self.definition['merge_view']:
@@ -389,54 +669,32 @@ class PGInheritanceView():
                                                    'additional_columns'][col], col)
 
         # merge columns
-        if 'merge_columns' in self.definition['merge_view']:
-            for column_alias in self.definition['merge_view']['merge_columns']:
-                sql += "\n\t\t, CASE"
-                cast = ''
-                if 'cast' in self.definition['merge_view']['merge_columns'][column_alias]:
-                    cast = '::{}'.format(self.definition['merge_view']['merge_columns'][column_alias]['cast'])
-                if 'fields' in self.definition['merge_view']['merge_columns'][column_alias]:
-                    fields = self.definition['merge_view']['merge_columns'][column_alias]['fields']
+        for merge_column in self.model.merge_columns:
+            sql += "\n\t\t, CASE"
+            cast = '::{}'.format(merge_column.cast) if merge_column.cast else ''
+            fields = merge_column.fields
+            for table_alias in fields:
+                if self.stored_type:
+                    condition = "{0}.{1} = '{2}'::{3}.{1}".format(
+                        self.definition['alias'], self.type_column(), table_alias, self.definition['schema'])
                 else:
-                    fields = self.definition['merge_view']['merge_columns'][column_alias]
-                for table_alias in fields:
-                    sql += "\n\t\t\tWHEN {table}.{pkey} IS NOT NULL THEN {table}.{col}{cast}".format(
-                        table=table_alias,
-                        pkey=self.definition['children'][table_alias]['pkey'],
-                        col=fields[table_alias],
-                        cast=cast
-                    )
-                sql += "\n\t\t\tELSE NULL{}".format(cast)
-                sql += "\n\t\tEND AS {alias}".format(alias=column_alias)
+                    condition = "{0}.{1} IS NOT NULL".format(
+                        table_alias, self.definition['children'][table_alias]['pkey'])
+                sql += "\n\t\t\tWHEN {condition} THEN {table}.{col}{cast}".format(
+                    condition=condition,
+                    table=table_alias,
+                    col=fields[table_alias],
+                    cast=cast
+                )
+            sql += "\n\t\t\tELSE NULL{}".format(cast)
+            sql += "\n\t\tEND AS {alias}".format(alias=merge_column.alias)
 
-        # children tables
+        # children tables, without the merged columns
         for child in self.definition['children']:
-            child_columns = self.columns(self.definition['children'][child])
-            # remove merged columns
-            if 'merge_columns' in self.definition['merge_view']:
-                for column_alias in self.definition['merge_view']['merge_columns']:
-                    if 'fields' in self.definition['merge_view']['merge_columns'][column_alias]:
-                        fields = self.definition['merge_view']['merge_columns'][column_alias]['fields']
-                    else:
-                        fields = self.definition['merge_view']['merge_columns'][column_alias]
-                    for table_alias in fields:
-                        if table_alias == child:
-                            child_columns.remove(fields[child])
-            # add columns
-            for col in child_columns:
-                col_alter_read = self.column_alter_read(
-                    self.definition['children'][child], col)
-                col_remap = self.column_remap(
-                    self.definition['children'][child], col)
-                sql += "\n\t\t, "
-                if col_alter_read:
-                    sql += "{0}".format(col_alter_read)
-                    if not col_remap:
-                        sql += " AS {0}".format(col)
-                else:
-                    sql += "{0}.{1}".format(child, col)
-                if col_remap:
-                    sql += " AS {0}".format(col_remap)
+            lookup = self.model.children[child]
+            for col in self.columns(self.definition['children'][child]):
+                if col not in lookup.merged:
+                    sql += "\n\t\t, {0}".format(lookup.select(col))
 
         # from
         sql += "\n\tFROM {0} {1}".format(
@@ -466,6 +724,232 @@ class PGInheritanceView():
         sql += ";\n\n"
         return sql
 
+    def column_null(self, element, column):
+        # NULL with the type of the column as read in the views
+        col_alter_read = self.column_alter_read(element, column)
+        if col_alter_read:
+            return "(SELECT {0} FROM {1} {2} WHERE FALSE)".format(
+                col_alter_read, element['table'], element['alias'])
+        return "NULL::{0}".format(self.catalog.column_type(element['table'], column, self.cur))
+
+    def sql_merge_view_union(self):
+        # the merge view as UNION ALL of a select per child and of the parent
+        # only rows, the missing columns are padded with typed NULLs.
+        # The type is a constant in each select, filtering on it skips the
+        # selects of the other children. As in the joined merge view, the type
+        # of the parent only rows is NULL if allow_parent_only is not set.
+        merge_view = self.definition['merge_view']
+
+        branches = list(self.definition['children']) + [self.definition['alias']]
+
+        selects = []
+        for branch in branches:
+            if branch in self.definition['children'] or self.allow_parent_only:
+                branch_type = "'{0}'::{1}.{2}_type".format(branch, self.definition['schema'], self.definition['alias'])
+            else:
+                branch_type = "NULL::{0}.{1}_type".format(self.definition['schema'], self.definition['alias'])
+            sql = "\tSELECT\n\t\t{0} AS {1}_type,\n".format(branch_type, self.definition['alias'])
+            sql += "\t\t{0}.{1}".format(self.definition['alias'],
+                                        self.definition['pkey'])
+
+            # parent columns
+            for col in self.columns(self.definition):
+                sql += "\n\t\t, {0}".format(self.column_select(self.definition, col))
+
+            # additional columns
+            if 'additional_columns' in merge_view:
+                for col in merge_view['additional_columns']:
+                    sql += "\n\t\t, {0} AS {1}".format(
+                        merge_view['additional_columns'][col], col)
+
+            # merge columns
+            for merge_column in self.model.merge_columns:
+                cast = '::{}'.format(merge_column.cast) if merge_column.cast else ''
+                fields = merge_column.fields
+                if branch in fields:
+                    sql += "\n\t\t, {0}.{1}{2} AS {3}".format(
+                        branch, fields[branch], cast, merge_column.alias)
+                else:
+                    if not cast:
+                        table_alias = list(fields)[0]
+                        cast = '::{0}'.format(self.catalog.column_type(
+                            self.definition['children'][table_alias]['table'], fields[table_alias], self.cur))
+                    sql += "\n\t\t, NULL{0} AS {1}".format(cast, merge_column.alias)
+
+            # children columns
+            for child in self.definition['children']:
+                element = self.definition['children'][child]
+                lookup = self.model.children[child]
+                for col in self.columns(element):
+                    if col in lookup.merged:
+                        continue
+                    if child != branch:
+                        sql += "\n\t\t, {0} AS {1}".format(self.column_null(element, col),
+                                                          lookup.output_name(col))
+                    else:
+                        sql += "\n\t\t, {0}".format(lookup.select(col))
+
+            # from
+            sql += "\n\tFROM {0} {1}".format(
+                self.definition['table'], self.definition['alias'])
+            if branch in self.definition['children']:
+                sql += "\n\t\tINNER JOIN {0} {1} ON {2}.{3} = {1}.{4}".format(
+                    self.definition['children'][branch]['table'],
+                    branch,
+                    self.definition['alias'],
+                    self.definition['pkey'],
+                    self.definition['children'][branch]['pkey']
+                )
+            if 'additional_joins' in merge_view:
+                for join in merge_view['additional_joins']:
+                    sql += "\n\t\t{0} JOIN {1} {2} ON {3}.{4} = {2}.{5}".format(
+                        merge_view['additional_joins'][join]['type'],
+                        merge_view['additional_joins'][join]['table'],
+                        join,
+                        self.definition['alias'],
+                        merge_view['additional_joins'][join]['fkey'],
+                        merge_view['additional_joins'][join]['key']
+                    )
+            # parent only rows
+            if branch not in self.definition['children']:
+                if self.stored_type and self.allow_parent_only:
+                    sql += "\n\tWHERE {0}.{1} = '{0}'::{2}.{1}".format(
+                        self.definition['alias'], self.type_column(), self.definition['schema'])
+                elif self.stored_type:
+                    sql += "\n\tWHERE {0}.{1} IS NULL".format(self.definition['alias'], self.type_column())
+                else:
+                    sql += "\n\tWHERE {0}".format('\n\t\tAND '.join(
+                        ["NOT EXISTS (SELECT 1 FROM {0} WHERE {0}.{1} = {2}.{3})".format(
+                            self.definition['children'][child]['table'],
+                            self.definition['children'][child]['pkey'],
+                            self.definition['alias'],
+                            self.definition['pkey']
+                        ) for child in self.definition['children']]))
+            selects.append(sql)
+
+        sql = "CREATE OR REPLACE VIEW {0}.{1} AS\n".format(
+            self.definition['schema'], self.merge_view_source_name())
+        sql += "\n\tUNION ALL\n".join(selects)
+        sql += ";\n\n"
+        return sql
+
+    def sql_materialized_view_drop(self, view):
+        # the merge_view, the live view and the table are only rebuilt when the
+        # live view changed (its fingerprint is stored in the fingerprint
+        # table of PGInheritanceDiff): the live view is dropped as well, as
+        # CREATE OR REPLACE VIEW cannot change its columns
+        if not self.materialized:
+            return ''
+        schema = self.definition['schema']
+        table = self.materialized_table_name()
+
+        sql = sql_fingerprint_table(schema)
+        sql += "DO $$\n"
+        sql += "\tBEGIN\n"
+        sql += "\t\tIF to_regclass('{0}'::cstring) IS NULL OR NOT EXISTS (\n".format(table)
+        sql += "\t\t\tSELECT 1 FROM {0}.{1} WHERE view_name = '{2}' AND fingerprint = '{3}') THEN\n".format(
+            schema, FINGERPRINT_TABLE, table, fingerprint(view))
+        sql += "\t\t\tDROP VIEW IF EXISTS {0}.{1} CASCADE;\n".format(
+            schema, self.definition['merge_view']['name'])
+        sql += "\t\t\tDROP VIEW IF EXISTS {0}.{1} CASCADE;\n".format(
+            schema, self.merge_view_source_name())
+        sql += "\t\t\tDROP TABLE IF EXISTS {0};\n".format(table)
+        sql += "\t\tEND IF;\n"
+        sql += "\tEND\n"
+        sql += "\t$$;\n\n"
+        return sql
+
+    def sql_materialized_view(self, view):
+        # the merged rows are stored in a table, the merge_view reads it and
+        # triggers on the parent and children tables refresh the changed rows
+        if not self.materialized:
+            return ''
+
+        schema = self.definition['schema']
+        source = '{0}.{1}'.format(schema, self.merge_view_source_name())
+        table = self.materialized_table_name()
+
+        # built if missing, i.e. dropped by sql_materialized_view_drop
+        sql = "DO $$\n"
+        sql += "\tBEGIN\n"
+        sql += "\t\tIF to_regclass('{0}'::cstring) IS NULL THEN\n".format(table)
+        sql += "\t\t\tCREATE TABLE {0} AS SELECT * FROM {1};\n".format(table, source)
+        sql += "\t\t\tALTER TABLE {0} ADD PRIMARY KEY ({1});\n".format(
+            table, self.definition['pkey'])
+        sql += "\t\t\tCREATE INDEX ON {0} ({1}_type);\n".format(
+            table, self.definition['alias'])
+        sql += "\t\t\tCREATE VIEW {0}.{1} AS SELECT * FROM {2};\n".format(
+            schema, self.definition['merge_view']['name'], table)
+        sql += "\t\t\tDELETE FROM {0}.{1} WHERE view_name = '{2}';\n".format(schema, FINGERPRINT_TABLE, table)
+        sql += "\t\t\tINSERT INTO {0}.{1} (view_name, fingerprint) VALUES ('{2}', '{3}');\n".format(
+            schema, FINGERPRINT_TABLE, table, fingerprint(view))
+        sql += "\t\tEND IF;\n"
+        sql += "\tEND\n"
+        sql += "\t$$;\n\n"
+
+        for element in self.materialized_elements():
+            functrigger = "{0}.ft_{1}_refresh_{2}".format(
+                self.definition['schema'], self.definition['merge_view']['name'], element['alias'])
+            trigger = "tr_{0}_refresh".format(self.definition['merge_view']['name'])
+
+            # refresh of the row of the key of the record, at the indentation
+            refresh = "{{1}}DELETE FROM {0} WHERE {1} = {{0}}.{2};\n".format(
+                table, self.definition['pkey'], element['pkey'])
+            refresh += "{{1}}INSERT INTO {0} SELECT * FROM {1} WHERE {2} = {{0}}.{3};\n".format(
+                table, source, self.definition['pkey'], element['pkey'])
+
+            sql += "CREATE OR REPLACE FUNCTION {0}()\n".format(functrigger)
+            sql += "\tRETURNS trigger AS\n"
+            sql += "\t$$\n"
+            sql += self.sql_start_time() + "\tBEGIN\n"
+            sql += "\t\tIF TG_OP = 'INSERT' THEN\n"
+            sql += refresh.format('NEW', '\t\t\t')
+            sql += "\t\tELSIF TG_OP = 'UPDATE' THEN\n"
+            sql += refresh.format('OLD', '\t\t\t')
+            sql += "\t\t\tIF NEW.{0} <> OLD.{0} THEN\n".format(element['pkey'])
+            sql += refresh.format('NEW', '\t\t\t\t')
+            sql += "\t\t\tEND IF;\n"
+            sql += "\t\tELSE\n"
+            sql += refresh.format('OLD', '\t\t\t')
+            sql += "\t\tEND IF;\n"
+            sql += self.sql_record_call("\t\t") + "\t\tRETURN NULL;\n"
+            sql += "\tEND;\n"
+            sql += "\t$$\n"
+            sql += "\tLANGUAGE plpgsql;\n\n"
+
+            sql += "DROP TRIGGER IF EXISTS {0} ON {1};\n".format(
+                trigger, element['table'])
+            sql += "CREATE TRIGGER {0}\n".format(trigger)
+            sql += "\tAFTER INSERT OR UPDATE OR DELETE\n"
+            sql += "\tON {0}\n".format(element['table'])
+            sql += "\tFOR EACH ROW\n"
+            sql += "\tEXECUTE PROCEDURE {0}();\n\n".format(functrigger)
+
+        return sql
+
+    def sql_materialized_view_cleanup(self):
+        # drops the materialization of a merge_view which is not materialized
+        # anymore, once the merge_view does not read the table
+        if self.materialized:
+            return ''
+
+        schema = self.definition['schema']
+        name = self.definition['merge_view']['name']
+        table = self.materialized_table_name()
+
+        sql = "DO $$\n"
+        sql += "\tBEGIN\n"
+        sql += "\t\tIF to_regclass('{0}'::cstring) IS NOT NULL THEN\n".format(table)
+        for element in self.materialized_elements():
+            sql += "\t\t\tDROP TRIGGER IF EXISTS tr_{0}_refresh ON {1};\n".format(name, element['table'])
+            sql += "\t\t\tDROP FUNCTION IF EXISTS {0}.ft_{1}_refresh_{2}();\n".format(schema, name, element['alias'])
+        sql += "\t\t\tDROP VIEW IF EXISTS {0}.{1}_live;\n".format(schema, name)
+        sql += "\t\t\tDROP TABLE {0};\n".format(table)
+        sql += "\t\tEND IF;\n"
+        sql += "\tEND\n"
+        sql += "\t$$;\n\n"
+        return sql
+
     def sql_merge_insert_trigger(self):
         if 'merge_view' not in self.definition:
             return ''
@@ -479,7 +963,7 @@ class PGInheritanceView():
         sql = "CREATE OR REPLACE FUNCTION {0}()\n".format(functrigger)
         sql += "\tRETURNS trigger AS\n"
         sql += "\t$$\n"
-        sql += "\tBEGIN\n"
+        sql += self.sql_start_time() + "\tBEGIN\n"
 
         # optional code addition
         if 'trigger_pre' in self.definition:
@@ -515,20 +999,11 @@ class PGInheritanceView():
                 sql += "\t\t-- Now update the existing or created feature in parent table\n"
                 sql += "\t\tUPDATE {0} SET\n".format(self.definition['table'])
                 for col in parent_columns:
-                    col_alter_write = self.column_alter_write(
-                        self.definition, col)
-                    col_remap = self.column_remap(self.definition, col)
-                    if not col_remap:
-                        col_remap = col
-
-                    sql += "\t\t\t\t{0} = ".format(col)
-                    if col_alter_write:
-                        sql += '{0}'.format(col_alter_write)
-                    elif col_remap:
-                        sql += 'NEW.{0}'.format(col_remap)
-                    else:
-                        sql += 'NEW.{0}'.format(col)
+                    sql += "\t\t\t\t{0} = {1}".format(col, self.column_value(self.definition, col))
                     sql += ",\n"
+                if self.stored_type:
+                    sql += "\t\t\t\t{0} = {1},\n".format(
+                        self.type_column(), self.stored_type_value())
 
                 sql = sql[:-2] + '\n'
                 sql += "\t\t\tWHERE {0} = NEW.{0};\n".format(
@@ -539,20 +1014,13 @@ class PGInheritanceView():
                 self.definition['table'],
                 self.definition['pkey'],
                 '\n\t\t\t'.join([", {0}".format(col)
-                                 for col in parent_columns]),
+                                 for col in parent_columns + ([self.type_column()] if self.stored_type else [])]),
                 self.definition['pkey_value']
             )
             for col in parent_columns:
-                col_alter_write = self.column_alter_write(self.definition, col)
-                col_remap = self.column_remap(self.definition, col)
-
-                sql += "\n\t\t\t, "
-                if col_alter_write:
-                    sql += '{0}'.format(col_alter_write)
-                elif col_remap:
-                    sql += 'NEW.{0}'.format(col_remap)
-                else:
-                    sql += 'NEW.{0}'.format(col)
+                sql += "\n\t\t\t, {0}".format(self.column_value(self.definition, col))
+            if self.stored_type:
+                sql += "\n\t\t\t, {0}".format(self.stored_type_value())
 
             sql += "\n\t\t) RETURNING {0} INTO NEW.{0};\n".format(
                 self.definition['pkey'])
@@ -574,34 +1042,13 @@ class PGInheritanceView():
             )
 
             for col in child_columns:
-                col_alter_write = self.column_alter_write(
-                    self.definition['children'][child], col)
-                col_remap = self.column_remap(
-                    self.definition['children'][child], col)
-                if not col_remap:
-                    col_remap = col
-                    # replace remapped column by merged column alias if exists
-                    if 'merge_columns' in self.definition['merge_view']:
-                        for column_alias in self.definition['merge_view']['merge_columns']:
-                            if 'fields' in self.definition['merge_view']['merge_columns'][column_alias]:
-                                fields = self.definition['merge_view']['merge_columns'][column_alias]['fields']
-                            else:
-                                fields = self.definition['merge_view']['merge_columns'][column_alias]
-                            for table_alias in fields:
-                                if table_alias == child:
-                                    if col_remap == fields[table_alias]:
-                                        col_remap = column_alias
-                sql += "\n\t\t\t\t, "
-                if col_alter_write:
-                    sql += "{0}".format(col_alter_write)
-                else:
-                    sql += 'NEW.{0}'.format(col_remap)
+                sql += "\n\t\t\t\t, {0}".format(self.column_merge_value(self.definition['children'][child], col))
             sql += "\n\t\t);\n"
         sql += "\n\t\t ELSE NULL;"
         sql += "\n\t END CASE;\n"
 
         # end trigger function
-        sql += "\t\tRETURN NEW;\n"
+        sql += self.sql_record_call("\t\t") + "\t\tRETURN NEW;\n"
         sql += "\tEND;\n"
         sql += "\t$$\n"
         sql += "\tLANGUAGE plpgsql;\n\n"
@@ -631,7 +1078,7 @@ class PGInheritanceView():
         sql = "\nCREATE OR REPLACE FUNCTION {0}()".format(functrigger)
         sql += "\n\tRETURNS trigger AS"
         sql += "\n\t$$"
-        sql += "\n\tBEGIN"
+        sql += "\n" + self.sql_start_time() + "\tBEGIN"
 
         # optional code addition
         if 'trigger_pre' in self.definition:
@@ -639,23 +1086,21 @@ class PGInheritanceView():
 
         # parent columns
         cols = self.columns(self.definition)
-        if len(cols) > 0:
+        if len(cols) > 0 or self.stored_type:
+            values = []
             sql += "\n\tUPDATE {0} SET".format(self.definition['table'])
             for col in cols:
-                col_alter_write = self.column_alter_write(self.definition, col)
-                col_remap = self.column_remap(self.definition, col)
-
-                sql += "\n\t\t\t{0} = ".format(col)
-                if col_alter_write:
-                    sql += '{0}'.format(col_alter_write)
-                elif col_remap:
-                    sql += 'NEW.{0}'.format(col_remap)
-                else:
-                    sql += 'NEW.{0}'.format(col)
-                sql += ","
+                values.append(self.column_value(self.definition, col))
+                sql += "\n\t\t\t{0} = {1},".format(col, values[-1])
+            if self.stored_type:
+                cols = cols + [self.type_column()]
+                values.append(self.stored_type_value())
+                sql += "\n\t\t\t{0} = {1},".format(
+                    self.type_column(), self.stored_type_value())
 
             sql = sql[:-1]  # extra comma
-            sql += "\n\t\tWHERE {0} = OLD.{0};".format(self.definition['pkey'])
+            sql += "\n\t\tWHERE {0} = OLD.{0}{1};".format(
+                self.definition['pkey'], self.sql_changed_condition(cols, values))
 
         # do not allow parent only insert
         if not self.allow_parent_only:
@@ -694,33 +1139,11 @@ class PGInheritanceView():
                     self.definition['pkey']
                 )
                 for col in child_columns:
-                    col_alter_write = self.column_alter_write(
-                        self.definition['children'][child], col)
-                    col_remap = self.column_remap(
-                        self.definition['children'][child], col)
-                    if not col_remap:
-                        col_remap = col
-                        # replace remapped column by merged column alias if
-                        # exists
-                        if 'merge_columns' in self.definition['merge_view']:
-                            for column_alias in self.definition['merge_view']['merge_columns']:
-                                if 'fields' in self.definition['merge_view']['merge_columns'][column_alias]:
-                                    fields = self.definition['merge_view']['merge_columns'][column_alias]['fields']
-                                else:
-                                    fields = self.definition['merge_view']['merge_columns'][column_alias]
-                                for table_alias in fields:
-                                    if table_alias == child:
-                                        if col_remap == fields[table_alias]:
-                                            col_remap = column_alias
-                    sql += "\n\t\t\t\t\t\t, "
-                    if col_alter_write:
-                        sql += "{0}".format(col_alter_write)
-                    else:
-                        sql += 'NEW.{0}'.format(col_remap)
+                    sql += "\n\t\t\t\t\t\t, {0}".format(self.column_merge_value(self.definition['children'][child], col))
                 sql += "\n\t\t\t\t\t);"
             sql += "\n\t\tEND CASE;"
             sql += "\n\t\t-- return now as child has been updated"
-            sql += "\n\t\tRETURN NEW;"
+            sql += "\n" + self.sql_record_call("\t\t") + "\t\tRETURN NEW;"
         # forbid type change
         else:
             sql += "\n\t\tRAISE EXCEPTION 'Type change not allowed for {0}'".format(
@@ -741,40 +1164,21 @@ class PGInheritanceView():
             if len(child_columns) == 0:
                 sql += "\n\t\tNULL;"
             else:
+                values = []
                 sql += "UPDATE {0} SET\n\t\t\t".format(
                     self.definition['children'][child]['table'])
                 for col in child_columns:
-                    col_alter_write = self.column_alter_write(
-                        self.definition['children'][child], col)
-                    col_remap = self.column_remap(
-                        self.definition['children'][child], col)
-                    if not col_remap:
-                        col_remap = col
-                        # replace remapped column by merged column alias if
-                        # exists
-                        if 'merge_columns' in self.definition['merge_view']:
-                            for column_alias in self.definition['merge_view']['merge_columns']:
-                                if 'fields' in self.definition['merge_view']['merge_columns'][column_alias]:
-                                    fields = self.definition['merge_view']['merge_columns'][column_alias]['fields']
-                                else:
-                                    fields = self.definition['merge_view']['merge_columns'][column_alias]
-                                for table_alias in fields:
-                                    if table_alias == child:
-                                        if col_remap == fields[table_alias]:
-                                            col_remap = column_alias
-                    sql += "{0} = ".format(col)
-                    if col_alter_write:
-                        sql += "{0}".format(col_alter_write)
-                    else:
-                        sql += 'NEW.{0}'.format(col_remap)
+                    values.append(self.column_merge_value(self.definition['children'][child], col))
+                    sql += "{0} = {1}".format(col, values[-1])
                     sql += "\n\t\t\t, "
                 sql = sql[:-3]
-                sql += "WHERE {0} = OLD.{1};".format(self.definition['children'][child][
-                                                     'pkey'], self.definition['pkey'])
+                sql += "WHERE {0} = OLD.{1}{2};".format(self.definition['children'][child]['pkey'],
+                                                       self.definition['pkey'],
+                                                       self.sql_changed_condition(child_columns, values))
         sql += "\n\tELSE"
         sql += "\n\tEND CASE;\n"
 
-        sql += "\n\tRETURN NEW;"
+        sql += "\n" + self.sql_record_call("\t") + "\tRETURN NEW;"
         sql += "\n\tEND;"
         sql += "\n\t$$"
         sql += "\n\tLANGUAGE plpgsql;\n"
@@ -804,7 +1208,7 @@ class PGInheritanceView():
         sql = "\nCREATE OR REPLACE FUNCTION {0}()".format(functrigger)
         sql += "\n\tRETURNS trigger AS"
         sql += "\n\t$$"
-        sql += "\n\tBEGIN"
+        sql += "\n" + self.sql_start_time() + "\tBEGIN"
 
         sql += "\n\tCASE"
         for child in self.definition['children']:
@@ -825,7 +1229,7 @@ class PGInheritanceView():
         else:
             sql += "\n\tDELETE FROM {0} WHERE {1} = OLD.{1};".format(
                 self.definition['table'], self.definition['pkey'])
-        sql += "\n\tRETURN NULL;\n"
+        sql += "\n" + self.sql_record_call("\t") + "\tRETURN NULL;\n"
         sql += "\tEND;\n"
         sql += "\t$$\n"
         sql += "\tLANGUAGE plpgsql;\n\n"
@@ -841,3 +1245,157 @@ class PGInheritanceView():
         sql += "\tEXECUTE PROCEDURE {0}();\n\n".format(functrigger)
 
         return sql
+
+    def bulk_expression(self, expression, source):
+        # row-level expressions refer to NEW, set-based ones to the source
+        return re.sub(r'\bNEW\.', '{0}.'.format(source), expression)
+
+    def bulk_column_value(self, element, column, source):
+        # value written to column from the rows of the merge view in source
+        return self.bulk_expression(self.column_merge_value(element, column), source)
+
+    def sql_bulk_insert_statements(self, staging):
+        # statements spreading the rows of a relation with the columns of the
+        # merge view (staging) into the parent and children tables
+        source = '_bulk'
+        statements = []
+        parent_columns = self.columns(self.definition)
+
+        # allocate keys in one statement
+        statements.append("UPDATE {0} {1} SET {2} = {3} WHERE {1}.{2} IS NULL;".format(
+            staging,
+            source,
+            self.definition['pkey'],
+            self.bulk_expression(self.definition['pkey_value'], source)
+        ))
+
+        # parent table
+        if 'pkey_value_create_entry' in self.definition and self.definition['pkey_value_create_entry'] is True:
+            # the function given by pkey_value already created the entries
+            assignments = ['{0} = {1}'.format(col, self.bulk_column_value(self.definition, col, source))
+                           for col in parent_columns]
+            if self.stored_type:
+                assignments.append('{0} = {1}'.format(
+                    self.type_column(), self.stored_type_value(source)))
+            if len(assignments) > 0:
+                statements.append("UPDATE {0} {1} SET\n\t\t{2}\n\tFROM {3} {4}\n\tWHERE {1}.{5} = {4}.{5};".format(
+                    self.definition['table'],
+                    self.definition['alias'],
+                    '\n\t\t, '.join(assignments),
+                    staging,
+                    source,
+                    self.definition['pkey']
+                ))
+        else:
+            values = [self.bulk_column_value(self.definition, col, source)
+                      for col in parent_columns]
+            if self.stored_type:
+                values.append(self.stored_type_value(source))
+            statements.append("INSERT INTO {0} (\n\t\t{1}\n\t\t{2}\n\t) SELECT\n\t\t{3}.{1}\n\t\t{4}\n\tFROM {5} {3};".format(
+                self.definition['table'],
+                self.definition['pkey'],
+                '\n\t\t'.join([', {0}'.format(col)
+                                 for col in parent_columns + ([self.type_column()] if self.stored_type else [])]),
+                source,
+                '\n\t\t'.join([', {0}'.format(value) for value in values]),
+                staging
+            ))
+
+        # children tables
+        for child in self.definition['children']:
+            element = self.definition['children'][child]
+            child_columns = self.columns(element)
+            statements.append("INSERT INTO {0} (\n\t\t{1}\n\t\t{2}\n\t) SELECT\n\t\t{3}.{4}\n\t\t{5}\n\tFROM {6} {3}\n\tWHERE {3}.{7}_type = '{8}'::{9}.{7}_type;".format(
+                element['table'],
+                element['pkey'],
+                '\n\t\t'.join([', {0}'.format(col) for col in child_columns]),
+                source,
+                self.definition['pkey'],
+                '\n\t\t'.join([', {0}'.format(self.bulk_column_value(element, col, source))
+                               for col in child_columns]),
+                staging,
+                self.definition['alias'],
+                child,
+                self.definition['schema']
+            ))
+
+        return statements
+
+    def sql_bulk_update_statements(self, staging):
+        # statements updating the parent and existing children rows from the
+        # rows of a relation with the columns of the merge view (staging)
+        source = '_bulk'
+        statements = []
+        for element in [self.definition] + [self.definition['children'][child] for child in self.definition['children']]:
+            cols = self.columns(element)
+            if len(cols) == 0:
+                continue
+            statements.append("UPDATE {0} {1} SET\n\t\t{2}\n\tFROM {3} {4}\n\tWHERE {1}.{5} = {4}.{6};".format(
+                element['table'],
+                element['alias'],
+                '\n\t\t, '.join(['{0} = {1}'.format(col, self.bulk_column_value(element, col, source))
+                                 for col in cols]),
+                staging,
+                source,
+                element['pkey'],
+                self.definition['pkey']
+            ))
+        return statements
+
+    def sql_bulk_delete_statements(self, staging):
+        # statements deleting the children and parent rows whose keys are in
+        # a relation with the columns of the merge view (staging)
+        # custom deletes are row-level code and cannot be run set-based
+        elements = [self.definition['children'][child] for child in self.definition['children']] + [self.definition]
+        if len([element for element in elements if 'custom_delete' in element]) > 0:
+            return []
+        return ["DELETE FROM {0} {1} USING {2} _bulk WHERE {1}.{3} = _bulk.{4};".format(
+            element['table'],
+            element['alias'],
+            staging,
+            element['pkey'],
+            self.definition['pkey']
+        ) for element in elements]
+
+    def sql_merge_bulk_functions(self):
+        if 'merge_view' not in self.definition:
+            return ''
+        # opt-in, the functions are not needed by the views and their triggers
+        if not self.bulk_functions:
+            return ''
+
+        staging = '_bulk_{0}'.format(self.definition['merge_view']['name'])
+        sql = ''
+        for operation, statements in (('insert', self.sql_bulk_insert_statements(staging)),
+                                      ('update', self.sql_bulk_update_statements(staging)),
+                                      ('delete', self.sql_bulk_delete_statements(staging))):
+            if len(statements) == 0:
+                continue
+            # rows given as a jsonb array or as the name of a staging table
+            for suffix, argument, source in (
+                    ('', '_rows jsonb', "\n\t\t\tSELECT * FROM jsonb_populate_recordset(NULL::{0}.{1}, _rows)"),
+                    ('_from', '_staging regclass', "\n\t\t\tSELECT (jsonb_populate_record(NULL::{0}.{1}, row_to_json(_s)::jsonb)).* FROM ' || _staging::text || ' _s")):
+                function = "{0}.fn_{1}_bulk_{2}{3}".format(
+                    self.definition['schema'], self.definition['merge_view']['name'], operation, suffix)
+                source = source.format(
+                    self.definition['schema'], self.definition['merge_view']['name'])
+                sql += "CREATE OR REPLACE FUNCTION {0}({1})\n".format(function, argument)
+                sql += "\tRETURNS integer AS\n"
+                sql += "\t$$\n"
+                sql += "\tDECLARE\n"
+                sql += "\t\t_count integer;\n"
+                sql += "\tBEGIN\n"
+                create_staging = "CREATE TEMP TABLE {0} ON COMMIT DROP AS{1}".format(staging, source)
+                if argument.startswith('_staging'):
+                    sql += "\t\tEXECUTE '{0}';\n".format(create_staging)
+                else:
+                    sql += "\t\t{0};\n".format(create_staging)
+                for statement in statements:
+                    sql += "\t\t{0}\n".format(statement.replace('\n', '\n\t'))
+                sql += "\t\tSELECT count(*) INTO _count FROM {0};\n".format(staging)
+                sql += "\t\tDROP TABLE {0};\n".format(staging)
+                sql += "\t\tRETURN _count;\n"
+                sql += "\tEND;\n"
+                sql += "\t$$\n"
+                sql += "\tLANGUAGE plpgsql;\n\n"
+        return sql
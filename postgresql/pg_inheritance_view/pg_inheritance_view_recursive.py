@@ -1,37 +1,140 @@
 #!/usr/bin/env python
 
 
+import time
+
 import psycopg2
 import psycopg2.extras
 import yaml
 
+from .catalog import PGCatalog
+from .connection import get_connection, release_connection
+from .enum_type import sql_add_enum_labels
+from .deployment import Deployment, DeploymentError, execute_autocommit
+from .hierarchy import HierarchyIndex
+from .instrumentation import sql_record_call, sql_start_time, sql_stats_table
+from .model import DefinitionModel
+from .statements import split_statements
+from .stats import GeneratorStats
 
-class PGInheritanceViewRecursive():
 
-    def __init__(self, service, definition):
+class PGInheritanceViewRecursive():
 
-        self.conn = psycopg2.connect("service={0}".format(service))
-        self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    def __init__(self, service, definition, catalog=None, instrument=False):
+
+        # the service is a service name, a connection or a pool of connections
+        # without service, the SQL is generated offline from the catalog
+        # (e.g. loaded from a snapshot file with PGCatalog.load)
+        self.service = service
+        if service is None:
+            if catalog is None:
+                raise ValueError(
+                    "A catalog is required to generate the SQL without a service")
+            self.conn = None
+            self.cur = None
+        else:
+            self.conn = get_connection(service)
+            self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
         # Read configuration
-        self.definition = yaml.load(definition)
+        self.definition = yaml.safe_load(definition)
+
+        # if instrument is True, the calls of the trigger functions are
+        # counted and timed in a statistics table
+        self.instrument = instrument
 
         # Recursive process of definition
-        self.nbExecution = 0  # Number of executions
+        # the definitions to execute, by exec_order
+        self.execLevels = {}
         self.processDefinition(self.definition)
 
-    def processDefinition(self, definition):
+        # fetch the columns of all tables of the hierarchy at once, the
+        # catalog is shared between the instances using the same service
+        # statistics of the run (phases, catalog queries, generated batches,
+        # executed SQL)
+        self.stats = GeneratorStats()
+        self.catalog = catalog if catalog is not None else PGCatalog.shared(service)
+        if self.cur is not None:
+            with self.stats.phase('catalog', self.catalog):
+                self.catalog.prefetch(self.cur, self.tables(self.definition))
+                self.catalog.prefetch_enums(self.cur, [self.type_name(definition)
+                                                       for level in self.exec_levels() for definition in level
+                                                       if 'merge_view' in definition])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        # only closes the connection if it was opened by this instance
+        if self.cur is not None:
+            self.cur.close()
+            self.cur = None
+        if self.conn is not None:
+            release_connection(self.service, self.conn)
+            self.conn = None
+
+    def tables(self, definition):
+        tables = []
+        for definitionFieldName in ('table', 'c_table'):
+            if definitionFieldName in definition:
+                tables.append(definition[definitionFieldName])
+        if 'merge_view' in definition and 'additional_joins' in definition['merge_view']:
+            for join in definition['merge_view']['additional_joins']:
+                tables.append(definition['merge_view']['additional_joins'][join]['table'])
+        if 'children' in definition:
+            for child in definition['children']:
+                tables += self.tables(definition['children'][child])
+        return tables
+
+    def join_columns(self, definition=None):
+        # columns used in the joins of the generated views: (table, column, usage)
+        if definition is None:
+            definition = self.definition
+        join_columns = []
+        if 'children' in definition:
+            join_columns.append((definition['table'], definition['pkey'], 'parent key'))
+            for child in definition['children']:
+                join_columns.append((definition['children'][child]['c_table'],
+                                     definition['children'][child]['pkey'],
+                                     'join of {0} on {1}'.format(child, definition['alias'])))
+        if 'merge_view' in definition and 'additional_joins' in definition['merge_view']:
+            for join in definition['merge_view']['additional_joins']:
+                join_definition = definition['merge_view']['additional_joins'][join]
+                join_columns.append((definition['table'], join_definition['fkey'],
+                                     'additional join {0}'.format(join)))
+                join_columns.append((join_definition['table'], join_definition['key'],
+                                     'additional join {0}'.format(join)))
+        if 'children' in definition:
+            for child in definition['children']:
+                join_columns += self.join_columns(definition['children'][child])
+        return join_columns
+
+    def processDefinition(self, definition, parentOrders=()):
         # Recursive process to take in account all children, and subchildren.
         # add alias definition to children to have the same data structure than
         # the top level (parent table)
+        # the lookups of the columns (alter, c_alter, remap, merge columns)
+        # are computed once: in 'model' for the definition and its children,
+        # in 'c_columns' for a child in its parent
+        definition['model'] = DefinitionModel(definition, 'c_alter')
         if 'children' in definition:
-            if 'exec_order' in definition:
-                if self.nbExecution < definition['exec_order']:
-                    self.nbExecution = definition['exec_order']
+            # the definitions with children are scheduled by exec_order, which
+            # defaults to the one of the parent + 1. A definition with the same
+            # exec_order as one of its parents is not scheduled: its views and
+            # triggers are not generated.
+            if 'exec_order' not in definition:
+                definition['exec_order'] = (parentOrders[-1] if parentOrders else 0) + 1
+            if definition['exec_order'] not in parentOrders:
+                self.execLevels.setdefault(definition['exec_order'], []).append(definition)
 
             for child in definition['children']:
                 definition['children'][child]['alias'] = child
-                self.processDefinition(definition['children'][child])
+                definition['children'][child]['c_columns'] = definition['model'].children[child]
+                self.processDefinition(definition['children'][child],
+                                       parentOrders + (definition['exec_order'],))
 
         # defines if a item can be inserted in the parent table only (not any
         # sub-type). Default: true.
@@ -43,50 +146,126 @@ class PGInheritanceViewRecursive():
         if 'merge_view' in definition and 'allow_type_change' in definition['merge_view']:
             definition['allow_type_change'] = definition[
                 'merge_view']['allow_type_change']
+        # defines how the merge_view is built: 'join' joins the parent to all
+        # children, 'union_all' unites a select per child. Default: join
+        definition['merge_strategy'] = 'join'
+        if 'merge_view' in definition and 'merge_strategy' in definition['merge_view']:
+            definition['merge_strategy'] = definition['merge_view']['merge_strategy']
+            if definition['merge_strategy'] not in ('join', 'union_all'):
+                raise ValueError("Unknown merge_strategy {0}".format(
+                    definition['merge_strategy']))
+        if 'merge_view' in definition and definition['merge_view'].get('materialized'):
+            raise ValueError("The materialized merge view of {0} is not supported by the recursive generator".format(
+                definition['alias']))
+        # defines if the merge_view update trigger skips the update of the
+        # tables whose columns did not change. Default: false
+        definition['skip_unchanged'] = False
+        if 'merge_view' in definition and 'skip_unchanged' in definition['merge_view']:
+            definition['skip_unchanged'] = definition['merge_view']['skip_unchanged']
+
+    def sql_start_time(self):
+        return sql_start_time(self.instrument)
+
+    def sql_record_call(self, indent):
+        return sql_record_call(self.instrument, self.definition['schema'], indent)
 
     def executeSql(self, sql):
-        try:
-            self.cur.execute(sql)
-        except psycopg2.ProgrammingError as pe:
-            print("Could not execute SQL:")
-            print(sql)
-            print("Error: {}".format(pe))
-        self.conn.commit()
+        # offline generation: keep the SQL to return it
+        if self.service is None:
+            self.offlineSql += sql
+            return
+        start = time.time()
+        with self.stats.phase('execution'):
+            try:
+                self.cur.execute(sql)
+            except psycopg2.ProgrammingError as pe:
+                print("Could not execute SQL:")
+                print(sql)
+                print("Error: {}".format(pe))
+            self.conn.commit()
+        self.stats.add_statement(sql, time.time() - start)
 
     def getColumns(self, element, childField):
         definitionFieldName = 'table'
         if childField:
             definitionFieldName = 'c_table'
-        self.cur.execute("SELECT attname FROM pg_attribute WHERE attrelid = '{0}'::regclass AND attisdropped IS NOT TRUE AND attnum > 0 ORDER BY attnum ASC".format(
-            element[definitionFieldName]))
-        pg_fields = self.cur.fetchall()
-        pg_fields = [field[0] for field in pg_fields]
+        pg_fields = self.catalog.columns(
+            element[definitionFieldName], self.cur)
         pg_fields.remove(element['pkey'])
         return pg_fields
 
-    def column_alter_read(self, element, column, childField):
-        definitionFieldName = 'alter'
+    def column_lookup(self, element, childField):
+        # precomputed lookups of the columns of the element as parent (table,
+        # alter) or as child (c_table, c_alter)
         if childField:
-            definitionFieldName = 'c_alter'
-        if definitionFieldName in element and column in element[definitionFieldName] and 'read' in element[definitionFieldName][column]:
-            return element[definitionFieldName][column]['read']
-        else:
-            return None
+            return element['c_columns']
+        return element['model'].parent
+
+    def column_alter_read(self, element, column, childField):
+        return self.column_lookup(element, childField).read.get(column)
 
     def column_alter_write(self, element, column, childField):
-        definitionFieldName = 'alter'
-        if childField:
-            definitionFieldName = 'c_alter'
-        if definitionFieldName in element and column in element[definitionFieldName] and 'write' in element[definitionFieldName][column]:
-            return element[definitionFieldName][column]['write']
-        else:
-            return None
+        return self.column_lookup(element, childField).write.get(column)
 
     def column_remap(self, element, column):
-        if 'remap' in element and column in element['remap']:
-            return element['remap'][column]
+        return element['model'].parent.remap.get(column)
+
+    def column_select(self, element, column, childField):
+        return self.column_lookup(element, childField).select(column)
+
+    def column_value(self, element, column, childField):
+        return self.column_lookup(element, childField).value(column)
+
+    def column_merge_value(self, element, column, childField):
+        return self.column_lookup(element, childField).merge_value(column)
+
+    def sql_changed_condition(self, definition, columns, values):
+        # condition to only update the rows of which the columns change
+        if not definition['skip_unchanged']:
+            return ''
+        return " AND ({0}) IS DISTINCT FROM ({1})".format(', '.join(columns), ', '.join(values))
+
+    def deploy(self, partial=False, dry_run=False):
+        # Executes the generated SQL in one single transaction, with a
+        # savepoint per exec_order level, and stops at the first error.
+        # If partial is True, the levels executed before the error are
+        # committed, otherwise everything is rolled back. If dry_run is True,
+        # the transaction is always rolled back. The labels added to the enum
+        # types are committed before the transaction, even in a dry run.
+        # Returns a dict with success, committed and the results of the levels.
+        if self.cur is None:
+            raise ValueError("The deployment requires a database connection")
+
+        deployment = Deployment(self.cur)
+        try:
+            sql = self.sql_enum_labels()
+            if sql:
+                start = time.time()
+                with self.stats.phase('execution'):
+                    deployment.prepare(sql)
+                self.stats.add_statement(sql, time.time() - start)
+            for level, sql in self.batches():
+                start = time.time()
+                with self.stats.phase('execution'):
+                    deployment.execute(level, sql)
+                self.stats.add_statement(sql, time.time() - start)
+            deployment.end_level()
+            success = True
+        except DeploymentError:
+            success = False
+        except Exception:
+            self.conn.rollback()
+            raise
+        levels = deployment.levels
+
+        committed = not dry_run and (success or partial)
+        if committed:
+            self.conn.commit()
         else:
-            return None
+            self.conn.rollback()
+        # the labels are committed even if the levels are rolled back
+        PGCatalog.invalidate(self.service)
+        return {'success': success, 'committed': committed, 'levels': levels}
 
     def join_view_name(self, definition, child, schema_qualified=True):
         name = '{0}.'.format(definition['schema']) if schema_qualified else ''
@@ -94,13 +273,50 @@ class PGInheritanceViewRecursive():
         return name
 
     def sql_all(self):
+        self.offlineSql = ''
+        if self.service is not None:
+            sql = self.sql_enum_labels()
+            if sql:
+                start = time.time()
+                with self.stats.phase('execution'):
+                    execute_autocommit(self.cur, sql)
+                self.stats.add_statement(sql, time.time() - start)
+        for level, sql in self.batches():
+            self.executeSql(sql)
+        if self.service is not None:
+            PGCatalog.invalidate(self.service)
+
+        # return empty SQL because we now execute it in this code
+        # (or the generated SQL when generating offline, without the labels
+        # added to the types: see sql_enum_labels())
+        return self.offlineSql
+
+    def statements(self):
+        # generates the SQL statement by statement
+        for level, sql in self.batches():
+            for statement in split_statements(sql):
+                yield statement
+
+    def batches(self):
+        # generates the SQL in batches, in execution order, as (level, sql)
+        # tuples. The level is the exec_order of the definition, 'setup' for
+        # the statistics table and 'triggers' for the final triggers.
+        batches = self.sql_batches()
+        while True:
+            start = time.time()
+            with self.stats.phase('generation', self.catalog):
+                try:
+                    level, sql = next(batches)
+                except StopIteration:
+                    return
+            self.stats.add_object('batch', str(level), len(sql), time.time() - start)
+            yield level, sql
+
+    def sql_batches(self):
+
         # Get order for sql execution
-        self.listExecDefinition = []
-        for i in range(1, self.nbExecution + 1):
-            definition = self.getDefinitionByExecOrder(
-                self.definition, self.listExecDefinition, i)
+        self.listExecDefinition = [definition for level in self.exec_levels() for definition in level]
 
-        sql = ''
         self.trigCodeInsertDict = {}
         self.trigCodeUpdateDict = {}
         self.trigCodeDeleteDict = {}
@@ -115,9 +331,16 @@ class PGInheritanceViewRecursive():
         self.trigStructMergeUpdateDict = {}
         self.trigStructMergeDeleteDict = {}
 
-        self.REPLACE_TAG = "--TO_REPLACE--"
+        if self.instrument:
+            yield 'setup', sql_stats_table(self.definition['schema'])
 
         for definition in self.listExecDefinition:
+            # the type is (re)created in its own batch
+            if 'merge_view' in definition:
+                sqlType = self.sql_type(definition)
+                if sqlType:
+                    yield definition['exec_order'], sqlType
+
             sqlViews = ''
             # if 'generate_child_views' in definition and
             # definition['generate_child_views']:
@@ -128,9 +351,9 @@ class PGInheritanceViewRecursive():
                 else:
                     sqlViews += self.sql_join_view(definition, child)
 
-            sqlViews += self.sql_merge_view(definition)
+            sqlViews += self.sql_merge_view(definition, False)
             if sqlViews:
-              self.executeSql(sqlViews)
+                yield definition['exec_order'], sqlViews
 
             sqlTriggers = ''
             for child in definition['children']:
@@ -161,20 +384,20 @@ class PGInheritanceViewRecursive():
             sql, sqlStruct = self.sql_merge_insert_trigger(definition, False)
             self.trigCodeMergeInsertDict[definition['alias']] = sql
             self.trigStructMergeInsertDict[definition['alias']] = sqlStruct
-            sqlTriggers += sqlStruct.replace(self.REPLACE_TAG, sql)
+            sqlTriggers += self.compose_trigger(sqlStruct, [sql])
 
             sql, sqlStruct = self.sql_merge_update_trigger(definition, False)
             self.trigCodeMergeUpdateDict[definition['alias']] = sql
             self.trigStructMergeUpdateDict[definition['alias']] = sqlStruct
-            sqlTriggers += sqlStruct.replace(self.REPLACE_TAG, sql)
+            sqlTriggers += self.compose_trigger(sqlStruct, [sql])
 
             sql, sqlStruct = self.sql_merge_delete_trigger(definition, False)
             self.trigCodeMergeDeleteDict[definition['alias']] = sql
             self.trigStructMergeDeleteDict[definition['alias']] = sqlStruct
-            sqlTriggers += sqlStruct.replace(self.REPLACE_TAG, sql)
+            sqlTriggers += self.compose_trigger(sqlStruct, [sql])
 
             if sqlTriggers:
-                self.executeSql(sqlTriggers)
+                yield definition['exec_order'], sqlTriggers
 
             # We also need to store single triggers for root
             if 'isroot' in definition and definition['isroot']:
@@ -201,68 +424,12 @@ class PGInheritanceViewRecursive():
                     'alias']] = sqlDeleteStructTrigger
 
         # Now, generate triggers for each view that needs it
-        self.hierarchy = []
-        self.get_all_hierarchy(self.definition)
+        self.hierarchy = HierarchyIndex(self.definition)
 
-        self.sqlTriggers = ""
+        self.sqlTriggers = []
         self.recursive_triggers(self.definition, 0)
-        self.executeSql(self.sqlTriggers)
-
-        # return empty SQL because we now execute it in this code
-        sql = ''
-        return sql
-
-    def get_all_hierarchy(self, definition, level=1, parents=''):
-        trigHere = ''
-        if 'trig_here' in definition and definition['trig_here'] is True:
-            trigHere = '#t'
-
-        if parents == '':
-            parents = definition['alias'] + trigHere
-        else:
-            parents = parents + ',' + definition['alias'] + trigHere
-        self.hierarchy.append(parents)
-        if 'children' in definition:
-            for child in definition['children']:
-                child_def = definition['children'][child]
-                self.get_all_hierarchy(child_def, level + 1, parents)
-
-    def get_def_hierarchy(self, alias, trigAssociated):
-        gotParents = False
-        relatedDef = []
-        relatedDefParent = []
-        relatedDefChildr = []
-        triTag = '#t'
-        if trigAssociated:
-            # If we arrive here, that means the alias has a trig_here tag
-            # associated
-            alias = alias + triTag
-        for h in self.hierarchy:
-            tabHierarchy = h.split(',')
-            if alias in tabHierarchy:
-                pos = tabHierarchy.index(alias)
-                # If it is at the end of a hierarchy, then take all the parents
-                # and build the triggers with that (ex: element, node)
-                if pos == (len(tabHierarchy) - 1):
-                    if gotParents == False:
-                        relatedDef = list(tabHierarchy)
-                        relatedDefParent = list(tabHierarchy)
-                        gotParents = True
-                else:
-                    # Get the parents
-                    if gotParents == False:
-                        relatedDef = tabHierarchy[:pos]
-                        relatedDefParent = tabHierarchy[:pos]
-                        gotParents = True
-                    # Check if children has trig_here tag too
-                    if tabHierarchy[pos + 1].find(triTag) == -1:
-                        # If no, add it to the list
-                        relatedDef.append(tabHierarchy[pos + 1])
-                        relatedDefChildr.append(tabHierarchy[pos + 1])
-        relatedDef = [d.replace(triTag, '') for d in relatedDef]
-        relatedDefParent = [d.replace(triTag, '') for d in relatedDefParent]
-        relatedDefChildr = [d.replace(triTag, '') for d in relatedDefChildr]
-        return relatedDefParent, relatedDefChildr
+        if self.sqlTriggers:
+            yield 'triggers', ''.join(self.sqlTriggers)
 
     def recursive_triggers(self, definition, level):
         if 'children' in definition:
@@ -274,80 +441,95 @@ class PGInheritanceViewRecursive():
                     # Then generate the trigger at that level, and it must
                     # contains the code of the current def, and the one of the
                     # childrens, and the parent !
-                    relatedDefParent, relatedDefChildren = self.get_def_hierarchy(
-                        child_alias, True)
+                    relatedDefParent, relatedDefChildren = self.hierarchy.related(
+                        child_alias)
 
-                    sqlInsert = ''
-                    sqlUpdate = ''
-                    sqlDelete = ''
+                    # code fragments placed between the header and the
+                    # footer of the triggers
+                    codeInsert = []
+                    codeUpdate = []
+                    codeDelete = []
 
-                    # Fill self.sqlTriggers
-                    sqlInsert = self.trigStructInsertDict[child_alias]
-                    sqlUpdate = self.trigStructUpdateDict[child_alias]
-                    sqlDelete = self.trigStructDeleteDict[child_alias]
-
-                    codeToPlace = ''
                     for rd in relatedDefParent:
 
-                        rdParent, rdChildrens = self.get_def_hierarchy(
-                            rd, True)
+                        rdParent, rdChildrens = self.hierarchy.related(rd)
 
                         if len(rdChildrens) > 0:
                             if rd in self.trigCodeMergeInsertDict:
                                 # We need to take code from
                                 # trigCodeMergeInsertDict
-                                codeToPlace = "{code}\n{replace_code}\n".format(
-                                    code=self.trigCodeMergeInsertDict[rd], replace_code=self.REPLACE_TAG)
-                                sqlInsert = sqlInsert.replace(
-                                    self.REPLACE_TAG, codeToPlace)
-
-                                codeToPlace = "{code}\n{replace_code}\n".format(
-                                    code=self.trigCodeMergeUpdateDict[rd], replace_code=self.REPLACE_TAG)
-                                sqlUpdate = sqlUpdate.replace(
-                                    self.REPLACE_TAG, codeToPlace)
-
+                                codeInsert.append(self.trigCodeMergeInsertDict[rd])
+                                codeUpdate.append(self.trigCodeMergeUpdateDict[rd])
                                 # Important, in the case of delete, reverse
                                 # order of code
-                                codeToPlace = "\n{replace_code}\n{code}".format(
-                                    code=self.trigCodeMergeDeleteDict[rd], replace_code=self.REPLACE_TAG)
-                                sqlDelete = sqlDelete.replace(
-                                    self.REPLACE_TAG, codeToPlace)
+                                codeDelete.insert(0, self.trigCodeMergeDeleteDict[rd])
 
                         else:
-                            codeToPlace = "{code}\n{replace_code}\n".format(
-                                code=self.trigCodeInsertDict[rd], replace_code=self.REPLACE_TAG)
-                            sqlInsert = sqlInsert.replace(
-                                self.REPLACE_TAG, codeToPlace)
-
-                            codeToPlace = "{code}\n{replace_code}\n".format(
-                                code=self.trigCodeUpdateDict[rd], replace_code=self.REPLACE_TAG)
-                            sqlUpdate = sqlUpdate.replace(
-                                self.REPLACE_TAG, codeToPlace)
-
+                            codeInsert.append(self.trigCodeInsertDict[rd])
+                            codeUpdate.append(self.trigCodeUpdateDict[rd])
                             # Important, in the case of delete, reverse order
                             # of code
-                            codeToPlace = "\n{replace_code}\n{code}".format(
-                                code=self.trigCodeDeleteDict[rd], replace_code=self.REPLACE_TAG)
-                            sqlDelete = sqlDelete.replace(
-                                self.REPLACE_TAG, codeToPlace)
-
-                    self.sqlTriggers += "{insert}{update}{delete}".format(
-                        insert=sqlInsert, update=sqlUpdate, delete=sqlDelete)
+                            codeDelete.insert(0, self.trigCodeDeleteDict[rd])
 
-                    self.sqlTriggers += self.sqlTriggers.replace(
-                        self.REPLACE_TAG, "")
+                    self.sqlTriggers.append(self.compose_trigger(
+                        self.trigStructInsertDict[child_alias], codeInsert))
+                    self.sqlTriggers.append(self.compose_trigger(
+                        self.trigStructUpdateDict[child_alias], codeUpdate))
+                    self.sqlTriggers.append(self.compose_trigger(
+                        self.trigStructDeleteDict[child_alias], codeDelete))
 
                 self.recursive_triggers(child_def, level)
 
-    def getDefinitionByExecOrder(self, definition, listExecDefinition, order):
-        if 'exec_order' in definition and definition['exec_order'] == order:
-            listExecDefinition.append(definition)
-        elif 'children' in definition:
-            for child in definition['children']:
-                self.getDefinitionByExecOrder(
-                    definition['children'][child], listExecDefinition, order)
+    def compose_trigger(self, struct, fragments):
+        # struct is the (header, footer) of a trigger, the code fragments are
+        # placed in order between them. The struct is empty if there is no
+        # trigger (e.g. the merge triggers of a definition without merge_view)
+        if not struct:
+            return ''
+        header, footer = struct
+        return "{head}\n{code}\n{foot}".format(
+            head=header, code='\n'.join(fragments), foot=footer)
+
+    def exec_levels(self):
+        # the definitions grouped by exec_order, in execution order. The
+        # definitions of a level are generated in sequence.
+        return [self.execLevels[order] for order in sorted(self.execLevels)]
+
+    def type_name(self, definition):
+        return '{0}.{1}_type'.format(definition['schema'], definition['alias'])
+
+    def type_labels(self, definition):
+        labels = [definition['alias']] if definition['allow_parent_only'] is True else []
+        return labels + list(definition['children'])
+
+    def added_type_labels(self, definition):
+        # ALTER TYPE statements adding the labels of the new children to the
+        # existing type (empty if unchanged), None if the type is (re)created
+        if self.cur is None and not self.catalog.has_enum_labels(self.type_name(definition)):
+            return None
+        existing = self.catalog.enum_labels(self.type_name(definition), self.cur)
+        if existing is None:
+            return None
+        return sql_add_enum_labels(self.type_name(definition), existing, self.type_labels(definition))
+
+    def sql_enum_labels(self):
+        # the labels added to the types of all definitions. They are not part
+        # of the batches: deploy() and sql_all() execute and commit them first,
+        # outside of a transaction block (see execute_autocommit)
+        sql = ''
+        for level in self.exec_levels():
+            for definition in level:
+                if 'merge_view' in definition:
+                    sql += self.added_type_labels(definition) or ''
+        return sql
 
     def sql_type(self, definition):
+        # when the existing labels are known, new children are added to the
+        # type by sql_enum_labels() instead of dropping it with all its
+        # dependent objects
+        if self.added_type_labels(definition) is not None:
+            return ''
+
         sql = "DROP TYPE IF EXISTS {0}.{1}_type CASCADE;".format(
             definition['schema'], definition['alias'])
         sql += "\nCREATE TYPE {0}.{1}_type AS ENUM ({2} {3} );\n\n".format(
@@ -374,17 +556,7 @@ class PGInheritanceViewRecursive():
             if i > 0:
                 forChild = True
             for col in self.getColumns(element, forChild):
-                col_alter_read = self.column_alter_read(element, col, forChild)
-                col_remap = self.column_remap(element, col)
-                sql += "\n\t\t, "
-                if col_alter_read:
-                    sql += "{0}".format(col_alter_read)
-                    if not col_remap:
-                        sql += " AS {0}".format(col)
-                else:
-                    sql += "{0}.{1}".format(element['alias'], col)
-                if col_remap:
-                    sql += " AS {0}".format(col_remap)
+                sql += "\n\t\t, {0}".format(self.column_select(element, col, forChild))
             i += 1
 
         # from tables
@@ -447,17 +619,7 @@ class PGInheritanceViewRecursive():
                     sql += "\t\t-- Now update the existing or created feature in parent table\n"
                     sql += "\t\tUPDATE {0} SET\n".format(definition['table'])
                     for col in parent_columns:
-                        col_alter_write = self.column_alter_write(
-                            definition, col, False)
-                        col_remap = self.column_remap(definition, col)
-
-                        sql += "\t\t\t\t{0} = ".format(col)
-                        if col_alter_write:
-                            sql += '{0}'.format(col_alter_write)
-                        elif col_remap:
-                            sql += 'NEW.{0}'.format(col_remap)
-                        else:
-                            sql += 'NEW.{0}'.format(col)
+                        sql += "\t\t\t\t{0} = {1}".format(col, self.column_value(definition, col, False))
                         sql += ",\n"
 
                     sql = sql[:-2] + '\n'
@@ -472,17 +634,7 @@ class PGInheritanceViewRecursive():
                     definition['pkey_value']
                 )
                 for col in parent_columns:
-                    col_alter_write = self.column_alter_write(
-                        definition, col, False)
-                    col_remap = self.column_remap(definition, col)
-
-                    sql += "\n\t\t\t, "
-                    if col_alter_write:
-                        sql += '{0}'.format(col_alter_write)
-                    elif col_remap:
-                        sql += 'NEW.{0}'.format(col_remap)
-                    else:
-                        sql += 'NEW.{0}'.format(col)
+                    sql += "\n\t\t\t, {0}".format(self.column_value(definition, col, False))
 
                 sql += "\n\t\t) RETURNING {0} INTO NEW.{0};\n".format(definition[
                                                                       'pkey'])
@@ -497,24 +649,13 @@ class PGInheritanceViewRecursive():
                 definition['pkey']
             )
             for col in child_columns:
-                col_alter_write = self.column_alter_write(
-                    definition['children'][child], col, True)
-                col_remap = self.column_remap(
-                    definition['children'][child], col)
-
-                sql += "\n\t\t\t, "
-                if col_alter_write:
-                    sql += '{0}'.format(col_alter_write)
-                elif col_remap:
-                    sql += 'NEW.{0}'.format(col_remap)
-                else:
-                    sql += 'NEW.{0}'.format(col)
+                sql += "\n\t\t\t, {0}".format(self.column_value(definition['children'][child], col, True))
 
             sql += "\n\t\t);\n"
 
         sqlFooter = ''
         # end trigger function
-        sqlFooter += "\t\tRETURN NEW;\n"
+        sqlFooter += self.sql_record_call("\t\t") + "\t\tRETURN NEW;\n"
         sqlFooter += "\tEND;\n"
         sqlFooter += "\t$$\n"
         sqlFooter += "\tLANGUAGE plpgsql;\n\n"
@@ -532,10 +673,7 @@ class PGInheritanceViewRecursive():
         if trig_header:
             sql += sqlFooter
 
-        sqlStruct = "{head}\n{replace_code}\n{foot}".format(
-            head=sqlHeader, foot=sqlFooter, replace_code=self.REPLACE_TAG)
-
-        return sql, sqlStruct
+        return sql, (sqlHeader, sqlFooter)
 
     def sql_join_update_trigger(self, definition, child, trig_header, generateChild, generateParent):
         parent_columns = self.getColumns(definition, False)
@@ -577,17 +715,7 @@ class PGInheritanceViewRecursive():
             if len(cols) > 0:
                 sql += "\n\tUPDATE {0} SET".format(tableName)
                 for col in cols:
-                    col_alter_write = self.column_alter_write(
-                        element, col, forChild)
-                    col_remap = self.column_remap(element, col)
-
-                    sql += "\n\t\t\t{0} = ".format(col)
-                    if col_alter_write:
-                        sql += '{0}'.format(col_alter_write)
-                    elif col_remap:
-                        sql += 'NEW.{0}'.format(col_remap)
-                    else:
-                        sql += 'NEW.{0}'.format(col)
+                    sql += "\n\t\t\t{0} = {1}".format(col, self.column_value(element, col, forChild))
                     sql += ","
 
                 sql = sql[:-1]  # extra comma
@@ -595,7 +723,7 @@ class PGInheritanceViewRecursive():
             i += 1
 
         sqlFooter = ''
-        sqlFooter += "\t\tRETURN NEW;\n"
+        sqlFooter += self.sql_record_call("\t\t") + "\t\tRETURN NEW;\n"
         sqlFooter += "\tEND;\n"
         sqlFooter += "\t$$\n"
         sqlFooter += "\tLANGUAGE plpgsql;\n\n"
@@ -612,10 +740,7 @@ class PGInheritanceViewRecursive():
         if trig_header:
             sql += sqlFooter
 
-        sqlStruct = "{head}\n{replace_code}\n{foot}".format(
-            head=sqlHeader, foot=sqlFooter, replace_code=self.REPLACE_TAG)
-
-        return sql, sqlStruct
+        return sql, (sqlHeader, sqlFooter)
 
     def sql_join_delete_trigger(self, definition, child, trig_header, generateChild, generateParent):
 
@@ -645,7 +770,7 @@ class PGInheritanceViewRecursive():
                     definition['table'], definition['pkey'])
 
         sqlFooter = ''
-        sqlFooter += "\n\t\tRETURN NULL;\n"
+        sqlFooter += "\n" + self.sql_record_call("\t\t") + "\t\tRETURN NULL;\n"
         sqlFooter += "\tEND;\n"
         sqlFooter += "\t$$\n"
         sqlFooter += "\tLANGUAGE plpgsql;\n\n"
@@ -662,16 +787,16 @@ class PGInheritanceViewRecursive():
         if trig_header:
             sql += sqlFooter
 
-        sqlStruct = "{head}\n{replace_code}\n{foot}".format(
-            head=sqlHeader, foot=sqlFooter, replace_code=self.REPLACE_TAG)
-
-        return sql, sqlStruct
+        return sql, (sqlHeader, sqlFooter)
 
-    def sql_merge_view(self, definition):
+    def sql_merge_view(self, definition, withType=True):
         if 'merge_view' not in definition:
             return ''
 
-        sql = self.sql_type(definition)
+        sql = self.sql_type(definition) if withType else ''
+
+        if definition['merge_strategy'] == 'union_all':
+            return sql + self.sql_merge_view_union(definition)
 
         sql += "CREATE OR REPLACE VIEW {0}.{1} AS\n\tSELECT\n\t\tCASE\n".format(
             definition['schema'], definition['merge_view']['name'])
@@ -692,17 +817,7 @@ class PGInheritanceViewRecursive():
         # parent columns
         parent_columns = self.getColumns(definition, False)
         for col in parent_columns:
-            col_alter_read = self.column_alter_read(definition, col, False)
-            col_remap = self.column_remap(definition, col)
-            sql += "\n\t\t, "
-            if col_alter_read:
-                sql += "{0}".format(col_alter_read)
-                if not col_remap:
-                    sql += " AS {0}".format(col)
-            else:
-                sql += "{0}.{1}".format(definition['alias'], col)
-            if col_remap:
-                sql += " AS {0}".format(col_remap)
+            sql += "\n\t\t, {0}".format(self.column_select(definition, col, False))
 
         # additional columns
         if 'additional_columns' in definition['merge_view']:
@@ -711,45 +826,23 @@ class PGInheritanceViewRecursive():
                     definition['merge_view']['additional_columns'][col], col)
 
         # merge columns
-        if 'merge_columns' in definition['merge_view']:
-            for column_alias in definition['merge_view']['merge_columns']:
-                sql += "\n\t\t, CASE"
-                for table_alias in definition['merge_view']['merge_columns'][column_alias]:
-                    sql += "\n\t\t\tWHEN {0}.{1} IS NOT NULL THEN {0}.{2}".format(
-                        table_alias,
-                        definition['children'][table_alias]['pkey'],
-                        definition['merge_view']['merge_columns'][
-                            column_alias][table_alias]
-                    )
-                sql += "\n\t\t\tELSE NULL"
-                sql += "\n\t\tEND AS {0}".format(column_alias)
+        for merge_column in definition['model'].merge_columns:
+            sql += "\n\t\t, CASE"
+            for table_alias in merge_column.fields:
+                sql += "\n\t\t\tWHEN {0}.{1} IS NOT NULL THEN {0}.{2}".format(
+                    table_alias,
+                    definition['children'][table_alias]['pkey'],
+                    merge_column.fields[table_alias]
+                )
+            sql += "\n\t\t\tELSE NULL"
+            sql += "\n\t\tEND AS {0}".format(merge_column.alias)
 
-        # children tables
+        # children tables, without the merged columns
         for child in definition['children']:
-            child_columns = self.getColumns(
-                definition['children'][child], True)
-            # remove merged columns
-            if 'merge_columns' in definition['merge_view']:
-                for column_alias in definition['merge_view']['merge_columns']:
-                    for table_alias in definition['merge_view']['merge_columns'][column_alias]:
-                        if table_alias == child:
-                            child_columns.remove(definition['merge_view'][
-                                                 'merge_columns'][column_alias][child])
-            # add columns
-            for col in child_columns:
-                col_alter_read = self.column_alter_read(
-                    definition['children'][child], col, True)
-                col_remap = self.column_remap(
-                    definition['children'][child], col)
-                sql += "\n\t\t, "
-                if col_alter_read:
-                    sql += "{0}".format(col_alter_read)
-                    if not col_remap:
-                        sql += " AS {0}".format(col)
-                else:
-                    sql += "{0}.{1}".format(child, col)
-                if col_remap:
-                    sql += " AS {0}".format(col_remap)
+            lookup = definition['children'][child]['c_columns']
+            for col in self.getColumns(definition['children'][child], True):
+                if col not in lookup.merged:
+                    sql += "\n\t\t, {0}".format(lookup.select(col))
 
         # from
         sql += "\n\tFROM {0} {1}".format(
@@ -776,6 +869,105 @@ class PGInheritanceViewRecursive():
         sql += ";\n\n"
         return sql
 
+    def column_null(self, element, column, childField):
+        # NULL with the type of the column as read in the views
+        col_alter_read = self.column_alter_read(element, column, childField)
+        tableName = element['c_table'] if childField else element['table']
+        if col_alter_read:
+            return "(SELECT {0} FROM {1} {2} WHERE FALSE)".format(
+                col_alter_read, tableName, element['alias'])
+        return "NULL::{0}".format(self.catalog.column_type(tableName, column, self.cur))
+
+    def sql_merge_view_union(self, definition):
+        # the merge view as UNION ALL of a select per child and of the parent
+        # only rows, the missing columns are padded with typed NULLs.
+        # The type is a constant in each select, filtering on it skips the
+        # selects of the other children. The type of the parent only rows is
+        # NULL if allow_parent_only is not set.
+        branches = list(definition['children']) + [definition['alias']]
+
+        selects = []
+        for branch in branches:
+            if branch in definition['children'] or definition['allow_parent_only']:
+                branch_type = "'{0}'::{1}.{2}_type".format(branch, definition['schema'], definition['alias'])
+            else:
+                branch_type = "NULL::{0}.{1}_type".format(definition['schema'], definition['alias'])
+            sql = "\tSELECT\n\t\t{0} AS {1}_type,\n".format(branch_type, definition['alias'])
+            sql += "\t\t{0}.{1}".format(definition['alias'], definition['pkey'])
+
+            # parent columns
+            for col in self.getColumns(definition, False):
+                sql += "\n\t\t, {0}".format(self.column_select(definition, col, False))
+
+            # additional columns
+            if 'additional_columns' in definition['merge_view']:
+                for col in definition['merge_view']['additional_columns']:
+                    sql += "\n\t\t, {0} AS {1}".format(
+                        definition['merge_view']['additional_columns'][col], col)
+
+            # merge columns
+            for merge_column in definition['model'].merge_columns:
+                fields = merge_column.fields
+                if branch in fields:
+                    sql += "\n\t\t, {0}.{1} AS {2}".format(
+                        branch, fields[branch], merge_column.alias)
+                else:
+                    table_alias = list(fields)[0]
+                    sql += "\n\t\t, NULL::{0} AS {1}".format(self.catalog.column_type(
+                        definition['children'][table_alias]['c_table'], fields[table_alias], self.cur),
+                        merge_column.alias)
+
+            # children columns
+            for child in definition['children']:
+                element = definition['children'][child]
+                lookup = element['c_columns']
+                for col in self.getColumns(element, True):
+                    if col in lookup.merged:
+                        continue
+                    if child != branch:
+                        sql += "\n\t\t, {0} AS {1}".format(self.column_null(element, col, True),
+                                                          lookup.output_name(col))
+                    else:
+                        sql += "\n\t\t, {0}".format(lookup.select(col))
+
+            # from
+            sql += "\n\tFROM {0} {1}".format(
+                definition['table'], definition['alias'])
+            if branch in definition['children']:
+                sql += "\n\t\tINNER JOIN {0} {1} ON {2}.{3} = {1}.{4}".format(
+                    definition['children'][branch]['c_table'],
+                    branch,
+                    definition['alias'],
+                    definition['pkey'],
+                    definition['children'][branch]['pkey']
+                )
+            if 'additional_joins' in definition['merge_view']:
+                for join in definition['merge_view']['additional_joins']:
+                    sql += "\n\t\t{0} JOIN {1} {2} ON {3}.{4} = {2}.{5}".format(
+                        definition['merge_view']['additional_joins'][join]['type'],
+                        definition['merge_view']['additional_joins'][join]['table'],
+                        join,
+                        definition['alias'],
+                        definition['merge_view']['additional_joins'][join]['fkey'],
+                        definition['merge_view']['additional_joins'][join]['key']
+                    )
+            # parent only rows
+            if branch not in definition['children']:
+                sql += "\n\tWHERE {0}".format('\n\t\tAND '.join(
+                    ["NOT EXISTS (SELECT 1 FROM {0} WHERE {0}.{1} = {2}.{3})".format(
+                        definition['children'][child]['c_table'],
+                        definition['children'][child]['pkey'],
+                        definition['alias'],
+                        definition['pkey']
+                    ) for child in definition['children']]))
+            selects.append(sql)
+
+        sql = "CREATE OR REPLACE VIEW {0}.{1} AS\n".format(
+            definition['schema'], definition['merge_view']['name'])
+        sql += "\n\tUNION ALL\n".join(selects)
+        sql += ";\n\n"
+        return sql
+
     def sql_merge_insert_trigger(self, definition, trig_header):
         if 'merge_view' not in definition:
             return '', ''
@@ -824,19 +1016,7 @@ class PGInheritanceViewRecursive():
                 sql += "\t\t-- Now update the existing or created feature in parent table\n"
                 sql += "\t\tUPDATE {0} SET\n".format(definition['table'])
                 for col in parent_columns:
-                    col_alter_write = self.column_alter_write(
-                        definition, col, False)
-                    col_remap = self.column_remap(definition, col)
-                    if not col_remap:
-                        col_remap = col
-
-                    sql += "\t\t\t\t{0} = ".format(col)
-                    if col_alter_write:
-                        sql += '{0}'.format(col_alter_write)
-                    elif col_remap:
-                        sql += 'NEW.{0}'.format(col_remap)
-                    else:
-                        sql += 'NEW.{0}'.format(col)
+                    sql += "\t\t\t\t{0} = {1}".format(col, self.column_value(definition, col, False))
                     sql += ",\n"
 
                 sql = sql[:-2] + '\n'
@@ -852,17 +1032,7 @@ class PGInheritanceViewRecursive():
                 definition['pkey_value']
             )
             for col in parent_columns:
-                col_alter_write = self.column_alter_write(
-                    definition, col, False)
-                col_remap = self.column_remap(definition, col)
-
-                sql += "\n\t\t\t, "
-                if col_alter_write:
-                    sql += '{0}'.format(col_alter_write)
-                elif col_remap:
-                    sql += 'NEW.{0}'.format(col_remap)
-                else:
-                    sql += 'NEW.{0}'.format(col)
+                sql += "\n\t\t\t, {0}".format(self.column_value(definition, col, False))
 
             sql += "\n\t\t) RETURNING {0} INTO NEW.{0};\n".format(definition[
                                                                   'pkey'])
@@ -885,24 +1055,7 @@ class PGInheritanceViewRecursive():
             )
 
             for col in child_columns:
-                col_alter_write = self.column_alter_write(
-                    definition['children'][child], col, True)
-                col_remap = self.column_remap(
-                    definition['children'][child], col)
-                if not col_remap:
-                    col_remap = col
-                    # replace remapped column by merged column alias if exists
-                    if 'merge_columns' in definition['merge_view']:
-                        for column_alias in definition['merge_view']['merge_columns']:
-                            for table_alias in definition['merge_view']['merge_columns'][column_alias]:
-                                if table_alias == child:
-                                    if col_remap == definition['merge_view']['merge_columns'][column_alias][table_alias]:
-                                        col_remap = column_alias
-                sql += "\n\t\t\t\t, "
-                if col_alter_write:
-                    sql += "{0}".format(col_alter_write)
-                else:
-                    sql += 'NEW.{0}'.format(col_remap)
+                sql += "\n\t\t\t\t, {0}".format(self.column_merge_value(definition['children'][child], col, True))
             sql += "\n\t\t);\n"
         sql += "\n\t\t ELSE NULL;"
         sql += "\n\t END CASE;\n"
@@ -913,10 +1066,7 @@ class PGInheritanceViewRecursive():
         if trig_header:
             sql += sqlFooter
 
-        sqlStruct = "{head}\n{replace_code}\n{foot}".format(
-            head=sqlHeader, foot=sqlFooter, replace_code=self.REPLACE_TAG)
-
-        return sql, sqlStruct
+        return sql, (sqlHeader, sqlFooter)
 
     def sql_merge_update_trigger(self, definition, trig_header):
         if 'merge_view' not in definition:
@@ -940,23 +1090,15 @@ class PGInheritanceViewRecursive():
         # parent columns
         cols = self.getColumns(definition, False)
         if len(cols) > 0:
+            values = []
             sql += "\n\tUPDATE {0} SET".format(definition['table'])
             for col in cols:
-                col_alter_write = self.column_alter_write(
-                    definition, col, False)
-                col_remap = self.column_remap(definition, col)
-
-                sql += "\n\t\t\t{0} = ".format(col)
-                if col_alter_write:
-                    sql += '{0}'.format(col_alter_write)
-                elif col_remap:
-                    sql += 'NEW.{0}'.format(col_remap)
-                else:
-                    sql += 'NEW.{0}'.format(col)
-                sql += ","
+                values.append(self.column_value(definition, col, False))
+                sql += "\n\t\t\t{0} = {1},".format(col, values[-1])
 
             sql = sql[:-1]  # extra comma
-            sql += "\n\t\tWHERE {0} = OLD.{0};".format(definition['pkey'])
+            sql += "\n\t\tWHERE {0} = OLD.{0}{1};".format(
+                definition['pkey'], self.sql_changed_condition(definition, cols, values))
 
         # do not allow parent only insert
         # if not self.allow_parent_only:
@@ -997,30 +1139,12 @@ class PGInheritanceViewRecursive():
                     definition['pkey']
                 )
                 for col in child_columns:
-                    col_alter_write = self.column_alter_write(
-                        definition['children'][child], col, True)
-                    col_remap = self.column_remap(
-                        definition['children'][child], col)
-                    if not col_remap:
-                        col_remap = col
-                        # replace remapped column by merged column alias if
-                        # exists
-                        if 'merge_columns' in definition['merge_view']:
-                            for column_alias in definition['merge_view']['merge_columns']:
-                                for table_alias in definition['merge_view']['merge_columns'][column_alias]:
-                                    if table_alias == child:
-                                        if col_remap == definition['merge_view']['merge_columns'][column_alias][table_alias]:
-                                            col_remap = column_alias
-                    sql += "\n\t\t\t\t\t\t, "
-                    if col_alter_write:
-                        sql += "{0}".format(col_alter_write)
-                    else:
-                        sql += 'NEW.{0}'.format(col_remap)
+                    sql += "\n\t\t\t\t\t\t, {0}".format(self.column_merge_value(definition['children'][child], col, True))
                 sql += "\n\t\t\t\t\t);"
             sql += "\n\t\t\tELSE NULL;"
             sql += "\n\t\tEND CASE;"
             sql += "\n\t\t-- return now as child has been updated"
-            sql += "\n\t\tRETURN NEW;"
+            sql += "\n" + self.sql_record_call("\t\t") + "\t\tRETURN NEW;"
         # forbid type change
         else:
             sql += "\n\t\tRAISE EXCEPTION 'Type change not allowed for {0}'".format(definition[
@@ -1042,32 +1166,17 @@ class PGInheritanceViewRecursive():
             if len(child_columns) == 0:
                 sql += "\n\t\tNULL;"
             else:
+                values = []
                 sql += "UPDATE {0} SET\n\t\t\t".format(
                     definition['children'][child]['c_table'])
                 for col in child_columns:
-                    col_alter_write = self.column_alter_write(
-                        definition['children'][child], col, True)
-                    col_remap = self.column_remap(
-                        definition['children'][child], col)
-                    if not col_remap:
-                        col_remap = col
-                        # replace remapped column by merged column alias if
-                        # exists
-                        if 'merge_columns' in definition['merge_view']:
-                            for column_alias in definition['merge_view']['merge_columns']:
-                                for table_alias in definition['merge_view']['merge_columns'][column_alias]:
-                                    if table_alias == child:
-                                        if col_remap == definition['merge_view']['merge_columns'][column_alias][table_alias]:
-                                            col_remap = column_alias
-                    sql += "{0} = ".format(col)
-                    if col_alter_write:
-                        sql += "{0}".format(col_alter_write)
-                    else:
-                        sql += 'NEW.{0}'.format(col_remap)
+                    values.append(self.column_merge_value(definition['children'][child], col, True))
+                    sql += "{0} = {1}".format(col, values[-1])
                     sql += "\n\t\t\t, "
                 sql = sql[:-3]
-                sql += "WHERE {0} = OLD.{1};".format(definition['children'][child][
-                                                     'pkey'], definition['pkey'])
+                sql += "WHERE {0} = OLD.{1}{2};".format(definition['children'][child]['pkey'],
+                                                       definition['pkey'],
+                                                       self.sql_changed_condition(definition, child_columns, values))
         sql += "\n\t\tELSE NULL;"
         sql += "\n\tEND CASE;\n"
 
@@ -1077,10 +1186,7 @@ class PGInheritanceViewRecursive():
         if trig_header:
             sql += sqlFooter
 
-        sqlStruct = "{head}\n{replace_code}\n{foot}".format(
-            head=sqlHeader, foot=sqlFooter, replace_code=self.REPLACE_TAG)
-
-        return sql, sqlStruct
+        return sql, (sqlHeader, sqlFooter)
 
     def sql_merge_delete_trigger(self, definition, trig_header):
         if 'merge_view' not in definition:
@@ -1122,21 +1228,18 @@ class PGInheritanceViewRecursive():
         if trig_header:
             sql += sqlFooter
 
-        sqlStruct = "{head}\n{replace_code}\n{foot}".format(
-            head=sqlHeader, foot=sqlFooter, replace_code=self.REPLACE_TAG)
-
-        return sql, sqlStruct
+        return sql, (sqlHeader, sqlFooter)
 
     def getTriggerHeader(self, functrigger):
         sqlHeader = "\nCREATE OR REPLACE FUNCTION {0}()".format(functrigger)
         sqlHeader += "\n\tRETURNS trigger AS"
         sqlHeader += "\n\t$$"
-        sqlHeader += "\n\tBEGIN"
+        sqlHeader += "\n" + self.sql_start_time() + "\tBEGIN"
         return sqlHeader
 
     def getTriggerFooter(self, definition, trigger, functrigger, mode, ret):
         sqlFooter = ''
-        sqlFooter += "\n\tRETURN {ret};\n".format(ret=ret)
+        sqlFooter += "\n" + self.sql_record_call("\t") + "\tRETURN {ret};\n".format(ret=ret)
         sqlFooter += "\tEND;\n"
         sqlFooter += "\t$$\n"
         sqlFooter += "\tLANGUAGE plpgsql;\n\n"
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+
+import glob
+import hashlib
+import json
+import os
+import time
+
+import yaml
+
+from .catalog import PGCatalog
+from .connection import get_connection, release_connection
+from .pg_inheritance_view_recursive import PGInheritanceViewRecursive
+
+
+def definition_objects(definition, tables=None, types=None):
+    # tables and enum types (schema qualified) used by a raw definition, for
+    # PGInheritanceView as well as for PGInheritanceViewRecursive
+    if tables is None:
+        tables = []
+        types = []
+    for field in ('table', 'c_table'):
+        if field in definition and definition[field] not in tables:
+            tables.append(definition[field])
+    if 'merge_view' in definition:
+        if 'alias' in definition and 'schema' in definition:
+            types.append('{0}.{1}_type'.format(definition['schema'], definition['alias']))
+        for join in definition['merge_view'].get('additional_joins', {}).values():
+            if join['table'] not in tables:
+                tables.append(join['table'])
+    for child in definition.get('children', {}):
+        definition['children'][child].setdefault('alias', child)
+        definition_objects(definition['children'][child], tables, types)
+    return tables, types
+
+
+class PGSqlCache():
+    # On-disk cache of the SQL generated by sql_enum_labels() and sql_all(),
+    # keyed by a hash of the parsed definition, the generator options, the
+    # code of the generators and a fingerprint of the columns of the tables
+    # and of the labels of the types involved: the one of the database if a
+    # service is given, and the one of the entries of the catalog if a
+    # catalog is given. On a hit, neither the catalog of the generator is
+    # fetched nor the SQL generated. On a miss with a service and without a
+    # catalog, the SQL is generated from a fresh catalog (the shared catalog
+    # of the service may be older than the fingerprint).
+    # The entries older than max_age (in seconds) are removed, and the least
+    # recently used ones when the cache is larger than max_size (in bytes).
+
+    # hash of the code of the generators, computed once
+    _code_hash = None
+
+    def __init__(self, directory, max_age=None, max_size=None):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @classmethod
+    def code_hash(cls):
+        if cls._code_hash is None:
+            code = hashlib.sha256()
+            for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+                with open(path, 'rb') as f:
+                    code.update(f.read())
+            cls._code_hash = code.hexdigest()
+        return cls._code_hash
+
+    def catalog_fingerprint(self, catalog, tables, types):
+        # the fingerprint of the catalog entries
+        return json.dumps({'tables': dict([(table, catalog.tables.get(table)) for table in tables]),
+                           'enums': dict([(enum, catalog.enums.get(enum, '?')) for enum in types])},
+                          sort_keys=True)
+
+    def live_fingerprint(self, service, tables, types):
+        # the fingerprint of the database
+        conn = get_connection(service)
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+SELECT
+    (SELECT md5(string_agg(t.name || ':' || a.attname || ':' || format_type(a.atttypid, a.atttypmod) || ':' ||
+                           COALESCE(a.attnum = ANY(i.indkey), FALSE)::text, ',' ORDER BY t.name, a.attnum))
+     FROM unnest(%s::text[]) AS t(name)
+        INNER JOIN pg_attribute a ON a.attrelid = t.name::regclass
+        LEFT JOIN pg_index i ON i.indrelid = a.attrelid AND i.indisprimary
+     WHERE a.attisdropped IS NOT TRUE AND a.attnum > 0),
+    (SELECT md5(string_agg(n.nspname || '.' || t.typname || ':' || e.enumlabel, ',' ORDER BY n.nspname, t.typname, e.enumsortorder))
+     FROM pg_type t
+        INNER JOIN pg_namespace n ON n.oid = t.typnamespace
+        INNER JOIN pg_enum e ON e.enumtypid = t.oid
+     WHERE n.nspname || '.' || t.typname = ANY(%s))""", (tables, types))
+            fingerprint = ':'.join([str(value) for value in cur.fetchone()])
+            cur.close()
+        finally:
+            release_connection(service, conn)
+        return fingerprint
+
+    def key(self, generator_class, service, definition, catalog=None, **options):
+        parsed = yaml.safe_load(definition)
+        key = hashlib.sha256()
+        key.update(self.code_hash().encode('utf-8'))
+        key.update(generator_class.__name__.encode('utf-8'))
+        key.update(json.dumps([parsed, options], sort_keys=True, default=str).encode('utf-8'))
+        tables, types = definition_objects(parsed)
+        if service is not None:
+            key.update(self.live_fingerprint(service, tables, types).encode('utf-8'))
+        if catalog is not None:
+            key.update(self.catalog_fingerprint(catalog, tables, types).encode('utf-8'))
+        return key.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, '{0}.sql'.format(key))
+
+    def sql_all(self, generator_class, service, definition, catalog=None, **options):
+        # returns the SQL of generator_class(service, definition, catalog, **options):
+        # sql_enum_labels() followed by sql_all() (see split_enum_labels)
+        if generator_class is PGInheritanceViewRecursive and service is not None:
+            raise ValueError(
+                "PGInheritanceViewRecursive executes its SQL, it can only be cached offline")
+        if service is None and catalog is None:
+            raise ValueError(
+                "A catalog is required to generate the SQL without a service")
+
+        path = self.path(self.key(generator_class, service, definition, catalog, **options))
+        if os.path.exists(path):
+            with open(path) as f:
+                sql = f.read()
+            # keep track of the use for the eviction
+            os.utime(path, None)
+            return sql
+
+        if catalog is None:
+            catalog = PGCatalog()
+        generator = generator_class(service, definition, catalog, **options)
+        try:
+            sql = generator.sql_enum_labels() + generator.sql_all()
+        finally:
+            generator.close()
+
+        temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'w') as f:
+            f.write(sql)
+        os.rename(temp_path, path)
+        self.evict()
+        return sql
+
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.sql')):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        if self.max_age is not None:
+            limit = time.time() - self.max_age
+            for entry in [entry for entry in entries if entry[0] < limit]:
+                os.remove(entry[2])
+                entries.remove(entry)
+        if self.max_size is not None:
+            size = sum([entry[1] for entry in entries])
+            # least recently used first
+            while len(entries) > 0 and size > self.max_size:
+                mtime, entry_size, path = entries.pop(0)
+                os.remove(path)
+                size -= entry_size
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, '*.sql')):
+            os.remove(path)
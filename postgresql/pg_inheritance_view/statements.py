@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+
+import re
+import time
+
+# Splitting of the generated SQL in single statements, and consumers of the
+# statement generators of PGInheritanceView and PGInheritanceViewRecursive.
+
+TOKENS = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$([A-Za-z_][A-Za-z0-9_]*)?\$|;",
+                    re.DOTALL)
+
+
+def split_statements(sql):
+    # yields the statements of the SQL, without splitting in the comments,
+    # quoted strings, quoted identifiers and dollar quoted bodies
+    start = 0
+    pos = 0
+    while True:
+        match = TOKENS.search(sql, pos)
+        if match is None:
+            break
+        token = match.group(0)
+        pos = match.end()
+        if token.startswith('$'):
+            # dollar quoted: skip to the closing tag
+            end = sql.find(token, pos)
+            pos = len(sql) if end < 0 else end + len(token)
+        elif token == ';':
+            statement = sql[start:pos].strip()
+            if statement != ';':
+                yield statement
+            start = pos
+    statement = sql[start:].strip()
+    if statement:
+        yield statement
+
+
+def write_statements(statements, f):
+    # writes the statements to a file (or sys.stdout)
+    count = 0
+    for statement in statements:
+        f.write(statement + '\n')
+        count += 1
+    return count
+
+
+def execute_statements(statements, cur, stats=None):
+    # executes the statements with the cursor as they are generated, their
+    # execution time is recorded in the stats (GeneratorStats) if given
+    count = 0
+    for statement in statements:
+        start = time.time()
+        cur.execute(statement)
+        if stats is not None:
+            seconds = time.time() - start
+            stats.add_statement(statement, seconds)
+            stats.phases['execution'] = stats.phases.get('execution', 0.0) + seconds
+        count += 1
+    return count
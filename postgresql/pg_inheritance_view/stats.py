@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+
+import time
+from contextlib import contextmanager
+
+
+class GeneratorStats():
+    # Statistics of a generator run: wall time per phase, counters (e.g. the
+    # catalog queries), size and generation time of each generated object
+    # (view, trigger, batch) and execution time of each executed statement.
+    # to_dict() gives them in a JSON serializable form (read back with
+    # from_dict(), e.g. from a worker process), report() as text.
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.objects = []
+        self.statements = []
+
+    @contextmanager
+    def phase(self, name, catalog=None):
+        # times the phase, and counts the queries of the catalog in it
+        start = time.time()
+        queries = catalog.queries if catalog is not None else 0
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.time() - start
+            if catalog is not None:
+                self.count('catalog_queries', catalog.queries - queries)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_object(self, kind, name, size, seconds):
+        self.objects.append({'kind': kind, 'name': name, 'size': size, 'time': seconds})
+
+    def add_statement(self, sql, seconds):
+        # statements are identified by their first line
+        self.statements.append({'statement': sql.strip().split('\n')[0], 'time': seconds})
+
+    def to_dict(self):
+        return {'phases': dict(self.phases),
+                'counters': dict(self.counters),
+                'objects': list(self.objects),
+                'statements': list(self.statements),
+                'size': sum([generated['size'] for generated in self.objects])}
+
+    @classmethod
+    def from_dict(cls, data):
+        # the size is computed from the objects
+        stats = cls()
+        stats.phases = dict(data.get('phases', {}))
+        stats.counters = dict(data.get('counters', {}))
+        stats.objects = list(data.get('objects', []))
+        stats.statements = list(data.get('statements', []))
+        return stats
+
+    def report(self):
+        lines = []
+        for name in sorted(self.phases):
+            lines.append("phase {0}: {1:.3f} s".format(name, self.phases[name]))
+        for name in sorted(self.counters):
+            lines.append("{0}: {1}".format(name, self.counters[name]))
+        lines.append("generated: {0} objects, {1} bytes".format(
+            len(self.objects), sum([generated['size'] for generated in self.objects])))
+        for generated in sorted(self.objects, key=lambda generated: -generated['time'])[:10]:
+            lines.append("  {0} {1}: {2} bytes, {3:.3f} s".format(
+                generated['kind'], generated['name'], generated['size'], generated['time']))
+        if len(self.statements) > 0:
+            lines.append("executed: {0} statements, {1:.3f} s".format(
+                len(self.statements), sum([statement['time'] for statement in self.statements])))
+            for statement in sorted(self.statements, key=lambda statement: -statement['time'])[:10]:
+                lines.append("  {0:.3f} s {1}".format(statement['time'], statement['statement']))
+        return '\n'.join(lines)
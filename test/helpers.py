@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# Fixtures and fakes shared by the offline tests, which generate the SQL from
+# a catalog snapshot without any database connection.
+
+import copy
+import json
+import os
+import sys
+import tempfile
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+sys.path.append(os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), 'postgresql'))
+from pg_inheritance_view.catalog import PGCatalog
+from pg_inheritance_view.incremental import ENUM, FINGERPRINT_TABLE, FUNCTION, TRIGGER, fingerprint
+
+
+class RecordingConnection():
+    # connection of a RecordingCursor, recording the commits and rollbacks as
+    # statements
+
+    def __init__(self, cur):
+        self.cur = cur
+        self.autocommit = False
+
+    def commit(self):
+        self.cur.statements.append("COMMIT;")
+
+    def rollback(self):
+        self.cur.statements.append("ROLLBACK;")
+
+
+class RecordingCursor():
+    # cursor recording the statements (and the ones executed in autocommit
+    # mode) and the data given to COPY, failing on the statements containing
+    # FAIL. fetchone() returns the given row.
+
+    def __init__(self, row=None):
+        self.statements = []
+        self.autocommitted = []
+        self.copied = []
+        self.row = row
+        self.connection = RecordingConnection(self)
+
+    def execute(self, sql, params=None):
+        if 'FAIL' in sql:
+            raise psycopg2.ProgrammingError("syntax error at or near FAIL")
+        self.statements.append(sql)
+        if self.connection.autocommit:
+            self.autocommitted.append(sql)
+
+    def copy_expert(self, sql, f):
+        self.statements.append(sql)
+        self.copied.append(f.read())
+
+    def fetchone(self):
+        return self.row
+
+
+class CatalogCursor():
+    # cursor answering the catalog queries of PGCatalog from the tables of a
+    # snapshot, recording the queries
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+        if 'pg_attribute' in sql:
+            self.rows = [(name, column, self.tables[name]['types'][column], column in self.tables[name]['pkey'],
+                          column in self.tables[name].get('indexed', []))
+                         for name in sorted(params[0]) if name in self.tables
+                         for column in self.tables[name]['columns']]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection(psycopg2.extensions.connection):
+    # connection given by the caller (as a psycopg2 connection), without
+    # database: cursor() returns the given cursor
+
+    def __init__(self, cur=None):
+        self.cur = cur
+        self.closed_by = None
+
+    def cursor(self, cursor_factory=None):
+        return self.cur
+
+    def close(self):
+        self.closed_by = 'close'
+
+
+class FakePool(psycopg2.pool.AbstractConnectionPool):
+    # pool of FakeConnection, recording the connections given back
+
+    def __init__(self, cur=None):
+        self.cur = cur
+        self.put = []
+
+    def getconn(self, key=None):
+        return FakeConnection(self.cur)
+
+    def putconn(self, conn, key=None, close=False):
+        self.put.append(conn)
+
+
+class LiveCatalogCursor():
+    # cursor answering the catalog queries of PGInheritanceDiff as if the
+    # given objects were deployed, with their fingerprints if fingerprints is
+    # True
+
+    def __init__(self, objects, fingerprints=True):
+        self.objects = objects
+        self.fingerprints = fingerprints
+        self.queries = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+        everything = ''.join([object_sql for kind, name, object_sql in self.objects])
+        if 'to_regclass' in sql:
+            self.rows = [(name, name.endswith(FINGERPRINT_TABLE) and self.fingerprints or
+                          name in [object_name for kind, object_name, object_sql in self.objects])
+                         for name in params[0]]
+        elif FINGERPRINT_TABLE in sql:
+            self.rows = [(name, fingerprint(object_sql)) for kind, name, object_sql in self.objects]
+        elif 'pg_proc' in sql:
+            self.rows = [(match.group(1), match.group(2)) for match in FUNCTION.finditer(everything)]
+        elif 'pg_trigger' in sql:
+            self.rows = [(match.group(1), match.group(2)) for match in TRIGGER.finditer(everything)]
+        else:
+            self.rows = [(match.group(1), [label.strip().strip("'") for label in match.group(2).split(',')])
+                         for match in ENUM.finditer(everything)]
+
+    def fetchall(self):
+        return self.rows
+
+
+# catalog of the tables from data_sample.sql
+snapshot = {
+    'tables': {
+        'vehicle': {
+            'columns': ['id', 'year', 'year_end', 'model_name'],
+            'types': {'id': 'integer', 'year': 'smallint', 'year_end': 'smallint', 'model_name': 'text'},
+            'pkey': ['id'],
+            'indexed': ['id']
+        },
+        'car': {
+            'columns': ['id', 'fk_brand', 'max_speed'],
+            'types': {'id': 'integer', 'fk_brand': 'integer', 'max_speed': 'smallint'},
+            'pkey': []
+        },
+        'motorbike': {
+            'columns': ['id', 'fk_brand', 'max_speed'],
+            'types': {'id': 'integer', 'fk_brand': 'integer', 'max_speed': 'smallint'},
+            'pkey': []
+        }
+    }
+}
+
+definition = """
+alias: vehicle
+table: vehicle
+pkey: id
+pkey_value: nextval('vehicle_id_seq')
+schema: test_offline
+children:
+  car:
+    table: car
+    pkey: id
+    remap:
+      fk_brand: fk_car_brand
+  bike:
+    table: motorbike
+    pkey: id
+    remap:
+      fk_brand: fk_bike_brand
+merge_view:
+  name: vw_vehicle_all
+  additional_columns:
+    for_sale: year_end IS NULL OR year_end >= extract(year from now())
+  allow_type_change: true
+  merge_columns:
+    top_speed:
+      car: max_speed
+      bike: max_speed
+"""
+
+recursive_definition = """
+alias: vehicle
+table: vehicle
+pkey: id
+pkey_value: nextval('vehicle_id_seq')
+schema: test_offline
+exec_order: 1
+trig_here: true
+isroot: true
+children:
+  car:
+    table: car
+    c_table: car
+    pkey: id
+    trig_here: true
+    remap:
+      fk_brand: fk_car_brand
+  bike:
+    table: motorbike
+    c_table: motorbike
+    pkey: id
+    trig_here: true
+    remap:
+      fk_brand: fk_bike_brand
+merge_view:
+  name: vw_vehicle_all
+  allow_type_change: true
+  merge_columns:
+    top_speed:
+      car: max_speed
+      bike: max_speed
+"""
+
+
+def merge_view_option(yaml, option):
+    # the definition with an additional option of the merge view
+    return yaml.replace("allow_type_change: true", "allow_type_change: true\n  {0}".format(option))
+
+
+def snapshot_catalog():
+    # a fresh catalog of the snapshot, which the tests may modify
+    catalog = PGCatalog()
+    catalog.tables = copy.deepcopy(snapshot['tables'])
+    return catalog
+
+
+def write_snapshot():
+    # path of a temporary snapshot file, to be removed by the caller
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        f.write(json.dumps(snapshot))
+    return path
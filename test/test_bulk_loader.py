@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+import unittest
+
+import psycopg2
+
+from .helpers import RecordingCursor, definition, snapshot_catalog
+from pg_inheritance_view.bulk_loader import IteratorFile, PGInheritanceLoader
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.generator = PGInheritanceView(None, definition, snapshot_catalog())
+        self.generator.cur = RecordingCursor(row=(2,))
+        self.generator.conn = self.generator.cur.connection
+
+    def test_iterator_file(self):
+        rows = [('car', 'say "hi"', None), ('bike', 'a,b\nc', ''), ('car', 1963, "it's")]
+        data = '"car","say ""hi""",\n"bike","a,b\nc",""\n"car","1963","it\'s"\n'
+        self.assertEqual(IteratorFile(rows).read(), data)
+        # read in chunks as COPY does
+        f = IteratorFile(rows)
+        chunks = []
+        while True:
+            chunk = f.read(5)
+            if not chunk:
+                break
+            self.assertLessEqual(len(chunk), 5)
+            chunks.append(chunk)
+        self.assertEqual(''.join(chunks), data)
+
+    def test_load(self):
+        loader = PGInheritanceLoader(self.generator)
+        self.assertEqual(loader.load([('car', None, 'DB5', 1963)], ['vehicle_type', 'id', 'model_name', 'year']), 2)
+        statements = self.generator.cur.statements
+        self.assertEqual(statements[:2], [
+            "CREATE TEMP TABLE _load_vw_vehicle_all (LIKE test_offline.vw_vehicle_all) ON COMMIT DROP;",
+            "COPY _load_vw_vehicle_all (vehicle_type, id, model_name, year) FROM STDIN WITH (FORMAT csv)"])
+        self.assertEqual(self.generator.cur.copied, ['"car",,"DB5","1963"\n'])
+        self.assertEqual(statements[2:-3], self.generator.sql_bulk_insert_statements('_load_vw_vehicle_all'))
+        self.assertEqual(statements[-3:], ["SELECT count(*) FROM _load_vw_vehicle_all;",
+                                           "DROP TABLE _load_vw_vehicle_all;", "COMMIT;"])
+
+    def test_load_error(self):
+        loader = PGInheritanceLoader(self.generator, staging='FAIL')
+        self.assertRaises(psycopg2.Error, loader.load, [], ['id'])
+        self.assertEqual(self.generator.cur.statements, ["ROLLBACK;"])
+
+    def test_bulk_insert_statements(self):
+        statements = self.generator.sql_bulk_insert_statements('_staging')
+        self.assertEqual(statements[0],
+                         "UPDATE _staging _bulk SET id = nextval('vehicle_id_seq') WHERE _bulk.id IS NULL;")
+        self.assertEqual(statements[1], "INSERT INTO vehicle (\n\t\tid\n\t\t, year\n\t\t, year_end\n\t\t, model_name\n"
+                                        "\t) SELECT\n\t\t_bulk.id\n\t\t, _bulk.year\n\t\t, _bulk.year_end\n"
+                                        "\t\t, _bulk.model_name\n\tFROM _staging _bulk;")
+        self.assertEqual(statements[2], "INSERT INTO car (\n\t\tid\n\t\t, fk_brand\n\t\t, max_speed\n\t) SELECT\n"
+                                        "\t\t_bulk.id\n\t\t, _bulk.fk_car_brand\n\t\t, _bulk.top_speed\n"
+                                        "\tFROM _staging _bulk\n"
+                                        "\tWHERE _bulk.vehicle_type = 'car'::test_offline.vehicle_type;")
+        self.assertEqual(len(statements), 4)
+        self.assertIn("_bulk.fk_bike_brand", statements[3])
+
+    def test_bulk_update_delete_statements(self):
+        self.assertEqual(self.generator.sql_bulk_update_statements('_staging')[1],
+                         "UPDATE car car SET\n\t\tfk_brand = _bulk.fk_car_brand\n\t\t, max_speed = _bulk.top_speed\n"
+                         "\tFROM _staging _bulk\n\tWHERE car.id = _bulk.id;")
+        self.assertEqual(self.generator.sql_bulk_delete_statements('_staging'), [
+            "DELETE FROM car car USING _staging _bulk WHERE car.id = _bulk.id;",
+            "DELETE FROM motorbike bike USING _staging _bulk WHERE bike.id = _bulk.id;",
+            "DELETE FROM vehicle vehicle USING _staging _bulk WHERE vehicle.id = _bulk.id;"])
+
+
+if __name__ == '__main__':
+    unittest.main()
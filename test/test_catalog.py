@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+from .helpers import CatalogCursor, FakeConnection, recursive_definition, snapshot, write_snapshot
+from pg_inheritance_view.catalog import PGCatalog
+from pg_inheritance_view.pg_inheritance_view_recursive import PGInheritanceViewRecursive
+
+
+class TestCatalog(unittest.TestCase):
+
+    def test_snapshot_roundtrip(self):
+        snapshot_path = write_snapshot()
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            catalog = PGCatalog.load(snapshot_path)
+            catalog.dump(path)
+            self.assertEqual(PGCatalog.load(path).tables, catalog.tables)
+        finally:
+            os.remove(snapshot_path)
+            os.remove(path)
+
+    def test_prefetch(self):
+        # the tables of the whole definition, nested children included, are
+        # fetched with one query
+        tables = dict(snapshot['tables'])
+        tables['scooter'] = {'columns': ['id', 'engine_size', 'electric'],
+                             'types': {'id': 'integer', 'engine_size': 'smallint', 'electric': 'boolean'},
+                             'pkey': ['id']}
+        definition = recursive_definition.replace(
+            "  bike:\n", "  bike:\n    children:\n      scooter:\n        table: scooter\n        c_table: scooter\n"
+            "        pkey: id\n")
+        cur = CatalogCursor(tables)
+        catalog = PGCatalog()
+        PGInheritanceViewRecursive(FakeConnection(cur), definition, catalog)
+        queries = [params[0] for sql, params in cur.queries if 'pg_attribute' in sql]
+        self.assertEqual(queries, [['car', 'motorbike', 'scooter', 'vehicle']])
+        self.assertIn("unnest(%s::text[])", cur.queries[0][0])
+        self.assertEqual(catalog.queries, 2)
+        # columns in the order of the attributes, types and primary keys
+        self.assertEqual(catalog.columns('scooter'), ['id', 'engine_size', 'electric'])
+        self.assertEqual(catalog.column_type('scooter', 'electric'), 'boolean')
+        self.assertEqual(catalog.pkey('scooter'), ['id'])
+        self.assertEqual(catalog.columns('vehicle'), ['id', 'year', 'year_end', 'model_name'])
+        self.assertEqual(catalog.pkey('car'), [])
+        self.assertTrue(catalog.is_indexed('vehicle', 'id'))
+        self.assertFalse(catalog.is_indexed('scooter', 'id'))
+        # the tables already fetched are not queried again
+        catalog.prefetch(cur, ['vehicle', 'scooter'])
+        self.assertEqual(catalog.queries, 2)
+
+    def test_invalidate(self):
+        shared = PGCatalog.shared('pg_test')
+        self.assertIs(PGCatalog.shared('pg_test'), shared)
+        other = PGCatalog.shared('pg_other')
+        PGCatalog.invalidate('pg_test')
+        self.assertIsNot(PGCatalog.shared('pg_test'), shared)
+        self.assertIs(PGCatalog.shared('pg_other'), other)
+        PGCatalog.invalidate('pg_unknown')
+        PGCatalog.clear()
+        self.assertIsNot(PGCatalog.shared('pg_other'), other)
+        PGCatalog.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
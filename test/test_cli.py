@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import glob
+import json
+import os
+import tempfile
+import unittest
+
+from .helpers import definition, merge_view_option, snapshot_catalog, write_snapshot
+from pg_inheritance_view import cli
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot_path = write_snapshot()
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'sql')
+
+    def tearDown(self):
+        for path in glob.glob(os.path.join(self.output, '*')) + glob.glob(os.path.join(self.directory, '*.yaml')):
+            os.remove(path)
+        if os.path.isdir(self.output):
+            os.rmdir(self.output)
+        os.rmdir(self.directory)
+        os.remove(self.snapshot_path)
+
+    def write_definition(self, name, yaml):
+        with open(os.path.join(self.directory, '{0}.yaml'.format(name)), 'w') as f:
+            f.write(yaml)
+
+    def test_main(self):
+        self.write_definition('vehicle', definition)
+        self.write_definition('vehicle_union', merge_view_option(definition, "merge_strategy: union_all"))
+        self.assertEqual(cli.main([self.directory, '--snapshot', self.snapshot_path,
+                                   '--output', self.output, '--jobs', '2',
+                                   '--stats-json', os.path.join(self.output, 'stats.json')]), 0)
+        self.assertEqual(sorted(os.listdir(self.output)), ['stats.json', 'vehicle.sql', 'vehicle_union.sql'])
+        with open(os.path.join(self.output, 'stats.json')) as f:
+            self.assertIn('generation', json.load(f)['definitions']['vehicle']['stats']['phases'])
+        with open(os.path.join(self.output, 'vehicle.sql')) as f:
+            self.assertEqual(f.read(), PGInheritanceView(None, definition, snapshot_catalog()).sql_all())
+
+    def test_definition_errors(self):
+        # the failure of a definition does not abort the others
+        self.write_definition('broken_yaml', "alias: [vehicle")
+        self.write_definition('broken_type', definition.replace("children:", "children: 1\nold_children:"))
+        self.write_definition('vehicle', definition)
+        stats_json = os.path.join(self.directory, 'stats.json')
+        try:
+            self.assertEqual(cli.main([self.directory, '--snapshot', self.snapshot_path, '--output', self.output,
+                                       '--jobs', '1', '--stats-json', stats_json]), 1)
+            with open(stats_json) as f:
+                definitions = json.load(f)['definitions']
+        finally:
+            os.remove(stats_json)
+        self.assertTrue(definitions['broken_yaml']['error'].startswith('ParserError'))
+        self.assertTrue(definitions['broken_type']['error'].startswith('TypeError'))
+        self.assertIsNone(definitions['vehicle']['error'])
+        self.assertEqual(os.listdir(self.output), ['vehicle.sql'])
+
+
+if __name__ == '__main__':
+    unittest.main()
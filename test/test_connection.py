@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import unittest
+
+import psycopg2
+
+from .helpers import CatalogCursor, FakeConnection, FakePool, definition, snapshot, snapshot_catalog
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+
+
+class TestConnection(unittest.TestCase):
+    # ownership of the connection of the generators: only the connections
+    # opened by the generator are closed
+
+    def setUp(self):
+        self.cur = CatalogCursor(snapshot['tables'])
+        self.catalog = snapshot_catalog()
+        self.catalog.enums['test_offline.vehicle_type'] = ['vehicle', 'car', 'bike']
+        self.connections = []
+        self.connect = psycopg2.connect
+        psycopg2.connect = self.fake_connect
+
+    def tearDown(self):
+        psycopg2.connect = self.connect
+
+    def fake_connect(self, dsn):
+        self.assertEqual(dsn, "service=pg_test")
+        self.connections.append(FakeConnection(self.cur))
+        return self.connections[-1]
+
+    def test_service(self):
+        generator = PGInheritanceView('pg_test', definition, self.catalog)
+        self.assertIs(generator.conn, self.connections[0])
+        generator.close()
+        self.assertEqual(self.connections[0].closed_by, 'close')
+        self.assertIsNone(generator.conn)
+        # closed once
+        generator.close()
+
+        with PGInheritanceView('pg_test', definition, self.catalog) as generator:
+            self.assertIsNone(self.connections[1].closed_by)
+        self.assertEqual(self.connections[1].closed_by, 'close')
+
+    def test_connection(self):
+        conn = FakeConnection(self.cur)
+        with PGInheritanceView(conn, definition, self.catalog) as generator:
+            self.assertIs(generator.conn, conn)
+        self.assertIsNone(conn.closed_by)
+        self.assertEqual(self.connections, [])
+
+    def test_pool(self):
+        pool = FakePool(self.cur)
+        with PGInheritanceView(pool, definition, self.catalog) as generator:
+            conn = generator.conn
+        self.assertEqual(pool.put, [conn])
+        self.assertIsNone(conn.closed_by)
+        self.assertEqual(self.connections, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .helpers import RecordingCursor, recursive_definition, snapshot_catalog
+from pg_inheritance_view.catalog import PGCatalog
+from pg_inheritance_view.deployment import Deployment, DeploymentError
+from pg_inheritance_view.pg_inheritance_view_recursive import PGInheritanceViewRecursive
+
+
+class TestDeployment(unittest.TestCase):
+
+    def test_levels(self):
+        cur = RecordingCursor()
+        deployment = Deployment(cur)
+        deployment.execute(1, "CREATE VIEW a;")
+        deployment.execute(1, "CREATE VIEW b;")
+        self.assertRaises(DeploymentError, deployment.execute, 2, "CREATE FAIL;")
+        self.assertEqual(cur.statements, ["SAVEPOINT deploy_level_0;", "CREATE VIEW a;", "CREATE VIEW b;",
+                                          "RELEASE SAVEPOINT deploy_level_0;", "SAVEPOINT deploy_level_1;",
+                                          "ROLLBACK TO SAVEPOINT deploy_level_1;"])
+        self.assertEqual([(level['level'], level['batches'], level['status']) for level in deployment.levels],
+                         [(1, 2, 'ok'), (2, 0, 'error')])
+        self.assertEqual(deployment.levels[1]['sql'], "CREATE FAIL;")
+
+    def test_enum_labels_first(self):
+        cur = RecordingCursor()
+        deployment = Deployment(cur)
+        deployment.prepare("ALTER TYPE t ADD VALUE IF NOT EXISTS 'a';")
+        deployment.execute(1, "CREATE VIEW a;")
+        deployment.end_level()
+        self.assertEqual(cur.statements, ["COMMIT;", "ALTER TYPE t ADD VALUE IF NOT EXISTS 'a';",
+                                          "SAVEPOINT deploy_level_1;", "CREATE VIEW a;",
+                                          "RELEASE SAVEPOINT deploy_level_1;"])
+        self.assertEqual(cur.autocommitted, ["ALTER TYPE t ADD VALUE IF NOT EXISTS 'a';"])
+        self.assertEqual([(level['level'], level['status']) for level in deployment.levels],
+                         [('enum', 'ok'), (1, 'ok')])
+        self.assertRaises(ValueError, deployment.prepare, "ALTER TYPE t ADD VALUE IF NOT EXISTS 'b';")
+
+    def test_deploy_enum_labels(self):
+        catalog = snapshot_catalog()
+        catalog.enums['test_offline.vehicle_type'] = ['vehicle', 'bike']
+        generator = PGInheritanceViewRecursive(None, recursive_definition, catalog)
+        generator.cur = RecordingCursor()
+        generator.conn = generator.cur.connection
+        generator.service = 'pg_test'
+        shared = PGCatalog.shared('pg_test')
+        result = generator.deploy()
+        # the shared catalog of the service is outdated
+        self.assertIsNot(PGCatalog.shared('pg_test'), shared)
+        self.assertTrue(result['success'])
+        statements = generator.cur.statements
+        # the new label is committed on its own before the views and triggers using it
+        self.assertEqual(statements[:3], ["COMMIT;", "ALTER TYPE test_offline.vehicle_type ADD VALUE IF NOT EXISTS "
+                                                     "'car' AFTER 'vehicle';", "SAVEPOINT deploy_level_1;"])
+        self.assertEqual(generator.cur.autocommitted, [statements[1]])
+        self.assertNotIn("ADD VALUE", ''.join(statements[2:]))
+        self.assertIn("'car'::test_offline.vehicle_type", ''.join(statements[2:]))
+        self.assertEqual(statements[-1], "COMMIT;")
+
+    def test_deploy_two_enum_labels(self):
+        # two children added at once: one statement per label (no multi-command string)
+        catalog = snapshot_catalog()
+        catalog.enums['test_offline.vehicle_type'] = ['vehicle']
+        generator = PGInheritanceViewRecursive(None, recursive_definition, catalog)
+        generator.cur = RecordingCursor()
+        generator.conn = generator.cur.connection
+        generator.service = 'pg_test'
+        self.assertTrue(generator.deploy()['success'])
+        self.assertEqual(generator.cur.autocommitted,
+                         ["ALTER TYPE test_offline.vehicle_type ADD VALUE IF NOT EXISTS 'car' AFTER 'vehicle';",
+                          "ALTER TYPE test_offline.vehicle_type ADD VALUE IF NOT EXISTS 'bike' AFTER 'car';"])
+        self.assertEqual(generator.cur.statements[:4], ["COMMIT;"] + generator.cur.autocommitted +
+                         ["SAVEPOINT deploy_level_1;"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .helpers import RecordingCursor
+from pg_inheritance_view.deployment import execute_autocommit
+from pg_inheritance_view.enum_type import sql_add_enum_labels, split_enum_labels
+
+
+class TestEnumType(unittest.TestCase):
+
+    def test_add_enum_labels(self):
+        self.assertEqual(sql_add_enum_labels('s.t', ['b'], ['a', 'b', 'c']),
+                         "ALTER TYPE s.t ADD VALUE IF NOT EXISTS 'a' BEFORE 'b';\n"
+                         "ALTER TYPE s.t ADD VALUE IF NOT EXISTS 'c' AFTER 'b';\n\n")
+        self.assertEqual(sql_add_enum_labels('s.t', ['a', 'b'], ['a', 'b']), '')
+        self.assertIsNone(sql_add_enum_labels('s.t', ['b', 'a'], ['a', 'b']))
+
+    def test_split_enum_labels(self):
+        enum_sql = "ALTER TYPE s.t ADD VALUE IF NOT EXISTS 'a';\nALTER TYPE s.t ADD VALUE IF NOT EXISTS 'c';\n\n"
+        self.assertEqual(split_enum_labels(enum_sql + "CREATE VIEW v;\n"), (enum_sql, "CREATE VIEW v;\n"))
+        self.assertEqual(split_enum_labels("CREATE VIEW v;\n"), ('', "CREATE VIEW v;\n"))
+
+    def test_execute_autocommit(self):
+        cur = RecordingCursor()
+        execute_autocommit(cur, sql_add_enum_labels('s.t', ['b'], ['a', 'b', 'c']))
+        # one execute per statement
+        self.assertEqual(cur.statements, ["COMMIT;", "ALTER TYPE s.t ADD VALUE IF NOT EXISTS 'a' BEFORE 'b';",
+                                          "ALTER TYPE s.t ADD VALUE IF NOT EXISTS 'c' AFTER 'b';"])
+        self.assertEqual(cur.autocommitted, cur.statements[1:])
+        self.assertFalse(cur.connection.autocommit)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .helpers import LiveCatalogCursor, definition, snapshot_catalog
+from pg_inheritance_view.incremental import PGInheritanceDiff, fingerprint
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = snapshot_catalog()
+        self.catalog.enums['test_offline.vehicle_type'] = ['vehicle', 'car', 'bike']
+
+    def test_changes(self):
+        deployed = PGInheritanceView(None, definition, self.catalog)
+        deployed.cur = LiveCatalogCursor(list(deployed.objects()))
+        self.assertEqual(PGInheritanceDiff(deployed).changes(), [])
+
+        # a new additional column changes the merge view and its dependents
+        generator = PGInheritanceView(None, definition.replace(
+            "  additional_columns:\n", "  additional_columns:\n    age: extract(year from now()) - year\n"), self.catalog)
+        generator.cur = deployed.cur
+        changes = PGInheritanceDiff(generator).changes()
+        self.assertEqual([(name, reason) for kind, name, sql, reason in changes[:2]],
+                         [('test_offline.vw_vehicle_all', 'view changed'),
+                          ('test_offline.ft_vw_vehicle_all_insert', 'depends on test_offline.vw_vehicle_all')])
+        self.assertNotIn('test_offline.vw_vehicle_car', [name for kind, name, sql, reason in changes])
+        sql = PGInheritanceDiff(generator).sql_changes(changes)
+        self.assertTrue(sql.startswith("CREATE TABLE IF NOT EXISTS test_offline.pg_inheritance_view_fingerprints"))
+        self.assertIn("DELETE FROM test_offline.pg_inheritance_view_fingerprints WHERE view_name = 'test_offline.vw_vehicle_all';\n"
+                      "INSERT INTO test_offline.pg_inheritance_view_fingerprints (view_name, fingerprint) "
+                      "VALUES ('test_offline.vw_vehicle_all', '{0}');".format(fingerprint(changes[0][2])), sql)
+        # the comments of the views are left to the users
+        self.assertNotIn("COMMENT ON", sql)
+
+    def test_changes_without_fingerprints(self):
+        # views deployed without the incremental deployment: reissued, and the
+        # fingerprint table created
+        generator = PGInheritanceView(None, definition, self.catalog)
+        generator.cur = LiveCatalogCursor(list(generator.objects()), fingerprints=False)
+        diff = PGInheritanceDiff(generator)
+        changes = diff.changes()
+        self.assertIn(('test_offline.vw_vehicle_car', 'view changed'),
+                      [(name, reason) for kind, name, sql, reason in changes])
+        self.assertIn("CREATE TABLE IF NOT EXISTS test_offline.pg_inheritance_view_fingerprints", diff.sql_changes(changes))
+        # PostgreSQL 9.4
+        self.assertIn("to_regclass(name::cstring)", generator.cur.queries[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .helpers import definition, snapshot_catalog
+from pg_inheritance_view.index_advisor import PGIndexAdvisor
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+
+
+class TestIndexAdvisor(unittest.TestCase):
+
+    def test_missing_indexes(self):
+        advisor = PGIndexAdvisor(PGInheritanceView(None, definition, snapshot_catalog()))
+        self.assertEqual([(table, column) for table, column, usage in advisor.missing_indexes()],
+                         [('car', 'id'), ('motorbike', 'id')])
+        self.assertIn("CREATE INDEX CONCURRENTLY car_id_idx ON car (id);",
+                      advisor.sql_create_indexes())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import unittest
+
+from pg_inheritance_view.hierarchy import HierarchyIndex
+from pg_inheritance_view.model import DefinitionModel
+
+
+class TestModel(unittest.TestCase):
+
+    def test_definition_model(self):
+        model = DefinitionModel({
+            'alias': 'vehicle',
+            'alter': {'year': {'read': 'vehicle.year::text', 'write': 'NEW.year::smallint'}},
+            'children': {'car': {'remap': {'fk_brand': 'fk_car_brand'}}, 'bike': {}},
+            'merge_view': {'merge_columns': {'top_speed': {'fields': {'car': 'max_speed', 'bike': 'max_speed'},
+                                                           'cast': 'integer'}}}})
+        self.assertEqual(model.parent.select('year'), 'vehicle.year::text AS year')
+        self.assertEqual(model.parent.select('model_name'), 'vehicle.model_name')
+        self.assertEqual(model.parent.value('year'), 'NEW.year::smallint')
+        self.assertEqual(model.children['car'].select('fk_brand'), 'car.fk_brand AS fk_car_brand')
+        self.assertEqual(model.children['car'].value('max_speed'), 'NEW.max_speed')
+        self.assertEqual(model.children['car'].merge_value('max_speed'), 'NEW.top_speed')
+        self.assertEqual(model.children['bike'].merge_value('fk_brand'), 'NEW.fk_brand')
+        self.assertEqual([(merge_column.alias, merge_column.cast) for merge_column in model.merge_columns],
+                         [('top_speed', 'integer')])
+        self.assertRaises(ValueError, DefinitionModel, {
+            'alias': 'vehicle', 'children': {'car': {}},
+            'merge_view': {'merge_columns': {'top_speed': {'truck': 'max_speed'}}}})
+
+    def test_hierarchy_index(self):
+        index = HierarchyIndex({'alias': 'vehicle', 'children': {
+            'car': {'alias': 'car', 'trig_here': True, 'children': {
+                'sportscar': {'alias': 'sportscar'},
+                'van': {'alias': 'van', 'trig_here': True}}},
+            'truck': {'alias': 'truck'}}})
+        self.assertEqual(index.related('car'), (['vehicle', 'car'], ['sportscar']))
+        self.assertEqual(index.related('truck'), ([], []))
+        self.assertEqual(index.ancestors('van'), ['vehicle', 'car', 'van'])
+        self.assertEqual(index.boundary('sportscar'), 'car')
+        self.assertIsNone(index.boundary('truck'))
+
+
+if __name__ == '__main__':
+    unittest.main()
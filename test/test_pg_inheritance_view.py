@@ -10,8 +10,10 @@ if __name__ == '__main__':
         from os import path
         sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
         from pg_inheritance_view import PGInheritanceView
+        from pg_inheritance_view.deployment import execute_autocommit
     else:
         from ..pg_inheritance_view import PGInheritanceView
+        from ..pg_inheritance_view.deployment import execute_autocommit
 
 pg_service = "pg_test"
 
@@ -61,7 +63,12 @@ class TestPgInheritanceView(unittest.TestCase):
 
         cur.execute("CREATE SCHEMA {0};".format(test_name))
 
-        cur.execute(PGInheritanceView(pg_service, definition).sql_all())
+        # the labels added to an existing type are not part of sql_all()
+        generator = PGInheritanceView(pg_service, definition)
+        enum_sql = generator.sql_enum_labels()
+        if enum_sql:
+            execute_autocommit(cur, enum_sql)
+        cur.execute(generator.sql_all())
 
         #  insert through the view between parent table and child table */
         cur.execute(
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+import json
+import unittest
+
+from .helpers import definition, merge_view_option, snapshot_catalog
+from pg_inheritance_view.incremental import fingerprint
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+from pg_inheritance_view.stats import GeneratorStats
+
+
+class TestPGInheritanceViewOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = snapshot_catalog()
+
+    def test_offline_requires_catalog(self):
+        self.assertRaises(ValueError, PGInheritanceView, None, definition)
+
+    def test_sql_all(self):
+        sql = PGInheritanceView(None, definition, self.catalog).sql_all()
+        self.assertIn("CREATE OR REPLACE VIEW test_offline.vw_vehicle_car AS", sql)
+        self.assertIn("car.fk_brand AS fk_car_brand", sql)
+        self.assertIn("CREATE OR REPLACE VIEW test_offline.vw_vehicle_all AS", sql)
+        self.assertIn("CREATE TRIGGER tr_vw_vehicle_all_update", sql)
+
+    def test_bulk_functions(self):
+        generator = PGInheritanceView(None, definition, self.catalog)
+        self.assertEqual(generator.sql_merge_bulk_functions(), '')
+        # not planned, no empty object
+        self.assertNotIn('function', [kind for kind, name, method, arguments in generator.object_plan()])
+        generator = PGInheritanceView(None, merge_view_option(definition, "bulk_functions: true"), self.catalog)
+        self.assertIn(('function', 'test_offline.fn_vw_vehicle_all_bulk'),
+                      [(kind, name) for kind, name, method, arguments in generator.object_plan()])
+        sql = generator.sql_merge_bulk_functions()
+        self.assertIn("FUNCTION test_offline.fn_vw_vehicle_all_bulk_insert(_rows jsonb)", sql)
+        self.assertIn("FUNCTION test_offline.fn_vw_vehicle_all_bulk_delete_from(_staging regclass)", sql)
+        self.assertIn("WHERE _bulk.vehicle_type = 'car'::test_offline.vehicle_type;", sql)
+        self.assertIn(", _bulk.top_speed", sql)
+
+    def test_stored_type(self):
+        self.catalog.tables['vehicle']['columns'].append('vehicle_type')
+        sql = PGInheritanceView(None, merge_view_option(definition, "stored_type: true"), self.catalog).sql_all()
+        self.assertIn("ALTER TABLE vehicle ADD COLUMN vehicle_type test_offline.vehicle_type;", sql)
+        self.assertIn("vehicle.vehicle_type AS vehicle_type,", sql)
+        self.assertNotIn("WHEN car.id IS NOT NULL", sql)
+        self.assertNotIn("vehicle.vehicle_type\n", sql)
+        self.assertNotIn("DROP TYPE", sql)
+        self.assertIn("ALTER TABLE vehicle ALTER COLUMN vehicle_type SET DEFAULT 'vehicle'::test_offline.vehicle_type;", sql)
+        # the triggers on the children tables maintain the column
+        for child, table in (('car', 'car'), ('bike', 'motorbike')):
+            self.assertIn("CREATE TRIGGER tr_vehicle_{0}_stored_type\n\tAFTER INSERT OR UPDATE OF id OR DELETE\n"
+                          "\tON {1}\n".format(child, table), sql)
+        self.assertIn("UPDATE vehicle SET vehicle_type = 'vehicle'::test_offline.vehicle_type "
+                      "WHERE id = OLD.id AND vehicle_type = 'car'::test_offline.vehicle_type;", sql)
+        self.assertIn("UPDATE vehicle SET vehicle_type = 'car'::test_offline.vehicle_type "
+                      "WHERE id = NEW.id AND vehicle_type IS DISTINCT FROM 'car'::test_offline.vehicle_type;", sql)
+
+    def test_union_all_merge_strategy(self):
+        sql = PGInheritanceView(None, merge_view_option(
+            definition, "merge_strategy: union_all"), self.catalog).sql_merge_view()
+        self.assertEqual(sql.count("\n\tUNION ALL\n"), 2)
+        self.assertIn("'car'::test_offline.vehicle_type AS vehicle_type", sql)
+        self.assertIn("NULL::integer AS fk_bike_brand", sql)
+        self.assertIn("NULL::smallint AS top_speed", sql)
+        self.assertNotIn("LEFT JOIN", sql)
+        parent_only = ("\n\tWHERE NOT EXISTS (SELECT 1 FROM car WHERE car.id = vehicle.id)"
+                       "\n\t\tAND NOT EXISTS (SELECT 1 FROM motorbike WHERE motorbike.id = vehicle.id);")
+        self.assertIn("'vehicle'::test_offline.vehicle_type AS vehicle_type", sql)
+        self.assertIn(parent_only, sql)
+
+        # without allow_parent_only, the parent only rows are still listed, with
+        # a NULL type as in the joined merge view
+        sql = PGInheritanceView(None, merge_view_option(
+            definition, "merge_strategy: union_all").replace("schema:", "allow_parent_only: false\nschema:"),
+            self.catalog).sql_merge_view()
+        self.assertEqual(sql.count("\n\tUNION ALL\n"), 2)
+        self.assertIn("SELECT\n\t\tNULL::test_offline.vehicle_type AS vehicle_type,", sql)
+        self.assertIn(parent_only, sql)
+        self.assertNotIn("'vehicle'::test_offline.vehicle_type", sql)
+
+    def test_materialized(self):
+        generator = PGInheritanceView(None, merge_view_option(definition, "materialized: true"), self.catalog)
+        sql = generator.sql_merge_view()
+        live = generator.sql_merge_view_join()
+        self.assertTrue(live.startswith("CREATE OR REPLACE VIEW test_offline.vw_vehicle_all_live AS"))
+        self.assertIn(live, sql)
+        # only rebuilt when the live view changed
+        self.assertTrue(sql.startswith(
+            "CREATE TABLE IF NOT EXISTS test_offline.pg_inheritance_view_fingerprints"
+            " (view_name text PRIMARY KEY, fingerprint text NOT NULL);\n\n"
+            "DO $$\n\tBEGIN\n"
+            "\t\tIF to_regclass('test_offline.vw_vehicle_all_mat'::cstring) IS NULL OR NOT EXISTS (\n"
+            "\t\t\tSELECT 1 FROM test_offline.pg_inheritance_view_fingerprints"
+            " WHERE view_name = 'test_offline.vw_vehicle_all_mat' AND fingerprint = '{0}') THEN\n"
+            "\t\t\tDROP VIEW IF EXISTS test_offline.vw_vehicle_all CASCADE;\n"
+            "\t\t\tDROP VIEW IF EXISTS test_offline.vw_vehicle_all_live CASCADE;\n"
+            "\t\t\tDROP TABLE IF EXISTS test_offline.vw_vehicle_all_mat;\n"
+            "\t\tEND IF;\n".format(fingerprint(live))))
+        self.assertIn("\t\tIF to_regclass('test_offline.vw_vehicle_all_mat'::cstring) IS NULL THEN\n"
+                      "\t\t\tCREATE TABLE test_offline.vw_vehicle_all_mat AS SELECT * FROM test_offline.vw_vehicle_all_live;\n"
+                      "\t\t\tALTER TABLE test_offline.vw_vehicle_all_mat ADD PRIMARY KEY (id);\n"
+                      "\t\t\tCREATE INDEX ON test_offline.vw_vehicle_all_mat (vehicle_type);\n"
+                      "\t\t\tCREATE VIEW test_offline.vw_vehicle_all AS SELECT * FROM test_offline.vw_vehicle_all_mat;\n"
+                      "\t\t\tDELETE FROM test_offline.pg_inheritance_view_fingerprints"
+                      " WHERE view_name = 'test_offline.vw_vehicle_all_mat';\n"
+                      "\t\t\tINSERT INTO test_offline.pg_inheritance_view_fingerprints (view_name, fingerprint)"
+                      " VALUES ('test_offline.vw_vehicle_all_mat', '{0}');\n".format(fingerprint(live)), sql)
+        self.assertNotIn("DROP TABLE test_offline.vw_vehicle_all_mat;", sql)
+        # a refresh trigger per table
+        for table in ('vehicle', 'car', 'motorbike'):
+            self.assertIn("CREATE TRIGGER tr_vw_vehicle_all_refresh\n\tAFTER INSERT OR UPDATE OR DELETE\n"
+                          "\tON {0}\n".format(table), sql)
+        delete = "DELETE FROM test_offline.vw_vehicle_all_mat WHERE id = {0}.id;\n"
+        insert = "INSERT INTO test_offline.vw_vehicle_all_mat SELECT * FROM test_offline.vw_vehicle_all_live WHERE id = {0}.id;\n"
+        self.assertIn("\t\tELSIF TG_OP = 'UPDATE' THEN\n"
+                      "\t\t\t" + delete.format('OLD') + "\t\t\t" + insert.format('OLD') +
+                      "\t\t\tIF NEW.id <> OLD.id THEN\n"
+                      "\t\t\t\t" + delete.format('NEW') + "\t\t\t\t" + insert.format('NEW') +
+                      "\t\t\tEND IF;\n\t\tELSE\n", sql)
+
+        # the changes of the tables of additional_joins are not tracked
+        self.assertRaises(ValueError, PGInheritanceView, None, merge_view_option(
+            definition, "materialized: true\n  additional_joins:\n    brand:\n      table: brand\n"
+            "      type: left\n      fkey: fk_brand\n      key: id"), self.catalog)
+
+    def test_materialized_disabled(self):
+        # the materialization of a merge view materialized before is dropped
+        sql = PGInheritanceView(None, definition, self.catalog).sql_merge_view()
+        self.assertNotIn("_mat AS", sql)
+        self.assertIn("\t\tIF to_regclass('test_offline.vw_vehicle_all_mat'::cstring) IS NOT NULL THEN\n"
+                      "\t\t\tDROP TRIGGER IF EXISTS tr_vw_vehicle_all_refresh ON vehicle;\n"
+                      "\t\t\tDROP FUNCTION IF EXISTS test_offline.ft_vw_vehicle_all_refresh_vehicle();\n", sql)
+        self.assertIn("\t\t\tDROP TRIGGER IF EXISTS tr_vw_vehicle_all_refresh ON motorbike;\n"
+                      "\t\t\tDROP FUNCTION IF EXISTS test_offline.ft_vw_vehicle_all_refresh_bike();\n"
+                      "\t\t\tDROP VIEW IF EXISTS test_offline.vw_vehicle_all_live;\n"
+                      "\t\t\tDROP TABLE test_offline.vw_vehicle_all_mat;\n", sql)
+        # after the merge view, which does not read the table anymore
+        self.assertLess(sql.index("CREATE OR REPLACE VIEW test_offline.vw_vehicle_all AS"), sql.index("DO $$"))
+
+    def test_skip_unchanged(self):
+        self.assertNotIn("IS DISTINCT FROM", PGInheritanceView(None, definition, self.catalog).sql_merge_update_trigger())
+        sql = PGInheritanceView(None, merge_view_option(
+            definition, "skip_unchanged: true"), self.catalog).sql_merge_update_trigger()
+        self.assertIn("WHERE id = OLD.id AND (year, year_end, model_name) IS DISTINCT FROM "
+                      "(NEW.year, NEW.year_end, NEW.model_name);", sql)
+        self.assertIn("WHERE id = OLD.id AND (fk_brand, max_speed) IS DISTINCT FROM "
+                      "(NEW.fk_car_brand, NEW.top_speed);", sql)
+
+    def test_instrumentation(self):
+        sql = PGInheritanceView(None, definition, self.catalog, instrument=True).sql_all()
+        self.assertIn("CREATE UNLOGGED TABLE IF NOT EXISTS test_offline.pg_inheritance_view_stats", sql)
+        self.assertEqual(sql.count("_t0 timestamptz := clock_timestamp();"), sql.count("RETURNS trigger AS"))
+        self.assertIn("FUNCTION test_offline.pg_inheritance_view_stats_record(_view_name text, _operation text, _t0 timestamptz)", sql)
+        self.assertEqual(sql.count("PERFORM test_offline.pg_inheritance_view_stats_record(TG_TABLE_NAME, TG_OP, _t0);"),
+                         sql.count("RETURN NEW;") + sql.count("RETURN NULL;"))
+        # PostgreSQL 9.4
+        self.assertNotIn("ON CONFLICT", sql)
+        self.assertNotIn("clock_timestamp", PGInheritanceView(None, definition, self.catalog).sql_all())
+
+    def test_enum_evolution(self):
+        self.catalog.enums['test_offline.vehicle_type'] = ['vehicle', 'car', 'bike']
+        self.assertEqual(PGInheritanceView(None, definition, self.catalog).sql_type(), '')
+        self.assertEqual(PGInheritanceView(None, definition, self.catalog).sql_enum_labels(), '')
+        # added label: a separate step, not part of sql_all()
+        self.catalog.enums['test_offline.vehicle_type'] = ['vehicle', 'bike']
+        generator = PGInheritanceView(None, definition, self.catalog)
+        self.assertEqual(generator.sql_enum_labels(),
+                         "ALTER TYPE test_offline.vehicle_type ADD VALUE IF NOT EXISTS 'car' AFTER 'vehicle';\n\n")
+        self.assertEqual(generator.sql_type(), '')
+        self.assertNotIn("ALTER TYPE", generator.sql_all())
+        # removed label: the type is recreated
+        self.catalog.enums['test_offline.vehicle_type'] = ['vehicle', 'car', 'bike', 'truck']
+        self.assertIn("DROP TYPE IF EXISTS test_offline.vehicle_type;",
+                      PGInheritanceView(None, definition, self.catalog).sql_type())
+        self.assertEqual(PGInheritanceView(None, definition, self.catalog).sql_enum_labels(), '')
+        self.catalog.enums['test_offline.vehicle_type'] = None
+        self.assertTrue(PGInheritanceView(None, definition, self.catalog).sql_type().startswith(
+            "CREATE TYPE test_offline.vehicle_type AS ENUM"))
+
+    def test_stats(self):
+        generator = PGInheritanceView(None, definition, self.catalog)
+        sql = generator.sql_all()
+        stats = generator.stats.to_dict()
+        self.assertIn('generation', stats['phases'])
+        self.assertEqual(stats['counters']['catalog_queries'], 0)
+        self.assertIn(('view', 'test_offline.vw_vehicle_car'),
+                      [(generated['kind'], generated['name']) for generated in stats['objects']])
+        self.assertEqual(stats['size'], len(sql))
+        json.dumps(stats)
+        # read back, e.g. from a worker process
+        self.assertEqual(GeneratorStats.from_dict(json.loads(json.dumps(stats))).to_dict(), stats)
+        self.assertEqual(GeneratorStats.from_dict(stats).report(), generator.stats.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
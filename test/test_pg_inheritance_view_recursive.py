@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .helpers import merge_view_option, recursive_definition, snapshot_catalog
+from pg_inheritance_view.pg_inheritance_view_recursive import PGInheritanceViewRecursive
+
+
+class TestPGInheritanceViewRecursive(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = snapshot_catalog()
+
+    def test_sql_all(self):
+        sql = PGInheritanceViewRecursive(None, recursive_definition, self.catalog).sql_all()
+        self.assertIn("CREATE OR REPLACE VIEW test_offline.vw_vehicle_all AS", sql)
+        self.assertIn("CREATE TRIGGER tr_vehicle_car_insert", sql)
+        # each trigger is generated once
+        self.assertEqual(sql.count("CREATE TRIGGER tr_vehicle_car_insert"), 1)
+        self.assertEqual(sql.count("CREATE TRIGGER tr_vehicle_bike_delete"), 1)
+
+    def test_materialized_unsupported(self):
+        self.assertRaises(ValueError, PGInheritanceViewRecursive, None,
+                          merge_view_option(recursive_definition, "materialized: true"), self.catalog)
+
+    def test_skip_unchanged(self):
+        self.assertNotIn("IS DISTINCT FROM", PGInheritanceViewRecursive(
+            None, recursive_definition, self.catalog).sql_all())
+        self.assertIn("IS DISTINCT FROM", PGInheritanceViewRecursive(
+            None, merge_view_option(recursive_definition, "skip_unchanged: true"), self.catalog).sql_all())
+
+    def test_union_all_parent_only(self):
+        sql = PGInheritanceViewRecursive(None, merge_view_option(
+            recursive_definition, "merge_strategy: union_all").replace("isroot:", "allow_parent_only: false\nisroot:"),
+            self.catalog).sql_all()
+        self.assertIn("SELECT\n\t\tNULL::test_offline.vehicle_type AS vehicle_type,", sql)
+        self.assertIn("\n\tWHERE NOT EXISTS (SELECT 1 FROM car WHERE car.id = vehicle.id)", sql)
+
+    def test_exec_levels(self):
+        generator = PGInheritanceViewRecursive(None, recursive_definition.replace(
+            "  bike:\n", "  bike:\n    children:\n      scooter:\n        table: scooter\n        c_table: scooter\n        pkey: id\n"), self.catalog)
+        self.assertEqual([[definition['alias'] for definition in level] for level in generator.exec_levels()],
+                         [['vehicle'], ['bike']])
+        self.assertEqual(generator.definition['children']['bike']['exec_order'], 2)
+        # a definition with the exec_order of one of its parents is skipped
+        generator = PGInheritanceViewRecursive(None, recursive_definition.replace(
+            "  bike:\n", "  bike:\n    exec_order: 1\n    children:\n      scooter:\n        table: scooter\n        c_table: scooter\n        pkey: id\n"), self.catalog)
+        self.assertEqual([[definition['alias'] for definition in level] for level in generator.exec_levels()],
+                         [['vehicle']])
+
+    def test_level_without_merge_view(self):
+        # a child level with its own exec_order and without merge_view
+        catalog = self.catalog
+        catalog.tables['scooter'] = {'columns': ['id', 'electric'], 'types': {'id': 'integer', 'electric': 'boolean'},
+                                     'pkey': ['id']}
+        sql = PGInheritanceViewRecursive(None, recursive_definition.replace(
+            "  bike:\n", "  bike:\n    schema: test_offline\n    exec_order: 2\n    children:\n      scooter:\n        table: scooter\n"
+            "        c_table: scooter\n        pkey: id\n        trig_here: true\n"), catalog).sql_all()
+        self.assertIn("CREATE OR REPLACE VIEW test_offline.vw_bike_scooter AS", sql)
+        self.assertIn("CREATE TRIGGER tr_bike_scooter_insert", sql)
+        self.assertNotIn("vw_bike_all", sql)
+
+    def test_instrumentation(self):
+        sql = PGInheritanceViewRecursive(None, recursive_definition, self.catalog, instrument=True).sql_all()
+        self.assertIn("CREATE UNLOGGED TABLE IF NOT EXISTS test_offline.pg_inheritance_view_stats", sql)
+        self.assertEqual(sql.count("_t0 timestamptz := clock_timestamp();"), sql.count("RETURNS trigger AS"))
+        self.assertEqual(sql.count("PERFORM test_offline.pg_inheritance_view_stats_record(TG_TABLE_NAME, TG_OP, _t0);"),
+                         sql.count("RETURN NEW;") + sql.count("RETURN NULL;"))
+        self.assertNotIn("clock_timestamp", PGInheritanceViewRecursive(None, recursive_definition, self.catalog).sql_all())
+
+    def test_stats(self):
+        generator = PGInheritanceViewRecursive(None, recursive_definition, self.catalog)
+        sql = generator.sql_all()
+        self.assertEqual(generator.stats.to_dict()['size'], len(sql))
+        self.assertIn('triggers', [generated['name'] for generated in generator.stats.objects])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+import pg_to_metaproject
+from pg_to_metaproject import (SQL_COLUMNS, SQL_FINGERPRINTS, SQL_FOREIGN_KEYS, SQL_PRIMARY_KEYS, assemble,
+                               introspect, main, merge, qualified_names, read_metaproject, refresh, run_queries,
+                               write_metaproject)
+
+
+class FakeCursor():
+    # cursor answering the queries of pg_to_metaproject with the rows of its
+    # connection, filtered on the schema and the tables of the parameters
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql, params):
+        self.connection.pool.queries.append((sql, params))
+        self.rows = [row for row in self.connection.pool.rows.get(sql, [])
+                     if row['table_schema'] == params['schema'] and
+                     (params.get('tables') is None or row['table_name'] in params['tables'])]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection():
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+
+class FakePool():
+    # pool of a service whose catalog is given as {sql: rows}
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.connections = 0
+
+    def getconn(self):
+        self.connections += 1
+        return FakeConnection(self)
+
+    def putconn(self, conn):
+        self.connections -= 1
+
+    def closeall(self):
+        pass
+
+
+def column(schema, table, name, udt_name='int4', nullable='YES', numeric_scale=None, character_maximum_length=None):
+    return {'table_schema': schema, 'table_name': table, 'column_name': name, 'is_nullable': nullable,
+            'udt_name': udt_name, 'numeric_scale': numeric_scale,
+            'character_maximum_length': character_maximum_length}
+
+
+def key(schema, table, name):
+    return {'table_schema': schema, 'table_name': table, 'column_name': name}
+
+
+def foreign_key(constraint, schema, table, name, foreign_table, foreign_name, foreign_schema=None):
+    return {'constraint_name': constraint, 'table_schema': schema, 'table_name': table, 'column_name': name,
+            'foreign_table_schema': foreign_schema or schema, 'foreign_table_name': foreign_table,
+            'foreign_column_name': foreign_name}
+
+
+def catalog(schema):
+    # rows of the catalog queries for a schema: a parent table, a child
+    # inheriting its key, and a table with a composite foreign key
+    return {
+        SQL_COLUMNS: [
+            column(schema, 'network_element', 'obj_id', 'varchar', 'NO', character_maximum_length=16),
+            column(schema, 'network_element', 'identifier', 'varchar', character_maximum_length=20),
+            column(schema, 'reach', 'obj_id', 'varchar', 'NO', character_maximum_length=16),
+            column(schema, 'reach', 'length_effective', 'numeric', numeric_scale=2),
+            column(schema, 'reach_point', 'fk_reach', 'varchar', character_maximum_length=16),
+            column(schema, 'reach_point', 'fk_position', 'int4'),
+            column(schema, 'reach_point', 'level', 'float8'),
+            column(schema, 'reach_position', 'fk_reach', 'varchar', 'NO', character_maximum_length=16),
+            column(schema, 'reach_position', 'position', 'int4', 'NO'),
+        ],
+        SQL_PRIMARY_KEYS: [
+            key(schema, 'network_element', 'obj_id'),
+            key(schema, 'reach', 'obj_id'),
+            key(schema, 'reach_position', 'fk_reach'),
+            key(schema, 'reach_position', 'position'),
+        ],
+        SQL_FOREIGN_KEYS: [
+            foreign_key('oorel_reach_network_element', schema, 'reach', 'obj_id', 'network_element', 'obj_id'),
+            # composite key, the columns paired by their position in the key
+            foreign_key('rel_reach_point_position', schema, 'reach_point', 'fk_reach', 'reach_position', 'fk_reach'),
+            foreign_key('rel_reach_point_position', schema, 'reach_point', 'fk_position', 'reach_position', 'position'),
+        ],
+        SQL_FINGERPRINTS: [
+            {'table_schema': schema, 'table_name': table, 'fingerprint': 'v1'}
+            for table in ('network_element', 'reach', 'reach_point', 'reach_position')
+        ]
+    }
+
+
+# the metaproject written from the information_schema views before the
+# catalog was read from pg_catalog
+expected_tables = {
+    'network_element': {'fields': OrderedDict([
+        ('obj_id', {'nullable': False, 'data_type': 'varchar', 'length': 16, 'primary_key': True}),
+        ('identifier', {'nullable': True, 'data_type': 'varchar', 'length': 20})])},
+    'reach': {'inherits': 'network_element', 'fields': OrderedDict([
+        ('obj_id', {'nullable': False, 'data_type': 'varchar', 'length': 16, 'primary_key': True,
+                    'references': {'table': 'network_element', 'column': 'obj_id'}}),
+        ('length_effective', {'nullable': True, 'data_type': 'numeric', 'precision': 2})])},
+    'reach_point': {'fields': OrderedDict([
+        ('fk_reach', {'nullable': True, 'data_type': 'varchar', 'length': 16,
+                      'references': {'table': 'reach_position', 'column': 'fk_reach'}}),
+        ('fk_position', {'nullable': True, 'data_type': 'int4',
+                         'references': {'table': 'reach_position', 'column': 'position'}}),
+        ('level', {'nullable': True, 'data_type': 'float8'})])},
+    'reach_position': {'fields': OrderedDict([
+        ('fk_reach', {'nullable': False, 'data_type': 'varchar', 'length': 16, 'primary_key': True}),
+        ('position', {'nullable': False, 'data_type': 'int4', 'primary_key': True})])},
+}
+
+
+class TestPgToMetaproject(unittest.TestCase):
+
+    def setUp(self):
+        self.pools = OrderedDict([('pg_qgep', FakePool(catalog('qgep')))])
+
+    def test_fetch(self):
+        queries = [('columns', 'pg_qgep', SQL_COLUMNS, {'schema': 'qgep', 'tables': ['reach']}),
+                   ('other_schema', 'pg_qgep', SQL_COLUMNS, {'schema': 'other', 'tables': None})]
+        rows = run_queries(self.pools, queries, 2)
+        self.assertEqual(list(rows.keys()), ['columns', 'other_schema'])
+        self.assertEqual([row['column_name'] for row in rows['columns']], ['obj_id', 'length_effective'])
+        self.assertEqual(rows['other_schema'], [])
+        # the connections are returned to the pool
+        self.assertEqual(self.pools['pg_qgep'].connections, 0)
+
+    def test_composite_foreign_key(self):
+        # the columns of a composite key are paired by position
+        self.assertIn("unnest(k.conkey, k.confkey) AS cols(attnum, fattnum)", SQL_FOREIGN_KEYS)
+        tables = assemble(introspect(self.pools, [('pg_qgep', 'qgep')], 2)[('pg_qgep', 'qgep')])
+        fields = tables['reach_point']['fields']
+        self.assertEqual(fields['fk_reach']['references'], {'table': 'reach_position', 'column': 'fk_reach'})
+        self.assertEqual(fields['fk_position']['references'], {'table': 'reach_position', 'column': 'position'})
+        self.assertNotIn('inherits', tables['reach_point'])
+
+    def test_same_output(self):
+        rows = introspect(self.pools, [('pg_qgep', 'qgep')], 2)
+        self.assertEqual(merge(rows), {'tables': expected_tables})
+        # a query per catalog query
+        self.assertEqual(sorted([sql for sql, params in self.pools['pg_qgep'].queries]),
+                         sorted([SQL_COLUMNS, SQL_PRIMARY_KEYS, SQL_FOREIGN_KEYS]))
+
+    def test_qualified_names(self):
+        self.assertEqual(qualified_names([('pg_qgep', 'qgep')]), None)
+        self.assertEqual(qualified_names([('pg_qgep', 'qgep'), ('pg_qgep', 'qgep_od')]), 'schema')
+        self.assertEqual(qualified_names([('pg_a', 'qgep'), ('pg_b', 'qgep_od')]), 'schema')
+        self.assertEqual(qualified_names([('pg_a', 'public'), ('pg_b', 'public')]), 'service')
+
+
+class TestPgToMetaprojectMain(unittest.TestCase):
+    # the command line with the pools of fake services
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pools = OrderedDict()
+        for service, schemas in (('pg_a', ['public', 'od']), ('pg_b', ['public'])):
+            rows = dict()
+            for schema in schemas:
+                for sql, schema_rows in catalog(schema).items():
+                    rows.setdefault(sql, []).extend(schema_rows)
+            self.pools[service] = FakePool(rows)
+        self.open_pools = pg_to_metaproject.open_pools
+        pg_to_metaproject.open_pools = lambda targets, jobs: self.pools
+
+    def tearDown(self):
+        pg_to_metaproject.open_pools = self.open_pools
+        shutil.rmtree(self.directory)
+
+    def run_main(self, *args):
+        self.assertEqual(main(list(args)), 0)
+
+    def test_merged(self):
+        path = os.path.join(self.directory, 'merged.mp')
+        self.run_main('--target', 'pg_a:public', '--target', 'pg_a:od', '--output', path)
+        tables = read_metaproject(path)['tables']
+        self.assertEqual(sorted(tables.keys()), sorted(['public.' + name for name in expected_tables] +
+                                                       ['od.' + name for name in expected_tables]))
+        self.assertEqual(tables['od.reach']['inherits'], 'od.network_element')
+        self.assertEqual(tables['od.reach_point']['fields']['fk_position']['references'],
+                         {'table': 'od.reach_position', 'column': 'position'})
+
+    def test_merged_services(self):
+        # the same schema in several services
+        path = os.path.join(self.directory, 'merged.mp')
+        self.run_main('--target', 'pg_a:public', '--target', 'pg_b:public', '--output', path)
+        tables = read_metaproject(path)['tables']
+        self.assertEqual(sorted(tables.keys()), sorted(['pg_a.public.' + name for name in expected_tables] +
+                                                       ['pg_b.public.' + name for name in expected_tables]))
+        self.assertEqual(tables['pg_b.public.reach']['inherits'], 'pg_b.public.network_element')
+
+    def test_per_target(self):
+        self.run_main('--target', 'pg_a:public', '--target', 'pg_b:public', '--output-dir', self.directory)
+        for service in ('pg_a', 'pg_b'):
+            mp = read_metaproject(os.path.join(self.directory, '{0}_public.mp'.format(service)))
+            # not qualified, the same output as a single schema
+            self.assertEqual(mp, {'tables': expected_tables})
+
+
+class TestPgToMetaprojectRefresh(unittest.TestCase):
+    # the incremental mode, a single schema
+
+    def setUp(self):
+        self.rows = catalog('qgep')
+        self.pools = OrderedDict([('pg_qgep', FakePool(self.rows))])
+        self.targets = [('pg_qgep', 'qgep')]
+
+    def refresh(self, mp):
+        self.pools['pg_qgep'].queries = []
+        return refresh(self.pools, self.targets, 2, mp, None)
+
+    def queried_tables(self):
+        # tables of the catalog queries of the last refresh
+        return [sorted(params['tables']) for sql, params in self.pools['pg_qgep'].queries if sql != SQL_FINGERPRINTS]
+
+    def fingerprint(self, table, fingerprint):
+        for row in self.rows[SQL_FINGERPRINTS]:
+            if row['table_name'] == table:
+                row['fingerprint'] = fingerprint
+
+    def rename(self, table, new_table):
+        for rows in self.rows.values():
+            for row in rows:
+                if row['table_name'] == table:
+                    row['table_name'] = new_table
+                if row.get('foreign_table_name') == table:
+                    row['foreign_table_name'] = new_table
+
+    def test_first_run(self):
+        # without fingerprints (no metaproject or one written without
+        # --incremental), all the tables are queried
+        for mp in ({'tables': dict()}, {'tables': expected_tables}):
+            refreshed, names = self.refresh(mp)
+            self.assertEqual(refreshed['tables'], expected_tables)
+            self.assertEqual(refreshed['fingerprints'], dict([(name, 'v1') for name in expected_tables]))
+            self.assertEqual(sorted(names), sorted(expected_tables))
+            self.assertEqual(self.queried_tables(), [sorted(expected_tables)] * 3)
+
+    def test_unchanged(self):
+        mp, names = self.refresh({'tables': dict()})
+        refreshed, names = self.refresh(mp)
+        self.assertEqual(refreshed, mp)
+        self.assertEqual(names, [])
+        self.assertEqual(self.queried_tables(), [])
+
+    def test_changed(self):
+        mp, names = self.refresh({'tables': dict()})
+        self.fingerprint('reach', 'v2')
+        self.rows[SQL_COLUMNS].append(column('qgep', 'reach', 'material', 'int4'))
+        refreshed, names = self.refresh(mp)
+        self.assertEqual(names, ['reach'])
+        self.assertEqual(self.queried_tables(), [['reach']] * 3)
+        self.assertEqual(list(refreshed['tables']['reach']['fields'].keys()),
+                         ['obj_id', 'length_effective', 'material'])
+        # the references to the table and from it are kept
+        self.assertEqual(refreshed['tables']['reach']['inherits'], 'network_element')
+        self.assertEqual(refreshed['tables']['network_element'], expected_tables['network_element'])
+        self.assertEqual(refreshed['fingerprints']['reach'], 'v2')
+
+    def test_dropped(self):
+        mp, names = self.refresh({'tables': dict()})
+        for rows in self.rows.values():
+            rows[:] = [row for row in rows if row['table_name'] != 'reach_point']
+        refreshed, names = self.refresh(mp)
+        self.assertEqual(names, ['reach_point'])
+        self.assertEqual(self.queried_tables(), [])
+        self.assertNotIn('reach_point', refreshed['tables'])
+        self.assertNotIn('reach_point', refreshed['fingerprints'])
+
+    def test_renamed(self):
+        mp, names = self.refresh({'tables': dict()})
+        self.rename('reach_position', 'reach_location')
+        self.fingerprint('reach_point', 'v2')
+        refreshed, names = self.refresh(mp)
+        self.assertEqual(sorted(names), ['reach_location', 'reach_point', 'reach_position'])
+        self.assertEqual(self.queried_tables(), [['reach_location', 'reach_point']] * 3)
+        self.assertNotIn('reach_position', refreshed['tables'])
+        self.assertEqual(refreshed['tables']['reach_location'], expected_tables['reach_position'])
+        self.assertEqual(refreshed['tables']['reach_point']['fields']['fk_position']['references'],
+                         {'table': 'reach_location', 'column': 'position'})
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        open_pools = pg_to_metaproject.open_pools
+        pg_to_metaproject.open_pools = lambda targets, jobs: self.pools
+        try:
+            path = os.path.join(directory, 'qgep.mp')
+            write_metaproject({'tables': expected_tables}, path)
+            self.assertEqual(main(['--target', 'pg_qgep:qgep', '--output', path, '--incremental']), 0)
+            self.assertEqual(read_metaproject(path)['fingerprints']['reach'], 'v1')
+        finally:
+            pg_to_metaproject.open_pools = open_pools
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+from .helpers import definition, snapshot_catalog
+from pg_inheritance_view.catalog import PGCatalog
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+from pg_inheritance_view.sql_cache import PGSqlCache
+
+
+class TestSqlCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = PGSqlCache(self.directory)
+
+    def tearDown(self):
+        self.cache.clear()
+        os.rmdir(self.directory)
+
+    def test_sql_all(self):
+        catalog = snapshot_catalog()
+        sql = self.cache.sql_all(PGInheritanceView, None, definition, catalog)
+        self.assertEqual(sql, PGInheritanceView(None, definition, catalog).sql_all())
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertEqual(self.cache.sql_all(PGInheritanceView, None, definition, catalog), sql)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        # a change in the columns of a table changes the key
+        catalog.tables['car']['columns'].append('color')
+        catalog.tables['car']['types']['color'] = 'text'
+        self.assertIn("car.color", self.cache.sql_all(PGInheritanceView, None, definition, catalog))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.cache.max_size = len(sql) + 1000
+        self.cache.evict()
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_online(self):
+        # the live fingerprint of the database, without connection
+        live = {'fingerprint': 'v1'}
+        self.cache.live_fingerprint = lambda service, tables, types: live['fingerprint']
+        key = self.cache.key(PGInheritanceView, 'pg_test', definition)
+        self.assertEqual(self.cache.key(PGInheritanceView, 'pg_test', definition), key)
+        live['fingerprint'] = 'v2'
+        self.assertNotEqual(self.cache.key(PGInheritanceView, 'pg_test', definition), key)
+        # with a catalog, its entries are part of the key as well
+        catalog = snapshot_catalog()
+        key = self.cache.key(PGInheritanceView, 'pg_test', definition, catalog)
+        catalog.tables['car']['columns'].append('color')
+        self.assertNotEqual(self.cache.key(PGInheritanceView, 'pg_test', definition, catalog), key)
+
+    def test_online_fresh_catalog(self):
+        # without catalog, the SQL is generated from a fresh catalog and not
+        # from the shared catalog of the service
+        self.cache.live_fingerprint = lambda service, tables, types: 'v1'
+        catalogs = []
+
+        class Generator():
+            def __init__(self, service, definition, catalog):
+                catalogs.append(catalog)
+
+            def sql_enum_labels(self):
+                return ''
+
+            def sql_all(self):
+                return 'SELECT 1;\n'
+
+            def close(self):
+                pass
+
+        self.assertEqual(self.cache.sql_all(Generator, 'pg_test', definition), 'SELECT 1;\n')
+        self.assertIsInstance(catalogs[0], PGCatalog)
+        self.assertIsNot(catalogs[0], PGCatalog.shared('pg_test'))
+
+
+if __name__ == '__main__':
+    unittest.main()
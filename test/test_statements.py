@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .helpers import definition, snapshot_catalog
+from pg_inheritance_view.pg_inheritance_view import PGInheritanceView
+from pg_inheritance_view.statements import split_statements
+
+
+class TestStatements(unittest.TestCase):
+
+    def test_split_statements(self):
+        sql = "CREATE FUNCTION f() RETURNS trigger AS\n$$\nBEGIN\n\tRETURN NEW;\nEND;\n$$\nLANGUAGE plpgsql;\n"
+        sql += "-- a comment; with a semicolon\nCOMMENT ON VIEW v IS 'a;b';\n"
+        self.assertEqual(list(split_statements(sql)), [
+            "CREATE FUNCTION f() RETURNS trigger AS\n$$\nBEGIN\n\tRETURN NEW;\nEND;\n$$\nLANGUAGE plpgsql;",
+            "-- a comment; with a semicolon\nCOMMENT ON VIEW v IS 'a;b';"])
+
+    def test_generator_statements(self):
+        generator = PGInheritanceView(None, definition, snapshot_catalog())
+        self.assertEqual([name for kind, name, sql in generator.objects() if kind == 'view'],
+                         ['test_offline.vw_vehicle_car', 'test_offline.vw_vehicle_bike', 'test_offline.vw_vehicle_all'])
+        statements = list(generator.statements())
+        self.assertTrue(statements[0].startswith("CREATE OR REPLACE VIEW test_offline.vw_vehicle_car AS"))
+        self.assertTrue(all([statement.endswith(';') for statement in statements]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,130 @@
-import psycopg2
-import psycopg2.extras
+import argparse
 import json
+import os
+import sys
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+
+# Introspects the tables of PostgreSQL schemas into metaproject files.
+#
+#   python pg_to_metaproject.py
+#       writes the schema qgep of the service pg_qgep to ../data/qgep_base.mp
+#   python pg_to_metaproject.py --target pg_qgep:qgep --target pg_qgep:qgep_od --output ../data/qgep.mp
+#       merges several schemas (the tables are then schema qualified, and
+#       service qualified if a schema is found in several services)
+#   python pg_to_metaproject.py --target pg_a:public --target pg_b:public --output-dir ../data
+#       writes one metaproject per schema (<service>_<schema>.mp)
+#   python pg_to_metaproject.py --incremental
+#       only queries the tables which changed since the last run
+#
+# The queries of all the schemas run in parallel, over a pool of connections
+# per service.
+
+# The catalog is read from pg_catalog directly, the information_schema views
+# are much slower on databases with many relations. The columns are named as
+# in information_schema. The queries can be restricted to some tables (the
+# tables parameter, NULL for all).
+
+# all fields to initialize the table metainformation
+# (the type of a domain is its base type, the typmod the one of the domain)
+SQL_COLUMNS = """
+SELECT
+    table_schema, table_name, column_name, is_nullable, udt_name,
+    CASE WHEN udt_name = 'numeric' AND typmod <> -1 THEN (typmod - 4) & 65535 END AS numeric_scale,
+    CASE WHEN udt_name IN ('varchar', 'bpchar') AND typmod <> -1 THEN typmod - 4 END AS character_maximum_length
+FROM (
+    SELECT
+        n.nspname AS table_schema,
+        c.relname AS table_name,
+        a.attname AS column_name,
+        CASE WHEN a.attnotnull OR (t.typtype = 'd' AND t.typnotnull) THEN 'NO' ELSE 'YES' END AS is_nullable,
+        COALESCE(bt.typname, t.typname) AS udt_name,
+        CASE WHEN t.typtype = 'd' THEN t.typtypmod ELSE a.atttypmod END AS typmod,
+        a.attnum
+    FROM pg_attribute a
+        INNER JOIN pg_class c ON c.oid = a.attrelid
+        INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+        INNER JOIN pg_type t ON t.oid = a.atttypid
+        LEFT JOIN pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+    WHERE n.nspname = %(schema)s
+        AND (%(tables)s::text[] IS NULL OR c.relname::text = ANY(%(tables)s::text[]))
+        AND c.relkind IN ('r', 'v', 'f', 'p')
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+) AS columns
+ORDER BY table_name, attnum
+"""
+
+# primary keys (all the columns of composite keys)
+SQL_PRIMARY_KEYS = """
+SELECT n.nspname AS table_schema, c.relname AS table_name, a.attname AS column_name
+FROM pg_constraint k
+    INNER JOIN pg_class c ON c.oid = k.conrelid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN unnest(k.conkey) AS cols(attnum)
+    INNER JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = cols.attnum
+WHERE k.contype = 'p'
+    AND n.nspname = %(schema)s
+    AND (%(tables)s::text[] IS NULL OR c.relname::text = ANY(%(tables)s::text[]))
+ORDER BY 1, 2;
+"""
+
+# foreign keys
+# the columns of composite keys are paired by position in conkey and confkey
+SQL_FOREIGN_KEYS = """
+SELECT
+    k.conname AS constraint_name, n.nspname AS table_schema, c.relname AS table_name, a.attname AS column_name,
+    fn.nspname AS foreign_table_schema,
+    fc.relname AS foreign_table_name,
+    fa.attname AS foreign_column_name
+FROM pg_constraint k
+    INNER JOIN pg_class c ON c.oid = k.conrelid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    INNER JOIN pg_class fc ON fc.oid = k.confrelid
+    INNER JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+    CROSS JOIN unnest(k.conkey, k.confkey) AS cols(attnum, fattnum)
+    INNER JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = cols.attnum
+    INNER JOIN pg_attribute fa ON fa.attrelid = k.confrelid AND fa.attnum = cols.fattnum
+WHERE k.contype = 'f'
+    AND n.nspname = %(schema)s
+    AND (%(tables)s::text[] IS NULL OR c.relname::text = ANY(%(tables)s::text[]))
+ORDER BY 3, 1
+"""
+
+# fingerprint of the catalog entries of each table used in the metaproject:
+# oid, columns with their types, primary and foreign keys (with the names of
+# the referenced table and columns)
+SQL_FINGERPRINTS = """
+SELECT
+    n.nspname AS table_schema,
+    c.relname AS table_name,
+    md5(concat_ws('|', c.oid::text,
+        (SELECT string_agg(concat_ws(':', a.attnum, a.attname, t.typname, a.atttypmod, a.attnotnull,
+                                     t.typtypmod, t.typnotnull, t.typbasetype), ',' ORDER BY a.attnum)
+         FROM pg_attribute a INNER JOIN pg_type t ON t.oid = a.atttypid
+         WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped),
+        (SELECT string_agg(concat_ws(':', k.conname, k.contype, k.conkey::text, fn.nspname, fc.relname,
+                                     (SELECT string_agg(fa.attname, ',' ORDER BY cols.ord)
+                                      FROM unnest(k.confkey) WITH ORDINALITY AS cols(attnum, ord)
+                                        INNER JOIN pg_attribute fa ON fa.attrelid = k.confrelid AND fa.attnum = cols.attnum)),
+                           ',' ORDER BY k.conname)
+         FROM pg_constraint k
+            LEFT JOIN pg_class fc ON fc.oid = k.confrelid
+            LEFT JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+         WHERE k.conrelid = c.oid AND k.contype IN ('p', 'f'))
+    )) AS fingerprint
+FROM pg_class c
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %(schema)s
+    AND c.relkind IN ('r', 'v', 'f', 'p')
+ORDER BY c.relname
+"""
+
+QUERIES = (('columns', SQL_COLUMNS), ('primary_keys', SQL_PRIMARY_KEYS), ('foreign_keys', SQL_FOREIGN_KEYS))
 
 
 def add_field(fields_dict, field_info):
@@ -24,90 +147,236 @@ def add_field(fields_dict, field_info):
         field['length'] = field_info['character_maximum_length']
     fields_dict[fieldname] = field
 
-# Connect to the database
-conn = psycopg2.connect("service=pg_qgep")
 
-cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+def table_name(service, schema, table, qualified):
+    # qualified: None, 'schema' (<schema>.<table>) or 'service'
+    # (<service>.<schema>.<table>), see qualified_names
+    if qualified == 'service':
+        return '{0}.{1}.{2}'.format(service, schema, table)
+    if qualified == 'schema':
+        return '{0}.{1}'.format(schema, table)
+    return table
 
-# Select all fields to initialize the table metainformation
-cur.execute("SELECT * FROM information_schema.columns WHERE table_schema='qgep'")
 
-pg_fields = cur.fetchall()
+def fetch(pool, sql, params):
+    # runs in a worker thread, on a connection of the pool
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        cur.execute(sql, params)
+        rows = [dict(row) for row in cur.fetchall()]
+        cur.close()
+        conn.rollback()
+    finally:
+        pool.putconn(conn)
+    return rows
 
-tables = dict()
 
-for f in pg_fields:
-    tablename = f['table_name']
-    fieldname = f['column_name']
+def open_pools(targets, jobs):
+    # a pool of connections per service
+    pools = OrderedDict()
+    for service, schema in targets:
+        if service not in pools:
+            pools[service] = psycopg2.pool.ThreadedConnectionPool(1, jobs, "service={0}".format(service))
+    return pools
 
-    if tablename not in tables:
-        tables[tablename] = dict()
-        tables[tablename]['fields'] = OrderedDict()
 
-    add_field(tables[tablename]['fields'], f)
+def close_pools(pools):
+    for pool in pools.values():
+        pool.closeall()
 
-# Find primary keys
-cur.execute("""
-SELECT tc.table_schema, tc.table_name, kc.column_name
-FROM
-    information_schema.table_constraints tc,
-    information_schema.key_column_usage kc
-WHERE
-    tc.constraint_type = 'PRIMARY KEY'
-    AND kc.table_name = tc.table_name
-    AND kc.table_schema = tc.table_schema
-    AND kc.constraint_name = tc.constraint_name
-ORDER BY 1, 2;
-""")
-colnames = [desc[0] for desc in cur.description]
-pg_pks = cur.fetchall()
 
-for pk in pg_pks:
-    table_name = pk[colnames.index('table_name')]
-    column_name = pk[colnames.index('column_name')]
+def run_queries(pools, queries, jobs):
+    # runs the queries [(key, service, sql, params)] in parallel
+    # returns {key: rows}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = OrderedDict()
+        for key, service, sql, params in queries:
+            futures[key] = executor.submit(fetch, pools[service], sql, params)
+        return OrderedDict([(key, future.result()) for key, future in futures.items()])
+
+
+def introspect(pools, targets, jobs, tables=None):
+    # runs the queries of the targets (service, schema), restricted to some
+    # tables of each target if tables ({target: [table]}) is given
+    # returns {target: {query: rows}}
+    queries = []
+    for target in targets:
+        if tables is not None and len(tables.get(target, [])) == 0:
+            continue
+        params = {'schema': target[1], 'tables': tables[target] if tables is not None else None}
+        for query, sql in QUERIES:
+            queries.append(((target, query), target[0], sql, params))
+    rows = OrderedDict()
+    for (target, query), query_rows in run_queries(pools, queries, jobs).items():
+        rows.setdefault(target, dict())[query] = query_rows
+    return rows
+
+
+def assemble(rows, qualified=None, service=None):
+    # tables of the metaproject from the rows of the queries of a schema of
+    # the service, qualified as given (see table_name)
+    tables = dict()
+
+    for f in rows['columns']:
+        tablename = table_name(service, f['table_schema'], f['table_name'], qualified)
+
+        if tablename not in tables:
+            tables[tablename] = dict()
+            tables[tablename]['fields'] = OrderedDict()
+
+        add_field(tables[tablename]['fields'], f)
+
+    for pk in rows['primary_keys']:
+        try:
+            tables[table_name(service, pk['table_schema'], pk['table_name'], qualified)][
+                'fields'][pk['column_name']]['primary_key'] = True
+        except KeyError:
+            pass
+
+    for c in rows['foreign_keys']:
+        tablename = table_name(service, c['table_schema'], c['table_name'], qualified)
+        foreign_table_name = table_name(service, c['foreign_table_schema'], c['foreign_table_name'], qualified)
+        column_name = c['column_name']
 
+        fk = dict()
+        fk['table'] = foreign_table_name
+        fk['column'] = c['foreign_column_name']
+
+        if 'primary_key' in tables[tablename]['fields'][column_name]:
+            tables[tablename]['inherits'] = foreign_table_name
+
+        tables[tablename]['fields'][column_name]['references'] = fk
+
+    return tables
+
+
+def qualified_names(targets):
+    # the tables are schema qualified if several schemas are merged, and
+    # service qualified as well if a schema is found in several services
+    schemas = set([schema for service, schema in targets])
+    if len(set(targets)) > len(schemas):
+        return 'service'
+    if len(schemas) > 1:
+        return 'schema'
+    return None
+
+
+def merge(rows):
+    # a single metaproject for all the targets
+    qualified = qualified_names(rows)
+    tables = dict()
+    for (service, schema), target_rows in rows.items():
+        for name, table in assemble(target_rows, qualified, service).items():
+            if name in tables:
+                raise ValueError("The table {0} is found in several databases".format(name))
+            tables[name] = table
+    return {'tables': tables}
+
+
+def refresh(pools, targets, jobs, mp, qualified):
+    # updates the metaproject mp of the targets, only the tables whose
+    # fingerprint changed since the last refresh are queried
+    # returns the updated metaproject and the names of the changed tables
+    queries = [(target, target[0], SQL_FINGERPRINTS, {'schema': target[1]}) for target in targets]
+    fingerprints = dict()
+    changed = OrderedDict([(target, []) for target in targets])
+    previous = mp.get('fingerprints', dict())
+    for target, rows in run_queries(pools, queries, jobs).items():
+        for row in rows:
+            name = table_name(target[0], row['table_schema'], row['table_name'], qualified)
+            if name in fingerprints:
+                raise ValueError("The table {0} is found in several databases".format(name))
+            fingerprints[name] = row['fingerprint']
+            if previous.get(name) != row['fingerprint']:
+                changed[target].append(row['table_name'])
+
+    tables = OrderedDict(mp.get('tables', dict()))
+    # dropped tables
+    names = [name for name in tables if name not in fingerprints]
+    for name in names:
+        del tables[name]
+
+    for target, target_rows in introspect(pools, targets, jobs, changed).items():
+        target_tables = assemble(target_rows, qualified, target[0])
+        for table in changed[target]:
+            name = table_name(target[0], target[1], table, qualified)
+            names.append(name)
+            if name in target_tables:
+                tables[name] = target_tables[name]
+            elif name in tables:
+                del tables[name]
+
+    return {'tables': tables, 'fingerprints': fingerprints}, names
+
+
+def read_metaproject(path):
+    # the metaproject written by a previous run, empty if there is none
+    if not os.path.exists(path):
+        return {'tables': dict()}
+    with open(path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def write_metaproject(mp, path):
+    with open(path, 'w') as f:
+        f.write(json.dumps(mp, indent=2))
+
+
+def parse_target(target):
+    service, separator, schema = target.partition(':')
+    if not separator or not service or not schema:
+        raise argparse.ArgumentTypeError("The target must be <service>:<schema>, not {0}".format(target))
+    return service, schema
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Introspects PostgreSQL schemas into metaprojects")
+    parser.add_argument('--target', type=parse_target, action='append',
+                        help="<service>:<schema> to introspect, can be repeated (default: pg_qgep:qgep)")
+    parser.add_argument('--output', help="metaproject of all the targets (default: ../data/qgep_base.mp)")
+    parser.add_argument('--output-dir', help="directory where a metaproject per target is written")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only query the tables whose catalog changed since the last run (stores fingerprints)")
+    parser.add_argument('--jobs', type=int, default=4, help="number of parallel queries (default: 4)")
+    args = parser.parse_args(argv)
+
+    if args.target is None:
+        args.target = [('pg_qgep', 'qgep')]
+    if args.output is not None and args.output_dir is not None:
+        parser.error("--output and --output-dir cannot be used together")
+    if args.output is None and args.output_dir is None:
+        args.output = '../data/qgep_base.mp'
+    args.jobs = max(1, args.jobs)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output is not None:
+        outputs = [(args.output, args.target)]
+    else:
+        if not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+        outputs = [(os.path.join(args.output_dir, '{0}_{1}.mp'.format(service, schema)), [(service, schema)])
+                   for service, schema in args.target]
+
+    pools = open_pools(args.target, args.jobs)
     try:
-        tables[table_name]['fields'][column_name]['primary_key'] = True
-    except KeyError:
-        pass
+        if args.incremental:
+            for path, targets in outputs:
+                mp, names = refresh(pools, targets, args.jobs, read_metaproject(path), qualified_names(targets))
+                write_metaproject(mp, path)
+                print("{0}: {1} tables refreshed".format(path, len(names)))
+        else:
+            rows = introspect(pools, args.target, args.jobs)
+            for path, targets in outputs:
+                # Assemble the metaproject information
+                write_metaproject(merge(OrderedDict([(target, rows[target]) for target in targets])), path)
+    finally:
+        close_pools(pools)
+    return 0
 
-# Find foreign keys
-cur.execute("""
-SELECT
-    tc.constraint_name, tc.table_name, kcu.column_name,
-    ccu.table_name AS foreign_table_name,
-    ccu.column_name AS foreign_column_name
-FROM
-    information_schema.table_constraints AS tc
-    JOIN information_schema.key_column_usage AS kcu
-      ON tc.constraint_name = kcu.constraint_name
-    JOIN information_schema.constraint_column_usage AS ccu
-      ON ccu.constraint_name = tc.constraint_name
-WHERE constraint_type = 'FOREIGN KEY'
-""")
-colnames = [desc[0] for desc in cur.description]
-
-pg_constraints = cur.fetchall()
-
-for c in pg_constraints:
-    table_name = c[colnames.index('table_name')]
-    column_name = c[colnames.index('column_name')]
-    foreign_table_name = c[colnames.index('foreign_table_name')]
-    foreign_column_name = c[colnames.index('foreign_column_name')]
-
-    fk = dict()
-    fk['table'] = foreign_table_name
-    fk['column'] = foreign_column_name
-
-    if 'primary_key' in tables[table_name]['fields'][column_name]:
-        tables[table_name]['inherits'] = foreign_table_name
-
-    tables[table_name]['fields'][column_name]['references'] = fk
-
-
-# Assemble the metaproject information
-mp = dict()
-mp['tables'] = tables
-
-with open('../data/qgep_base.mp', 'w') as f:
-    f.write(json.dumps(mp, indent=2))
+
+if __name__ == '__main__':
+    sys.exit(main())